@@ -0,0 +1,42 @@
+"""Add covering task indexes
+
+Revision ID: 8d41b7c06e2a
+Revises: 5c2f1e8a9b3d
+Create Date: 2026-10-18 10:03:17.554902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41b7c06e2a'
+down_revision: Union[str, None] = '5c2f1e8a9b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index('ix_tasks_telegram_id_created_at_id', table_name='tasks')
+    op.create_index(
+        'ix_tasks_telegram_id_created_at_id',
+        'tasks',
+        ['telegram_id', 'created_at', 'id'],
+        unique=False,
+        postgresql_include=['title', 'is_completed'],
+    )
+    op.create_index(
+        'ix_tasks_open_telegram_id_created_at_id',
+        'tasks',
+        ['telegram_id', 'created_at', 'id'],
+        unique=False,
+        postgresql_where=sa.text('NOT is_completed'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_open_telegram_id_created_at_id', table_name='tasks')
+    op.drop_index('ix_tasks_telegram_id_created_at_id', table_name='tasks')
+    op.create_index('ix_tasks_telegram_id_created_at_id', 'tasks', ['telegram_id', 'created_at', 'id'], unique=False)
@@ -0,0 +1,38 @@
+"""Add task due dates and reminders
+
+Revision ID: d4a8c7e1f0b5
+Revises: b6e0f4a2d9c1
+Create Date: 2026-10-18 15:40:12.906127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c7e1f0b5'
+down_revision: Union[str, None] = 'b6e0f4a2d9c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('due_at', sa.DateTime(), nullable=True))
+    op.add_column('tasks', sa.Column('remind_at', sa.DateTime(), nullable=True))
+    op.add_column('tasks', sa.Column('reminder_lease', sa.DateTime(), nullable=True))
+    op.create_index(
+        'ix_tasks_remind_at',
+        'tasks',
+        ['remind_at'],
+        unique=False,
+        postgresql_where=sa.text('remind_at IS NOT NULL'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_remind_at', table_name='tasks')
+    op.drop_column('tasks', 'reminder_lease')
+    op.drop_column('tasks', 'remind_at')
+    op.drop_column('tasks', 'due_at')
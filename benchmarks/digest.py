@@ -0,0 +1,155 @@
+"""
+Daily digest broadcast.
+
+Many users with a few tasks each, some with every task completed, share an in-memory database. `DigestJob` sends
+their digests through the send scheduler while a probe measures how long replies to other users wait behind the
+broadcast. With `--crash`, the run is killed partway, its queued messages are lost, and a new job resumes from the
+checkpoint. The run checks that every user with open tasks got a digest counting them and nobody else got one, and
+reports throughput, duplicates and database round trips:
+
+    python -m benchmarks.digest --users 100000
+    python -m benchmarks.digest --users 3000 --global-rate 30   # at Telegram's broadcast limit
+    python -m benchmarks.digest --crash
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import time
+from contextlib import suppress
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+from benchmarks.fakes import InMemoryDatabase
+from bot.digest import DigestJob, MemoryCheckpoint
+from bot.sender import SEND_GLOBAL_RATE, SendScheduler
+
+DAY = date(2025, 1, 1)
+FIRST_CHAT_ID = 40_000_000
+FIRST_PROBE_CHAT_ID = 50_000_000
+
+
+class DigestInbox:
+    """Client that records the texts sent to each chat; lighter than Pyrogram messages for many users."""
+
+    def __init__(self) -> None:
+        self.received: Dict[int, List[str]] = {}
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        self.received.setdefault(chat_id, []).append(text)
+        return True
+
+    async def stop(self) -> None:
+        pass
+
+
+class ScheduledInbox(SendScheduler, DigestInbox):
+    """Digest inbox behind the send scheduler, as the bot runs in production."""
+
+
+async def populate(db: InMemoryDatabase, args: argparse.Namespace, rng: random.Random) -> Dict[int, int]:
+    """Registers the users with up to twice `--tasks` tasks, completing about half; returns open tasks per chat."""
+    open_tasks = {}
+    for chat_id in range(FIRST_CHAT_ID, FIRST_CHAT_ID + args.users):
+        await db.create_user(f"user{chat_id}", f"user{chat_id}", str(chat_id))
+        count = rng.randrange(args.tasks * 2 + 1)
+        if count:
+            await db.create_tasks(str(chat_id), [(f"Task {i}", None) for i in range(count)])
+        open_tasks[chat_id] = count
+        for _, task_id in db.task_keys.get(str(chat_id), []):
+            if rng.random() < 0.5:
+                db.tasks[task_id][3] = True
+                open_tasks[chat_id] -= 1
+    return open_tasks
+
+
+async def probe(client: Any, latencies: List[float]) -> None:
+    """Sends a reply to a new chat every 50 ms and records how long each waits for delivery."""
+    for chat_id in itertools.count(FIRST_PROBE_CHAT_ID):
+        started = time.perf_counter()
+        await (await client.send_message(chat_id, "pong"))
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+
+
+async def kill(run: "asyncio.Task[int]", prober: "asyncio.Task[None]", client: ScheduledInbox) -> None:
+    """Stops the run and drops everything queued in the client's send scheduler, as a crashed process would."""
+    for task in [run, prober, client._pacer, *client._lane_tasks.values()]:
+        if task:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+
+
+def check(open_tasks: Dict[int, int], received: Dict[int, List[str]]) -> Tuple[List[str], int]:
+    """Returns the users who got wrong digests and the number of duplicated ones."""
+    failures, duplicates = [], 0
+    for chat_id, count in open_tasks.items():
+        texts = received.get(chat_id, [])
+        if not count and texts:
+            failures.append(f"chat {chat_id}: no open tasks, still got {len(texts)} digests")
+        elif count and not texts:
+            failures.append(f"chat {chat_id}: {count} open tasks, no digest")
+        elif any(f"you have {count} open tasks" not in text for text in texts):
+            failures.append(f"chat {chat_id}: {count} open tasks, got {texts[0]!r}")
+        duplicates += max(len(texts) - 1, 0)
+    return failures, duplicates
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    db = InMemoryDatabase(args.db_latency)
+    open_tasks = await populate(db, args, rng)
+    expected = sum(1 for count in open_tasks.values() if count)
+    db.queries = 0
+
+    client = ScheduledInbox(global_rate=args.global_rate, global_burst=args.global_rate)
+    checkpoint = MemoryCheckpoint()
+    latencies: List[float] = []
+    prober = asyncio.create_task(probe(client, latencies))
+
+    started = time.perf_counter()
+    run = asyncio.create_task(DigestJob(db, client, checkpoint, chunk_size=args.chunk).run(DAY))
+    if args.crash:
+        while sum(map(len, client.received.values())) < expected * 0.4:
+            await asyncio.sleep(0.01)
+        await kill(run, prober, client)
+        resumed = ScheduledInbox(global_rate=args.global_rate, global_burst=args.global_rate)
+        resumed.received = client.received
+        prober = asyncio.create_task(probe(resumed, latencies))
+        run = asyncio.create_task(DigestJob(db, resumed, checkpoint, chunk_size=args.chunk).run(DAY))
+    await run
+    elapsed = time.perf_counter() - started
+    prober.cancel()
+    with suppress(asyncio.CancelledError):
+        await prober
+
+    failures, duplicates = check(open_tasks, client.received)
+    sent = sum(len(texts) for chat_id, texts in client.received.items() if chat_id < FIRST_PROBE_CHAT_ID)
+    print(f"{sent} digests to {args.users} users in {elapsed:.2f}s, {sent / elapsed:.0f}/s, {duplicates} duplicates")
+    print(f"at {SEND_GLOBAL_RATE:.0f} messages/s, {expected} digests take {expected / SEND_GLOBAL_RATE / 60:.0f} min")
+    print(f"{db.queries} database round trips, {args.chunk} users per chunk")
+    if latencies:
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        print(f"replies during the broadcast: {len(latencies)}, p95 wait {p95 * 1000:.1f} ms")
+    print("\n".join(failures[:20]) if failures else "every user with open tasks got a correct digest, nobody else did")
+    if failures or duplicates > (args.chunk if args.crash else 0):
+        raise SystemExit(1)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--tasks", type=int, default=3, help="average tasks per user")
+    parser.add_argument("--chunk", type=int, default=500, help="see DIGEST_CHUNK_SIZE")
+    parser.add_argument("--global-rate", type=float, default=20000, help="messages per second across all chats")
+    parser.add_argument("--crash", action="store_true", help="kill the run at 40%% and resume it")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="simulated query latency, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
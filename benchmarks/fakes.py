@@ -0,0 +1,583 @@
+import asyncio
+import bisect
+import csv
+import heapq
+import io
+import itertools
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from pyrogram import enums
+from pyrogram.types import CallbackQuery, Chat, Document, Message, User
+
+from bot.sender import SendScheduler
+from database.database import search_terms
+
+STREAM_CHUNK_SIZE = 64 * 1024
+EXPORT_CHUNK_ROWS = 100
+
+
+class StubClient:
+    """Stands in for `pyrogram.Client`: records outgoing calls instead of talking to Telegram."""
+
+    def __init__(self, latency: float = 0.0, connect_latency: float = 0.0) -> None:
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.is_connected = False
+        self.handlers: List[Any] = []
+        self.sent: Dict[int, List[Message]] = {}
+        self.files: Dict[str, bytes] = {}
+        self.calls = 0
+        self._message_ids = itertools.count(1)
+
+    def add_handler(self, handler: Any) -> None:
+        self.handlers.append(handler)
+
+    async def start(self) -> None:
+        await asyncio.sleep(self.connect_latency)
+        self.is_connected = True
+
+    async def stop(self) -> None:
+        self.is_connected = False
+
+    async def _round_trip(self) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+
+    def last_message(self, chat_id: int) -> Message:
+        """Returns the most recent message the bot sent to a chat."""
+        return self.sent[chat_id][-1]
+
+    def last_markup_message(self, chat_id: int) -> Message:
+        """Returns the most recent message with an inline keyboard sent to a chat."""
+        return next(m for m in reversed(self.sent[chat_id]) if hasattr(m.reply_markup, "inline_keyboard"))
+
+    async def send_message(self, chat_id: int, text: str, reply_markup: Any = None, **kwargs: Any) -> Message:
+        await self._round_trip()
+        message = make_message(self, chat_id, text, message_id=next(self._message_ids))
+        message.reply_markup = reply_markup
+        self.sent.setdefault(chat_id, []).append(message)
+        return message
+
+    async def send_document(
+        self, chat_id: int, document: Any, file_name: Optional[str] = None, caption: str = "", **kwargs: Any
+    ) -> Message:
+        await self._round_trip()
+        message = make_document_message(self, chat_id, file_name or "document", document.read())
+        message.caption = caption
+        self.sent.setdefault(chat_id, []).append(message)
+        return message
+
+    async def stream_media(self, message: Message, limit: int = 0, offset: int = 0) -> AsyncIterator[bytes]:
+        data = self.files[message.document.file_id]
+        for start in range(0, len(data), STREAM_CHUNK_SIZE):
+            await self._round_trip()
+            yield data[start : start + STREAM_CHUNK_SIZE]
+
+    async def edit_message_text(
+        self, chat_id: int, message_id: int, text: str, reply_markup: Any = None, **kwargs: Any
+    ) -> Message:
+        await self._round_trip()
+        message = self._find(chat_id, message_id)
+        message.text = text
+        message.reply_markup = reply_markup
+        return message
+
+    async def edit_message_reply_markup(self, chat_id: int, message_id: int, reply_markup: Any = None) -> Message:
+        await self._round_trip()
+        message = self._find(chat_id, message_id)
+        message.reply_markup = reply_markup
+        return message
+
+    async def answer_callback_query(self, callback_query_id: str, text: Optional[str] = None, **kwargs: Any) -> bool:
+        await self._round_trip()
+        return True
+
+    def _find(self, chat_id: int, message_id: int) -> Message:
+        return next(m for m in self.sent[chat_id] if m.id == message_id)
+
+
+class ScheduledStubClient(SendScheduler, StubClient):
+    """Stub client behind the send scheduler, as the bot runs in production."""
+
+
+_update_ids = itertools.count(1)
+
+
+def make_message(client: Any, chat_id: int, text: Optional[str], message_id: Optional[int] = None) -> Message:
+    """Builds a private-chat `Message` bound to the stub client."""
+    user = User(id=chat_id, first_name=f"user{chat_id}")
+    chat = Chat(id=chat_id, type=enums.ChatType.PRIVATE, first_name=user.first_name)
+    return Message(
+        client=client,
+        id=message_id or next(_update_ids),
+        from_user=user,
+        chat=chat,
+        date=datetime.now(),
+        text=text,
+    )
+
+
+def make_document_message(client: Any, chat_id: int, file_name: str, data: bytes) -> Message:
+    """Builds a message carrying a document whose content the stub client serves from `files`."""
+    message = make_message(client, chat_id, None)
+    file_id = f"file{message.id}"
+    client.files[file_id] = data
+    message.document = Document(
+        client=client, file_id=file_id, file_unique_id=file_id, file_name=file_name, file_size=len(data)
+    )
+    return message
+
+
+def make_callback_query(client: Any, chat_id: int, message: Message, data: str) -> CallbackQuery:
+    """Builds a `CallbackQuery` for an inline button pressed under `message`."""
+    return CallbackQuery(
+        client=client,
+        id=str(next(_update_ids)),
+        from_user=User(id=chat_id, first_name=f"user{chat_id}"),
+        chat_instance=str(chat_id),
+        message=message,
+        data=data,
+    )
+
+
+class InMemoryDatabase:
+    """Implements the `Database` API on plain dicts for service-free benchmarks."""
+
+    def __init__(self, latency: float = 0.0, connect_latency: float = 0.0) -> None:
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.queries = 0
+        self.task_updates = 0
+        self.users: Dict[str, Tuple[int, str, str]] = {}
+        self.usernames: Dict[str, int] = {}
+        self.user_keys: List[str] = []
+        self.tasks: Dict[int, List[Any]] = {}
+        self.task_keys: Dict[str, List[Tuple[datetime, int]]] = {}
+        self.due: Dict[int, datetime] = {}
+        self.reminders: Dict[int, List[Any]] = {}
+        self.reminder_keys: List[Tuple[datetime, int]] = []
+        self._ids = itertools.count(1)
+        self._clock = datetime(2025, 1, 1)
+
+    async def _round_trip(self) -> None:
+        self.queries += 1
+        await asyncio.sleep(self.latency)
+
+    async def connect(self) -> None:
+        await asyncio.sleep(self.connect_latency)
+
+    async def close(self) -> None:
+        pass
+
+    async def create_user(self, name: str, username: str, telegram_id: str) -> bool:
+        await self._round_trip()
+        if username in self.usernames:
+            return False
+        user_id = next(self._ids)
+        self.users[telegram_id] = (user_id, name, username)
+        bisect.insort(self.user_keys, telegram_id)
+        self.usernames[username] = user_id
+        return True
+
+    async def get_user(self, telegram_id: str) -> Optional[Tuple[int, str, str]]:
+        await self._round_trip()
+        return self.users.get(telegram_id)
+
+    async def get_user_by_username(self, username: str) -> Optional[int]:
+        await self._round_trip()
+        return self.usernames.get(username)
+
+    async def create_task(self, telegram_id: str, title: str, description: str) -> None:
+        await self._round_trip()
+        task_id = next(self._ids)
+        self._clock += timedelta(microseconds=1)
+        self.tasks[task_id] = [task_id, title, description, False, self._clock, telegram_id]
+        self.task_keys.setdefault(telegram_id, []).append((self._clock, task_id))
+
+    async def create_tasks(self, telegram_id: str, tasks: List[Tuple[str, Optional[str]]]) -> int:
+        await self._round_trip()
+        for title, description in tasks:
+            task_id = next(self._ids)
+            self._clock += timedelta(microseconds=1)
+            self.tasks[task_id] = [task_id, title, description, False, self._clock, telegram_id]
+            self.task_keys.setdefault(telegram_id, []).append((self._clock, task_id))
+        return len(tasks)
+
+    def _rows(self, keys: List[Tuple[datetime, int]]) -> List[Tuple[int, str, str, bool]]:
+        return [tuple(self.tasks[key[1]][:4]) for key in keys]  # type: ignore
+
+    async def get_tasks(self, telegram_id: str) -> List[Tuple[int, str, str, bool]]:
+        await self._round_trip()
+        return self._rows(self.task_keys.get(telegram_id, []))
+
+    async def get_tasks_page(
+        self, telegram_id: str, limit: int, cursor: Optional[Tuple[datetime, int]] = None, backward: bool = False
+    ) -> List[Tuple[int, str, bool, datetime]]:
+        await self._round_trip()
+        keys = self.task_keys.get(telegram_id, [])
+        if cursor is None:
+            selected = keys[:limit]
+        elif not backward:
+            start = bisect.bisect_right(keys, tuple(cursor))
+            selected = keys[start : start + limit]
+        else:
+            end = bisect.bisect_left(keys, tuple(cursor))
+            selected = keys[max(end - limit, 0) : end]
+        return [
+            (task_id, self.tasks[task_id][1], self.tasks[task_id][3], created_at) for created_at, task_id in selected
+        ]
+
+    def _owned(self, task_id: int, telegram_id: str) -> Optional[List[Any]]:
+        task = self.tasks.get(task_id)
+        return task if task and task[5] == telegram_id else None
+
+    async def get_user_task(self, task_id: int, telegram_id: str) -> Optional[Tuple[int, str, str, bool]]:
+        await self._round_trip()
+        task = self._owned(task_id, telegram_id)
+        return tuple(task[:4]) if task else None  # type: ignore
+
+    async def apply_task_changes(self, changes: List[Tuple[int, str, str, Optional[str], bool]]) -> int:
+        await self._round_trip()
+        written = 0
+        for task_id, telegram_id, title, description, is_completed in changes:
+            task = self._owned(task_id, telegram_id)
+            if task and task[1:4] != [title, description, is_completed]:
+                task[1:4] = [title, description, is_completed]
+                written += 1
+        self.task_updates += written
+        return written
+
+    async def update_task(
+        self, task_id: int, telegram_id: str, field: str, value: Union[str, bool]
+    ) -> Optional[Tuple[int, str, str, bool]]:
+        await self._round_trip()
+        task = self._owned(task_id, telegram_id)
+        column = {"title": 1, "description": 2, "is_completed": 3}[field]
+        if not task or task[column] == value:
+            return None
+        task[column] = value
+        self.task_updates += 1
+        return tuple(task[:4])  # type: ignore
+
+    async def toggle_task(self, task_id: int, telegram_id: str) -> Optional[Tuple[int, str, str, bool]]:
+        await self._round_trip()
+        task = self._owned(task_id, telegram_id)
+        if not task:
+            return None
+        task[3] = not task[3]
+        self.task_updates += 1
+        return tuple(task[:4])  # type: ignore
+
+    async def delete_task(self, task_id: int, telegram_id: str) -> bool:
+        await self._round_trip()
+        task = self._owned(task_id, telegram_id)
+        if task:
+            del self.tasks[task_id]
+            self._drop_reminder(task_id)
+            self.task_keys[telegram_id].remove((task[4], task_id))
+        return task is not None
+
+    def _numbered(self, telegram_id: str, ranges: List[Tuple[int, int]]) -> List[List[Any]]:
+        keys = self.task_keys.get(telegram_id, [])
+        return [
+            self.tasks[task_id]
+            for position, (_, task_id) in enumerate(keys, 1)
+            if any(low <= position <= high for low, high in ranges)
+        ]
+
+    async def complete_all_tasks(self, telegram_id: str) -> int:
+        return await self.set_tasks_completed_by_numbers(
+            telegram_id, [(1, len(self.task_keys.get(telegram_id, [])))], True
+        )
+
+    async def delete_completed_tasks(self, telegram_id: str) -> int:
+        await self._round_trip()
+        completed = [
+            task for task in self._numbered(telegram_id, [(1, len(self.task_keys.get(telegram_id, [])))]) if task[3]
+        ]
+        for task in completed:
+            del self.tasks[task[0]]
+            self._drop_reminder(task[0])
+            self.task_keys[telegram_id].remove((task[4], task[0]))
+        return len(completed)
+
+    async def set_tasks_completed_by_numbers(
+        self, telegram_id: str, ranges: List[Tuple[int, int]], is_completed: bool
+    ) -> int:
+        await self._round_trip()
+        changed = [task for task in self._numbered(telegram_id, ranges) if task[3] != is_completed]
+        for task in changed:
+            task[3] = is_completed
+        return len(changed)
+
+    async def delete_tasks_by_numbers(self, telegram_id: str, ranges: List[Tuple[int, int]]) -> int:
+        await self._round_trip()
+        selected = self._numbered(telegram_id, ranges)
+        for task in selected:
+            del self.tasks[task[0]]
+            self._drop_reminder(task[0])
+            self.task_keys[telegram_id].remove((task[4], task[0]))
+        return len(selected)
+
+    async def get_task_order(self, task_id: int, telegram_id: str) -> Optional[int]:
+        await self._round_trip()
+        task = self.tasks.get(task_id)
+        if not task or task[5] != telegram_id:
+            return None
+        return bisect.bisect_right(self.task_keys[telegram_id], (task[4], task_id))
+
+    async def get_task_by_number(self, telegram_id: str, task_number: int) -> Optional[Tuple[int, str, str, bool]]:
+        await self._round_trip()
+        keys = self.task_keys.get(telegram_id, [])
+        if not 1 <= task_number <= len(keys):
+            return None
+        return self._rows([keys[task_number - 1]])[0]
+
+    async def search_tasks(
+        self, telegram_id: str, text: str, limit: int, offset: int = 0
+    ) -> List[Tuple[int, str, bool, int]]:
+        await self._round_trip()
+        terms = search_terms(text)
+        if not terms:
+            return []
+        matches = []
+        for position, (_, task_id) in enumerate(self.task_keys.get(telegram_id, []), 1):
+            task = self.tasks[task_id]
+            title_words, description_words = search_terms(task[1] or ""), search_terms(task[2] or "")
+            in_title = [any(word.startswith(term) for word in title_words) for term in terms]
+            in_description = [any(word.startswith(term) for word in description_words) for term in terms]
+            if all(map(any, zip(in_title, in_description))):
+                rank = 2 * sum(in_title) + sum(in_description)
+                matches.append((-rank, task_id, (task_id, task[1], task[3], position)))
+        return [row for _, _, row in sorted(matches)[offset : offset + limit]]
+
+    async def count_tasks(self, telegram_id: str) -> int:
+        await self._round_trip()
+        return len(self.task_keys.get(telegram_id, []))
+
+    async def export_tasks(self, telegram_id: str, output: Callable[[bytes], Awaitable[None]]) -> int:
+        await self._round_trip()
+        keys = self.task_keys.get(telegram_id, [])
+        for start in range(0, max(len(keys), 1), EXPORT_CHUNK_ROWS):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if start == 0:
+                writer.writerow(["title", "description", "is_completed", "created_at", "due_at"])
+            for _, task_id in keys[start : start + EXPORT_CHUNK_ROWS]:
+                _, title, description, is_completed, created_at, _ = self.tasks[task_id]
+                due_at = self.due.get(task_id)
+                writer.writerow([title, description or "", "t" if is_completed else "f", created_at, due_at or ""])
+            await output(buffer.getvalue().encode())
+        return len(keys)
+
+    async def import_tasks(
+        self,
+        telegram_id: str,
+        tasks: Iterable[Tuple[str, Optional[str], bool, Optional[datetime], Optional[datetime]]],
+    ) -> int:
+        await self._round_trip()
+        rows = list(tasks)
+        for title, description, is_completed, due_at, remind_at in rows:
+            task_id = next(self._ids)
+            self._clock += timedelta(microseconds=1)
+            self.tasks[task_id] = [task_id, title, description, is_completed, self._clock, telegram_id]
+            self.task_keys.setdefault(telegram_id, []).append((self._clock, task_id))
+            if due_at:
+                self.due[task_id] = due_at
+            if remind_at:
+                self.reminders[task_id] = [remind_at, None]
+                bisect.insort(self.reminder_keys, (remind_at, task_id))
+        return len(rows)
+
+    async def get_digests(
+        self, after: str, limit: int, max_tasks: int
+    ) -> List[Tuple[str, int, List[str], List[Optional[datetime]]]]:
+        await self._round_trip()
+        digests = []
+        for telegram_id in itertools.islice(self.user_keys, bisect.bisect_right(self.user_keys, after), None):
+            if len(digests) == limit:
+                break
+            open_tasks = [self.tasks[task_id] for _, task_id in self.task_keys.get(telegram_id, [])]
+            open_tasks = [task for task in open_tasks if not task[3]]
+            if open_tasks:
+                first = open_tasks[:max_tasks]
+                digests.append(
+                    (
+                        telegram_id,
+                        len(open_tasks),
+                        [task[1] for task in first],
+                        [self.due.get(task[0]) for task in first],
+                    )
+                )
+        return digests
+
+    def _drop_reminder(self, task_id: int) -> None:
+        reminder = self.reminders.pop(task_id, None)
+        if reminder:
+            del self.reminder_keys[bisect.bisect_left(self.reminder_keys, (reminder[0], task_id))]
+
+    async def set_task_due(
+        self, task_id: int, telegram_id: str, due_at: Optional[datetime]
+    ) -> Optional[Tuple[int, str, Optional[datetime]]]:
+        await self._round_trip()
+        task = self._owned(task_id, telegram_id)
+        if not task:
+            return None
+        self._drop_reminder(task_id)
+        self.due.pop(task_id, None)
+        if due_at is not None:
+            self.due[task_id] = due_at
+            self.reminders[task_id] = [due_at, None]
+            bisect.insort(self.reminder_keys, (due_at, task_id))
+        return task_id, task[1], due_at
+
+    async def claim_reminders(
+        self, horizon: datetime, now: datetime, lease_until: datetime, limit: int
+    ) -> List[Tuple[int, str, str, datetime]]:
+        await self._round_trip()
+        claimed = []
+        for remind_at, task_id in self.reminder_keys:
+            if remind_at > horizon or len(claimed) == limit:
+                break
+            reminder = self.reminders[task_id]
+            if reminder[1] is None or reminder[1] < now:
+                reminder[1] = lease_until
+                claimed.append(task_id)
+        return [
+            (task_id, self.tasks[task_id][5], self.tasks[task_id][1], self.reminders[task_id][0]) for task_id in claimed
+        ]
+
+    async def finish_reminders(self, reminders: List[Tuple[int, datetime]]) -> List[Tuple[int, bool]]:
+        await self._round_trip()
+        finished = []
+        for task_id, remind_at in reminders:
+            reminder = self.reminders.get(task_id)
+            if reminder and reminder[0] == remind_at:
+                self._drop_reminder(task_id)
+                finished.append((task_id, self.tasks[task_id][3]))
+        return finished
+
+    async def release_reminders(self, task_ids: List[int]) -> None:
+        await self._round_trip()
+        for task_id in task_ids:
+            if task_id in self.reminders:
+                self.reminders[task_id][1] = None
+
+
+class FakeClock:
+    """Stands in for `bot.reminders.Clock`: time only moves on `advance`, which wakes the sleepers it passes."""
+
+    def __init__(self, now: datetime) -> None:
+        self.current = now
+        self._sleepers: List[Tuple[datetime, int, "asyncio.Future[None]"]] = []
+        self._order = itertools.count()
+
+    def now(self) -> datetime:
+        return self.current
+
+    @property
+    def sleeping(self) -> int:
+        return sum(not future.done() for _, _, future in self._sleepers)
+
+    async def sleep(self, seconds: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.current + timedelta(seconds=seconds), next(self._order), future))
+        await future
+
+    async def advance(self, seconds: float) -> None:
+        """
+        Moves time forward, stopping at every wake-up time on the way. Each woken task runs until it sleeps again
+        before time moves on, so every task must be sleeping when this is called.
+        """
+        target = self.current + timedelta(seconds=seconds)
+        sleeping = self.sleeping
+        while self._sleepers and self._sleepers[0][0] <= target:
+            wake_at, _, future = heapq.heappop(self._sleepers)
+            if future.done():
+                continue  # the sleeping task was cancelled
+            self.current = max(self.current, wake_at)
+            future.set_result(None)
+            while self.sleeping < sleeping:
+                await asyncio.sleep(0)
+        self.current = target
+
+
+class InMemoryJournal:
+    """Implements the write-behind journal API on a dict; nothing survives the process."""
+
+    def __init__(self) -> None:
+        self.entries: Dict[int, Tuple[str, str, Optional[str], bool]] = {}
+
+    async def save(self, task_id: int, telegram_id: str, row: Tuple[int, str, Optional[str], bool]) -> None:
+        self.entries[task_id] = (telegram_id, *row[1:])  # type: ignore
+
+    async def delete(self, task_ids: List[int]) -> None:
+        for task_id in task_ids:
+            self.entries.pop(task_id, None)
+
+    async def load(self) -> List[Tuple[int, str, str, Optional[str], bool]]:
+        return [(task_id, *entry) for task_id, entry in self.entries.items()]  # type: ignore
+
+
+class InMemoryCache:
+    """
+    Implements the `Cache` API on a dict of sessions. Setting `incident` to "stall" makes every call hang for `stall`
+    seconds before it runs, and to "error" makes every call fail, as Redis does when overloaded or down.
+    """
+
+    def __init__(self, latency: float = 0.0, stall: float = 5.0) -> None:
+        self.latency = latency
+        self.stall = stall
+        self.incident: Optional[str] = None
+        self.round_trips = 0
+        self.sessions: Dict[str, Dict[str, str]] = {}
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.incident == "error":
+            raise ConnectionError("Connection refused")
+        if self.incident == "stall":
+            await asyncio.sleep(self.stall)
+        await asyncio.sleep(self.latency)
+
+    async def update_user_cache(self, uid: Union[str, int], values: Dict[str, Any]) -> None:
+        await self._round_trip()
+        self.sessions.setdefault(str(uid), {}).update({key: str(value) for key, value in values.items()})
+
+    async def get_user_cache(self, uid: Union[str, int], key: str) -> Optional[str]:
+        await self._round_trip()
+        return self.sessions.get(str(uid), {}).get(key)
+
+    async def pop_user_cache(self, uid: Union[str, int], key: str) -> Optional[str]:
+        await self._round_trip()
+        return self.sessions.get(str(uid), {}).pop(key, None)
+
+    async def get_user_session(self, uid: Union[str, int]) -> Dict[str, str]:
+        await self._round_trip()
+        return dict(self.sessions.get(str(uid), {}))
+
+    async def save_user_session(self, uid: Union[str, int], values: Dict[str, Any], reset: bool = False) -> None:
+        await self._round_trip()
+        if reset:
+            self.sessions.pop(str(uid), None)
+        if values:
+            self.sessions.setdefault(str(uid), {}).update({key: str(value) for key, value in values.items()})
+
+    async def delete_user_cache(self, uid: Union[str, int]) -> None:
+        await self._round_trip()
+        self.sessions.pop(str(uid), None)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,284 @@
+"""
+Load test for the update handlers.
+
+Drives `TaskHandler.handle_updates` and `CallbackHandler.handle_callback` with synthetic Pyrogram updates through the
+per-chat dispatcher and a stub client and reports per-flow latency percentiles and throughput:
+
+    python -m benchmarks.load --users 200 --tasks 10
+    python -m benchmarks.load --backend live   # uses PostgreSQL and Redis from .env
+    python -m benchmarks.load --toggles 5 --write-behind
+    python -m benchmarks.load --cache-incident stall   # Redis hangs during the list, toggle and edit flows
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.fakes import (
+    InMemoryCache,
+    InMemoryDatabase,
+    InMemoryJournal,
+    ScheduledStubClient,
+    make_callback_query,
+    make_document_message,
+    make_message,
+)
+from bot.callbacks import decode_callback
+from bot.dispatcher import Dispatcher
+from bot.handler import CallbackHandler, TaskHandler
+from bot.keyboards import Buttons, InlineButtons
+from cache.cache import Cache
+from cache.resilient import ResilientCache
+from database.database import Database
+from database.write_behind import RedisTaskJournal, WriteBehindDatabase
+
+FIRST_CHAT_ID = 10_000_000
+INCIDENT_FLOWS = ("list", "search", "toggle", "edit")
+
+
+class LoadTest:
+    """Simulates concurrent users going through the bot's flows and records per-update latencies."""
+
+    def __init__(
+        self,
+        client: ScheduledStubClient,
+        db: Any,
+        cache: Any,
+        dispatcher: Dispatcher,
+        users: int,
+        tasks: int,
+        seed: int,
+        toggles: int = 1,
+        on_flow: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.client = client
+        self.dispatcher = dispatcher
+        self.task_handler = TaskHandler(client, db, cache)  # type: ignore
+        self.callback_handler = CallbackHandler(client, db, cache)  # type: ignore
+        self.chat_ids = [FIRST_CHAT_ID + i for i in range(users)]
+        self.tasks = tasks
+        self.toggles = toggles
+        self.on_flow = on_flow
+        self.random = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = {}
+        self.durations: Dict[str, float] = {}
+
+    async def timed(self, flow: str, update: Awaitable[None]) -> None:
+        started = time.perf_counter()
+        await update
+        self.latencies.setdefault(flow, []).append(time.perf_counter() - started)
+
+    async def send(self, flow: str, chat_id: int, text: str) -> None:
+        message = make_message(self.client, chat_id, text)
+        await self.timed(flow, self.dispatcher.submit(chat_id, self.task_handler.handle_updates, self.client, message))
+
+    async def press(self, flow: str, chat_id: int, action: InlineButtons) -> None:
+        """Presses the first button with the given action on the latest inline keyboard of the chat."""
+        await self.client.drain(chat_id)
+        message = self.client.last_markup_message(chat_id)
+        data = next(
+            button.callback_data
+            for row in message.reply_markup.inline_keyboard
+            for button in row
+            if decode_callback(button.callback_data).action == action
+        )
+        callback_query = make_callback_query(self.client, chat_id, message, data)
+        await self.timed(
+            flow, self.dispatcher.submit(chat_id, self.callback_handler.handle_callback, self.client, callback_query)
+        )
+
+    async def register(self, chat_id: int) -> None:
+        await self.send("register", chat_id, "/start")
+        await self.send("register", chat_id, Buttons.REGISTRATION)
+        await self.send("register", chat_id, f"User {chat_id}")
+        await self.send("register", chat_id, f"user_{chat_id}")
+
+    async def add(self, chat_id: int) -> None:
+        for i in range(self.tasks):
+            await self.send("add", chat_id, Buttons.ADD)
+            await self.send("add", chat_id, f"Task {i} of {chat_id}")
+            await self.send("add", chat_id, f"Description {i}")
+
+    async def burst_add(self, chat_id: int) -> None:
+        """Sends the three messages of adding a task at once, as a fast double-tapping user would."""
+        for i in range(self.tasks):
+            texts = (Buttons.ADD, f"Burst task {i} of {chat_id}", f"Description {i}")
+            await asyncio.gather(*(self.send("burst_add", chat_id, text) for text in texts))
+
+    async def bulk_add(self, chat_id: int) -> None:
+        await self.send("bulk_add", chat_id, Buttons.ADD_MANY)
+        lines = (f"Bulk task {i} of {chat_id} | Description {i}" for i in range(self.tasks))
+        await self.send("bulk_add", chat_id, "\n".join(lines))
+
+    async def list(self, chat_id: int) -> None:
+        await self.send("list", chat_id, Buttons.ALL)
+        await self.client.drain(chat_id)
+        message = self.client.last_message(chat_id)
+        if hasattr(message.reply_markup, "inline_keyboard"):
+            await self.press("list", chat_id, InlineButtons.NEXT_PAGE)
+
+    async def search(self, chat_id: int) -> None:
+        await self.send("search", chat_id, Buttons.SEARCH)
+        await self.send("search", chat_id, f"task {self.random.randint(0, self.tasks - 1)}")
+
+    async def open_task(self, flow: str, chat_id: int) -> None:
+        await self.send(flow, chat_id, Buttons.VIEW_TASK)
+        await self.send(flow, chat_id, str(self.random.randint(1, self.tasks)))
+
+    async def toggle(self, chat_id: int) -> None:
+        await self.open_task("toggle", chat_id)
+        for _ in range(self.toggles):
+            await self.press("toggle", chat_id, InlineButtons.TOGGLE_STATUS)
+
+    async def edit(self, chat_id: int) -> None:
+        await self.open_task("edit", chat_id)
+        await self.press("edit", chat_id, InlineButtons.EDIT_TITLE)
+        await self.send("edit", chat_id, f"Edited {self.random.random()}")
+
+    async def bulk_complete(self, chat_id: int) -> None:
+        await self.send("bulk_ops", chat_id, Buttons.BULK_ACTIONS)
+        await self.press("bulk_ops", chat_id, InlineButtons.SELECT_TASKS)
+        await self.send("bulk_ops", chat_id, f"1-{max(self.tasks // 2, 1)},{self.tasks}")
+        await self.press("bulk_ops", chat_id, InlineButtons.COMPLETE_SELECTED)
+
+    async def transfer(self, chat_id: int) -> None:
+        """Exports the task list and imports the file back, doubling the list."""
+        await self.send("transfer", chat_id, "/export")
+        await self.client.drain(chat_id)
+        exported = self.client.last_message(chat_id)
+        await self.send("transfer", chat_id, "/import")
+        message = make_document_message(
+            self.client, chat_id, exported.document.file_name, self.client.files[exported.document.file_id]
+        )
+        await self.timed(
+            "transfer", self.dispatcher.submit(chat_id, self.task_handler.handle_updates, self.client, message)
+        )
+
+    async def run_flow(self, flow: str, scenario: Callable[[int], Awaitable[None]]) -> None:
+        if self.on_flow:
+            self.on_flow(flow)
+        started = time.perf_counter()
+        await asyncio.gather(*(scenario(chat_id) for chat_id in self.chat_ids))
+        self.durations[flow] = time.perf_counter() - started
+
+    async def run(self) -> None:
+        await self.run_flow("register", self.register)
+        await self.run_flow("add", self.add)
+        await self.run_flow("burst_add", self.burst_add)
+        await self.run_flow("bulk_add", self.bulk_add)
+        await self.run_flow("list", self.list)
+        await self.run_flow("search", self.search)
+        await self.run_flow("toggle", self.toggle)
+        await self.run_flow("edit", self.edit)
+        await self.run_flow("bulk_ops", self.bulk_complete)
+        await self.run_flow("transfer", self.transfer)
+
+    def report(self) -> List[Tuple[str, int, float, float, float, float]]:
+        """Returns `(flow, updates, p50_ms, p95_ms, p99_ms, updates_per_second)` rows."""
+        rows = []
+        for flow, samples in self.latencies.items():
+            p50, p95, p99 = (percentile(samples, q) * 1000 for q in (50, 95, 99))
+            rows.append((flow, len(samples), p50, p95, p99, len(samples) / self.durations[flow]))
+        return rows
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Returns the q-th percentile using the inclusive method."""
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method="inclusive")[int(q) - 1]
+
+
+async def build_backends(args: argparse.Namespace) -> Tuple[Any, Any]:
+    db: Any
+    if args.backend == "live":
+        db, cache = Database(), Cache()
+        journal: Any = RedisTaskJournal(cache.db, "load")
+    else:
+        db, cache = InMemoryDatabase(args.db_latency), InMemoryCache(args.cache_latency, args.stall)
+        journal = InMemoryJournal()
+    if not args.no_fallback:
+        cache = ResilientCache(cache, reset_timeout=args.breaker_reset)
+    if args.write_behind:
+        db = WriteBehindDatabase(db, journal)
+    await db.connect()
+    return db, cache
+
+
+async def main(args: argparse.Namespace) -> None:
+    db, cache = await build_backends(args)
+    raw_db = getattr(db, "db", db)
+    client = ScheduledStubClient(
+        args.send_latency,
+        global_rate=args.global_rate,
+        global_burst=args.global_rate,
+        chat_rate=args.chat_rate,
+        chat_burst=args.chat_rate,
+    )
+    dispatcher = Dispatcher(args.workers)
+    raw_cache = getattr(cache, "cache", cache)
+
+    def on_flow(flow: str) -> None:
+        if isinstance(raw_cache, InMemoryCache):
+            raw_cache.incident = args.cache_incident if flow in INCIDENT_FLOWS else None
+
+    load_test = LoadTest(client, db, cache, dispatcher, args.users, args.tasks, args.seed, args.toggles, on_flow)
+    try:
+        await load_test.run()
+        await dispatcher.stop()
+        await client.drain()
+        await wait_for_reconcile(cache, args.stall + 1)
+    finally:
+        await db.close()
+        await cache.close()
+    print_report(load_test, raw_db, cache)
+
+
+async def wait_for_reconcile(cache: Any, timeout: float) -> None:
+    """Gives the sessions changed during an incident up to `timeout` seconds to be written back."""
+    deadline = time.monotonic() + timeout
+    while isinstance(cache, ResilientCache) and cache.unreconciled and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def print_report(load_test: LoadTest, raw_db: Any, cache: Any) -> None:
+    print(f"{'flow':<10}{'updates':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'upd/s':>12}")
+    for flow, updates, p50, p95, p99, throughput in load_test.report():
+        print(f"{flow:<10}{updates:>10}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}{throughput:>12.1f}")
+    if isinstance(raw_db, InMemoryDatabase):
+        print(f"{raw_db.queries} database round trips, {raw_db.task_updates} task rows updated")
+    if isinstance(cache, ResilientCache) and cache.fallback_calls:
+        print(
+            f"{cache.fallback_calls} session calls served in process, {cache.reconciled} sessions written back, "
+            f"{len(cache.unreconciled)} left; breaker {cache.breaker.state}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="number of concurrent simulated users")
+    parser.add_argument("--tasks", type=int, default=5, help="tasks each user creates")
+    parser.add_argument("--backend", choices=["memory", "live"], default="memory")
+    parser.add_argument("--db-latency", type=float, default=0.0005, help="simulated query latency, seconds")
+    parser.add_argument("--cache-latency", type=float, default=0.0002, help="simulated Redis latency, seconds")
+    parser.add_argument("--send-latency", type=float, default=0.0, help="simulated Telegram API latency, seconds")
+    parser.add_argument("--toggles", type=int, default=1, help="times each user toggles the opened task")
+    parser.add_argument("--write-behind", action="store_true", help="buffer toggles and edits, see WRITE_BEHIND_*")
+    parser.add_argument(
+        "--cache-incident", choices=["stall", "error"], help="Redis fails during " + ", ".join(INCIDENT_FLOWS)
+    )
+    parser.add_argument("--stall", type=float, default=5.0, help="seconds a stalled Redis call hangs")
+    parser.add_argument("--no-fallback", action="store_true", help="use the cache without ResilientCache")
+    parser.add_argument("--breaker-reset", type=float, default=0.1, help="see CACHE_BREAKER_RESET")
+    parser.add_argument("--workers", type=int, default=16, help="dispatcher workers")
+    parser.add_argument("--global-rate", type=float, default=1e6, help="send scheduler global rate, calls/second")
+    parser.add_argument("--chat-rate", type=float, default=1e6, help="send scheduler per-chat rate, calls/second")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
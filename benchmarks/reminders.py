@@ -0,0 +1,165 @@
+"""
+Simulated day of task reminders.
+
+Several `ReminderScheduler`s share an in-memory database holding many pending reminders, due on whole minutes as
+users set them, and run on a fake clock, so a day passes in seconds. Halfway through, some tasks that are about to
+come due are completed or moved to a later time; with `--crash`, one scheduler dies without releasing its claims.
+The run checks that every reminder still due was sent exactly once and never early, and reports lateness and
+database round trips:
+
+    python -m benchmarks.reminders --reminders 100000 --schedulers 2
+    python -m benchmarks.reminders --crash
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fakes import FakeClock, InMemoryDatabase
+from bot.callbacks import decode_callback
+from bot.reminders import ReminderScheduler
+
+START = datetime(2025, 1, 1)
+FIRST_CHAT_ID = 30_000_000
+STEP = 60
+
+
+class ReminderInbox:
+    """Client that records when each task's reminder arrived, by the task ID in its keyboard."""
+
+    def __init__(self, clock: FakeClock) -> None:
+        self.clock = clock
+        self.received: Dict[int, List[datetime]] = {}
+
+    async def send_message(self, chat_id: int, text: str, reply_markup: Any = None, **kwargs: Any) -> None:
+        task_id = decode_callback(reply_markup.inline_keyboard[0][0].callback_data).args[0]
+        self.received.setdefault(task_id, []).append(self.clock.now())
+
+
+async def schedule(db: InMemoryDatabase, args: argparse.Namespace, rng: random.Random) -> Dict[int, datetime]:
+    """Creates the users' tasks and gives each a due minute within `--hours`; returns the due time per task."""
+    due: Dict[int, datetime] = {}
+    per_user = args.reminders // args.users
+    for chat_id in range(FIRST_CHAT_ID, FIRST_CHAT_ID + args.users):
+        await db.create_tasks(str(chat_id), [(f"Task {i}", None) for i in range(per_user)])
+        for created_at, task_id in db.task_keys[str(chat_id)]:
+            due_at = START + timedelta(minutes=rng.randrange(1, args.hours * 60))
+            await db.set_task_due(task_id, str(chat_id), due_at)
+            due[task_id] = due_at
+    return due
+
+
+async def interfere(db: InMemoryDatabase, due: Dict[int, Optional[datetime]], now: datetime, count: int) -> None:
+    """Completes or postpones by an hour some tasks due within the lookahead, which schedulers may already hold."""
+    soon = [task_id for task_id, due_at in due.items() if due_at and now < due_at <= now + timedelta(minutes=1)]
+    for index, task_id in enumerate(soon[:count]):
+        telegram_id = db.tasks[task_id][5]
+        if index % 2:
+            await db.toggle_task(task_id, telegram_id)
+            due[task_id] = None
+        else:
+            due[task_id] = due[task_id] + timedelta(hours=1)  # type: ignore
+            await db.set_task_due(task_id, telegram_id, due[task_id])
+
+
+def check(due: Dict[int, Optional[datetime]], inbox: ReminderInbox) -> Tuple[List[str], List[float]]:
+    """Returns the reminders sent wrongly and the lateness in seconds of the others."""
+    failures, lateness = [], []
+    for task_id, due_at in due.items():
+        received = inbox.received.get(task_id, [])
+        failure = check_task(due_at, received)
+        if failure:
+            failures.append(f"task {task_id}: {failure}")
+        elif due_at is not None:
+            lateness.append((received[0] - due_at).total_seconds())
+    return failures, lateness
+
+
+def check_task(due_at: Optional[datetime], received: List[datetime]) -> Optional[str]:
+    """Describes what is wrong with the reminders received for one task, or None if they are right."""
+    if due_at is None:
+        return f"completed, still reminded at {received}" if received else None
+    if len(received) != 1:
+        return f"due {due_at}, reminded at {received}"
+    if received[0] < due_at:
+        return f"due {due_at}, reminded early at {received[0]}"
+    return None
+
+
+async def start(schedulers: List[ReminderScheduler], clock: FakeClock) -> None:
+    """Starts the schedulers and waits until each is sleeping on the clock."""
+    for scheduler in schedulers:
+        scheduler.start()
+    while clock.sleeping < len(schedulers):
+        await asyncio.sleep(0)
+
+
+async def simulate(
+    db: InMemoryDatabase,
+    due: Dict[int, Optional[datetime]],
+    clock: FakeClock,
+    schedulers: List[ReminderScheduler],
+    args: argparse.Namespace,
+) -> float:
+    """Advances the clock through the day, crashing and interfering on the way; returns the wall time taken."""
+    started = time.perf_counter()
+    steps = (args.hours * 3600 + int(args.lookahead + args.lease + args.poll)) // STEP + 1
+    for step in range(steps):
+        if step == steps // 4 and args.crash:
+            schedulers[0]._task.cancel()  # type: ignore
+            while clock.sleeping >= len(schedulers):
+                await asyncio.sleep(0)
+        if step == steps // 2:
+            await interfere(db, due, clock.now(), args.interfere)
+        await clock.advance(STEP)
+    return time.perf_counter() - started
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    db = InMemoryDatabase(args.db_latency)
+    due: Dict[int, Optional[datetime]] = dict(await schedule(db, args, rng))
+    setup_queries, db.queries = db.queries, 0
+
+    clock = FakeClock(START)
+    inbox = ReminderInbox(clock)
+    schedulers = [
+        ReminderScheduler(db, inbox, clock, lookahead=args.lookahead, poll_interval=args.poll, lease=args.lease)
+        for _ in range(args.schedulers)
+    ]
+    await start(schedulers, clock)
+    elapsed = await simulate(db, due, clock, schedulers, args)
+    for scheduler in schedulers[1:] if args.crash else schedulers:
+        await scheduler.stop()
+
+    failures, lateness = check(due, inbox)
+    sent = sum(map(len, inbox.received.values()))
+    print(f"{sent} reminders from {args.schedulers} schedulers over {args.hours}h simulated in {elapsed:.2f}s")
+    print(f"lateness: max {max(lateness, default=0):.0f}s, {sum(1 for s in lateness if s > 0)} late")
+    print(f"{db.queries} database round trips while running ({setup_queries} to set up)")
+    print("\n".join(failures[:20]) if failures else "every current reminder was sent exactly once, none early")
+    if failures:
+        raise SystemExit(1)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reminders", type=int, default=100000, help="pending reminders, spread over the users")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--hours", type=int, default=24, help="reminders are due within this many hours")
+    parser.add_argument("--schedulers", type=int, default=2, help="schedulers sharing the database")
+    parser.add_argument("--lookahead", type=float, default=60, help="see REMINDER_LOOKAHEAD")
+    parser.add_argument("--poll", type=float, default=10, help="see REMINDER_POLL_INTERVAL")
+    parser.add_argument("--lease", type=float, default=120, help="see REMINDER_LEASE")
+    parser.add_argument("--interfere", type=int, default=20, help="tasks completed or postponed halfway")
+    parser.add_argument("--crash", action="store_true", help="kill one scheduler a quarter of the way through")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="simulated query latency, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,157 @@
+"""
+Local run of the scaled-out bot: a stub update source feeds the ingress, which fans updates out over an in-process
+transport to several workers sharing in-memory backends; their replies are relayed to a stub client.
+
+Some updates are delivered twice and every worker is restarted halfway through, as after a crash. The run checks
+that each user ends up with exactly the tasks it sent, in order, and reports throughput:
+
+    python -m benchmarks.scaleout --workers 4 --users 100 --tasks 5
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List
+
+from benchmarks.fakes import (
+    InMemoryCache,
+    InMemoryDatabase,
+    ScheduledStubClient,
+    make_message,
+)
+from bot.ingress import OUTBOX_CONSUMER, Ingress, OutboxRelay
+from bot.keyboards import Buttons
+from bot.transport import LocalTransport
+from bot.worker import OutboxClient, Worker, assigned_partitions
+
+FIRST_CHAT_ID = 20_000_000
+
+
+def script(chat_id: int, tasks: int) -> List[str]:
+    """Messages a user sends: registration and adding tasks one by one."""
+    texts = ["/start", Buttons.REGISTRATION, f"User {chat_id}", f"user_{chat_id}"]
+    for i in range(tasks):
+        texts += [Buttons.ADD, f"Task {i} of {chat_id}", f"Description {i}"]
+    return texts
+
+
+class ScaleOutRun:
+    """Runs the ingress, the outbox relay and `workers` workers as tasks of one event loop."""
+
+    def __init__(self, args: argparse.Namespace, db: InMemoryDatabase, cache: InMemoryCache) -> None:
+        self.args = args
+        self.db = db
+        self.cache = cache
+        self.transport = LocalTransport()
+        self.client = ScheduledStubClient(global_rate=1e6, global_burst=1e6, chat_rate=1e6, chat_burst=1e6)
+        self.ingress = Ingress(self.transport)
+        self.random = random.Random(args.seed)
+        self.duplicates = 0
+        self.workers: Dict[int, Worker] = {}
+        self.tasks: Dict[int, "asyncio.Task[None]"] = {}
+
+    def start_worker(self, index: int) -> None:
+        partitions = assigned_partitions(index, self.args.workers)
+        client = OutboxClient(self.transport)
+        worker = Worker(
+            self.transport,
+            partitions,
+            f"worker-{index}",
+            client,
+            self.db,
+            self.cache,
+            max_in_flight=self.args.max_in_flight,
+            read_count=self.args.read_count,
+        )
+        self.workers[index] = worker
+        self.tasks[index] = asyncio.create_task(worker.run())
+
+    async def restart_worker(self, index: int) -> None:
+        """Stops a worker mid-stream and starts it again under the same consumer name."""
+        self.tasks[index].cancel()
+        await self.workers[index].stop()
+        self.transport.restart(f"worker-{index}")
+        self.start_worker(index)
+
+    async def feed(self, chat_id: int) -> None:
+        for text in script(chat_id, self.args.tasks):
+            message = make_message(self.client, chat_id, text)
+            await self.ingress.publish_update(self.client, message)
+            if self.random.random() < self.args.duplicate_rate:
+                self.duplicates += 1
+                await self.ingress.publish_update(self.client, message)
+            await asyncio.sleep(0)
+
+    async def settle(self) -> None:
+        """Waits until every update and outgoing call has been handled and acknowledged."""
+        while any(self.transport.pending.values()) or any(
+            self.transport.delivered.get(stream, 0) < len(entries) for stream, entries in self.transport.streams.items()
+        ):
+            await asyncio.sleep(0.01)
+        await self.client.drain()
+
+    async def run(self) -> float:
+        chat_ids = [FIRST_CHAT_ID + i for i in range(self.args.users)]
+        for index in range(self.args.workers):
+            self.start_worker(index)
+        relay = asyncio.create_task(OutboxRelay(self.transport, self.client).run())
+
+        started = time.perf_counter()
+        feeding = asyncio.gather(*(self.feed(chat_id) for chat_id in chat_ids))
+        await asyncio.sleep(0.05)
+        for index in range(self.args.workers):
+            await self.restart_worker(index)
+        await feeding
+        await self.settle()
+        elapsed = time.perf_counter() - started
+
+        for task in [relay, *self.tasks.values()]:
+            task.cancel()
+        for worker in self.workers.values():
+            await worker.stop()
+        assert not self.transport.pending.get("outbox"), f"{OUTBOX_CONSUMER} left calls unacknowledged"
+        return elapsed
+
+
+def check(db: InMemoryDatabase, users: int, tasks: int) -> List[str]:
+    """Returns the users whose tasks differ from the ones they sent."""
+    failures = []
+    for chat_id in (FIRST_CHAT_ID + i for i in range(users)):
+        titles = [db.tasks[task_id][1] for _, task_id in db.task_keys.get(str(chat_id), [])]
+        if titles != [f"Task {i} of {chat_id}" for i in range(tasks)]:
+            failures.append(f"{chat_id}: {titles}")
+    return failures
+
+
+async def main(args: argparse.Namespace) -> None:
+    db, cache = InMemoryDatabase(args.db_latency), InMemoryCache(args.cache_latency)
+    scale_out = ScaleOutRun(args, db, cache)
+    elapsed = await scale_out.run()
+    updates = sum(len(entries) for stream, entries in scale_out.transport.streams.items() if stream != "outbox")
+
+    failures = check(db, args.users, args.tasks)
+    print(f"{updates} updates ({scale_out.duplicates} duplicates) on {args.workers} workers in {elapsed:.2f}s")
+    print(f"{updates / elapsed:.1f} updates/s, {len(scale_out.client.sent)} chats replied to")
+    print(f"{scale_out.transport.redelivered} pending entries delivered again after restarts")
+    print("\n".join(failures) if failures else "every user has exactly its tasks, in order")
+    if failures:
+        raise SystemExit(1)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4, help="number of simulated worker processes")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=5, help="tasks each user creates")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="see WORKER_MAX_IN_FLIGHT")
+    parser.add_argument("--read-count", type=int, default=10, help="entries per stream read, see STREAM_READ_COUNT")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="share of updates delivered twice")
+    parser.add_argument("--db-latency", type=float, default=0.0005, help="simulated query latency, seconds")
+    parser.add_argument("--cache-latency", type=float, default=0.0002, help="simulated Redis latency, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
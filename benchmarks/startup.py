@@ -0,0 +1,74 @@
+"""
+Startup benchmark for the bot's entry points.
+
+Imports every entry module in fresh interpreters and reports the median import time and which service drivers were
+loaded on the way, then times `BotApp.start` with in-memory backends whose connections take `--connect-latency`:
+
+    python -m benchmarks.startup --runs 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+from benchmarks.fakes import InMemoryCache, InMemoryDatabase, StubClient
+from bot.bot import BotApp
+
+ENTRY_MODULES = ["bot.bot", "bot.worker", "bot.ingress"]
+DRIVERS = {"asyncpg", "redis", "sqlalchemy", "psycopg2"}
+
+PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import {module}\n"
+    "print(time.perf_counter() - started, *sorted({drivers!r} & sys.modules.keys()))\n"
+)
+
+
+def import_once(module: str) -> Tuple[float, List[str]]:
+    """Imports `module` in a new interpreter; returns the import time and the drivers it loaded."""
+    probe = PROBE.format(module=module, drivers=DRIVERS)
+    output = subprocess.run(
+        [sys.executable, "-c", probe], check=True, capture_output=True, text=True
+    ).stdout.splitlines()[-1]
+    seconds, *drivers = output.split()
+    return float(seconds), drivers
+
+
+async def time_bootstrap(connect_latency: float) -> float:
+    """Returns the seconds `BotApp.start` takes when logging in and opening the pool each take `connect_latency`."""
+    client = StubClient(connect_latency=connect_latency)
+    app = BotApp(client, InMemoryDatabase(connect_latency=connect_latency), InMemoryCache())
+    started = time.perf_counter()
+    await app.start()
+    elapsed = time.perf_counter() - started
+    await app.stop()
+    return elapsed
+
+
+def main(args: argparse.Namespace) -> None:
+    print(f"{'module':<14}{'import ms':>12}  drivers loaded")
+    for module in ENTRY_MODULES:
+        runs = [import_once(module) for _ in range(args.runs)]
+        median = statistics.median(seconds for seconds, _ in runs)
+        print(f"{module:<14}{median * 1000:>12.1f}  {', '.join(runs[-1][1]) or '-'}")
+
+    elapsed = asyncio.run(time_bootstrap(args.connect_latency))
+    print(f"bootstrap: {elapsed * 1000:.1f} ms to start with {args.connect_latency * 1000:.0f} ms connections")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per entry module")
+    parser.add_argument(
+        "--connect-latency", type=float, default=0.2, help="simulated Telegram login and pool setup time, seconds"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
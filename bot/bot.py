@@ -1,31 +1,125 @@
+import asyncio
 import os
+from typing import Any, Optional, Tuple
 
-from dotenv import load_dotenv
-from pyrogram.client import Client
 from pyrogram.handlers.callback_query_handler import CallbackQueryHandler
 from pyrogram.handlers.message_handler import MessageHandler
-from pyrogram.sync import idle
+from pyrogram.methods.utilities.idle import idle
 
+from bot.callbacks import check_callback_secret
+from bot.digest import DIGEST_ENABLED, DigestJob, RedisDigestCheckpoint
+from bot.dispatcher import Dispatcher
 from bot.handler import CallbackHandler, TaskHandler
 from bot.messages import Messages
+from bot.reminders import ReminderScheduler
+from bot.sender import ScheduledClient
+from cache.cache import Cache
+from cache.resilient import ResilientCache
+from config.config import load_config
+from database.database import Database
+from database.write_behind import (
+    WRITE_BEHIND_ENABLED,
+    RedisTaskJournal,
+    WriteBehindDatabase,
+)
+from metrics.metrics import start_metrics_server
 
-load_dotenv()
+load_config()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 API_ID = os.getenv("API_ID")
 API_HASH = os.getenv("API_HASH")
 
-if not all([BOT_TOKEN, API_ID, API_HASH]):
-    raise ValueError(Messages.MISSING_API_CREDENTIALS)
 
-app = Client(name="bot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN, workdir="sessions")  # type: ignore
+class BotApp:
+    """
+    Wires the client, the database and the cache into the handlers, reminders and the daily digest (with
+    `DIGEST_ENABLED`); nothing connects before `start`.
+    """
 
-task_handler = TaskHandler(app)
-callback_handler = CallbackHandler(app)
+    def __init__(
+        self,
+        client: Any,
+        db: Any,
+        cache: Any,
+        dispatcher: Optional[Dispatcher] = None,
+        reminders: Optional[ReminderScheduler] = None,
+        digest: Optional[DigestJob] = None,
+    ) -> None:
+        self.client = client
+        self.db = db
+        self.cache = cache
+        self.dispatcher = dispatcher or Dispatcher()
+        self.reminders = reminders or ReminderScheduler(db, client)
+        if digest is None and DIGEST_ENABLED:
+            digest = DigestJob(db, client, RedisDigestCheckpoint(cache.db))
+        self.digest = digest
+        self.task_handler = TaskHandler(client, db, cache)
+        self.callback_handler = CallbackHandler(client, db, cache)
 
-app.add_handler(MessageHandler(task_handler.handle_updates))
-app.add_handler(CallbackQueryHandler(callback_handler.handle_callback))
+        client.add_handler(MessageHandler(self.dispatcher.wrap(self.task_handler.handle_updates)))
+        client.add_handler(CallbackQueryHandler(self.dispatcher.wrap(self.callback_handler.handle_callback)))
 
-app.start()  # type: ignore
-idle()
-app.stop()  # type: ignore
+    async def start(self) -> None:
+        """Opens the database pool and logs in to Telegram concurrently, then starts sending reminders and digests."""
+        await asyncio.gather(self.db.connect(), self.client.start())
+        self.reminders.start()
+        if self.digest:
+            self.digest.start()
+
+    async def stop(self) -> None:
+        """Finishes the dispatched updates, delivers the queued replies and closes all connections."""
+        try:
+            if self.digest:
+                await self.digest.stop()
+            await self.reminders.stop()
+            if self.client.is_connected:
+                await self.dispatcher.stop()
+                await self.client.stop()
+        finally:
+            await self.db.close()
+            await self.cache.close()
+
+
+def create_backends(name: str = "bot") -> Tuple[Any, ResilientCache]:
+    """
+    Creates the database and the cache, which falls back to an in-process session store while Redis is failing; with
+    `WRITE_BEHIND_ENABLED`, task edits are buffered and journaled.
+    """
+    db: Any = Database()
+    cache = ResilientCache(Cache())
+    if WRITE_BEHIND_ENABLED:
+        db = WriteBehindDatabase(db, RedisTaskJournal(cache.db, name))
+    return db, cache
+
+
+def create_client(name: str = "bot") -> ScheduledClient:
+    """Creates the Telegram client from the credentials in the environment, with its session stored under `name`."""
+    if not all([BOT_TOKEN, API_ID, API_HASH]):
+        raise ValueError(Messages.MISSING_API_CREDENTIALS)
+
+    # FloodWait is handled by the send scheduler, so Pyrogram must not sleep on it inside a handler.
+    return ScheduledClient(
+        name=name,
+        api_id=API_ID,  # type: ignore
+        api_hash=API_HASH,  # type: ignore
+        bot_token=BOT_TOKEN,  # type: ignore
+        workdir="sessions",
+        sleep_threshold=0,
+    )
+
+
+async def main() -> None:
+    """Builds the bot, runs it until interrupted and closes all connections."""
+    check_callback_secret()
+    app = BotApp(create_client(), *create_backends())
+    start_metrics_server()
+    try:
+        await app.start()
+        await idle()
+    finally:
+        await app.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+from typing import NamedTuple, Tuple
+
+from bot.messages import Messages
+from config.config import load_config
+
+load_config()
+
+# Empty only when neither is set; entry points refuse to start then, see `check_callback_secret`.
+CALLBACK_SECRET = (os.getenv("CALLBACK_SECRET") or os.getenv("BOT_TOKEN") or "").encode()
+CALLBACK_VERSION = 1
+TAG_SIZE = 8
+MAX_ARGS = 3
+
+HEADER = struct.Struct(">BBq")
+ARG = struct.Struct(">Q")
+
+
+class InvalidCallback(ValueError):
+    """Raised for callback data that is malformed, outdated or not signed by this bot."""
+
+
+class Callback(NamedTuple):
+    """Decoded inline button payload."""
+
+    action: int
+    owner: int
+    args: Tuple[int, ...]
+
+
+def check_callback_secret() -> None:
+    """Raises ValueError when no signing key is configured; callback data signed with an empty key is forgeable."""
+    if not CALLBACK_SECRET:
+        raise ValueError(Messages.MISSING_CALLBACK_SECRET)
+
+
+def _sign(payload: bytes) -> bytes:
+    return hmac.new(CALLBACK_SECRET, payload, hashlib.sha256).digest()[:TAG_SIZE]
+
+
+def encode_callback(action: int, owner: int, *args: int) -> str:
+    """
+    Packs an action, the ID of the user or chat the button is shown to and up to three unsigned integers into callback
+    data. The owner is signed, as group chat IDs are negative.
+
+    The layout is `version | action | owner | args... | tag`, base64url without padding: 35 characters for a task
+    button and 56 for a page cursor, within Telegram's 64-byte limit.
+    """
+    if len(args) > MAX_ARGS:
+        raise ValueError(f"At most {MAX_ARGS} callback arguments are supported")
+    payload = HEADER.pack(CALLBACK_VERSION, action, owner) + b"".join(ARG.pack(arg) for arg in args)
+    return base64.urlsafe_b64encode(payload + _sign(payload)).rstrip(b"=").decode()
+
+
+def decode_callback(data: str) -> Callback:
+    """Unpacks and verifies callback data produced by `encode_callback`; raises InvalidCallback otherwise."""
+    payload = _verified_payload(data)
+    version, action, owner = HEADER.unpack_from(payload)
+    if version != CALLBACK_VERSION:
+        raise InvalidCallback("Outdated version")
+    return Callback(action, owner, tuple(arg for (arg,) in ARG.iter_unpack(payload[HEADER.size :])))
+
+
+def _verified_payload(data: str) -> bytes:
+    try:
+        raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    except (binascii.Error, ValueError):
+        raise InvalidCallback("Not base64url")
+
+    payload, tag = raw[:-TAG_SIZE], raw[-TAG_SIZE:]
+    arg_bytes = len(payload) - HEADER.size
+    if arg_bytes < 0 or arg_bytes % ARG.size or arg_bytes // ARG.size > MAX_ARGS:
+        raise InvalidCallback("Unexpected length")
+    if not hmac.compare_digest(tag, _sign(payload)):
+        raise InvalidCallback("Bad signature")
+    return payload
@@ -0,0 +1,65 @@
+from typing import Any, Dict, Optional, Tuple
+
+from bot.states import Keys
+from cache.cache import Cache
+from database.database import Database
+
+_UNSET: Any = object()
+
+
+class UpdateContext:
+    """Per-update view of the user row and FSM session.
+
+    Both are loaded lazily on first access and memoized for the rest of the update. Session
+    changes are staged in memory and written back by `flush` in a single round trip.
+    """
+
+    def __init__(self, uid: str, db: Database, cache: Cache) -> None:
+        self.uid = uid
+        self.db = db
+        self.cache = cache
+        self._user: Any = _UNSET
+        self._session: Optional[Dict[str, Any]] = None
+        self._changes: Dict[str, Any] = {}
+        self._reset = False
+
+    async def get_user(self) -> Optional[Tuple[int, str, str]]:
+        """Returns the registered user row, querying the database at most once."""
+        if self._user is _UNSET:
+            self._user = await self.db.get_user(self.uid)
+        return self._user
+
+    async def get_session(self) -> Dict[str, Any]:
+        """Returns the whole session including staged changes, reading Redis at most once."""
+        if self._session is None:
+            stored = {} if self._reset else await self.cache.get_user_session(self.uid)
+            self._session = {**stored, **self._changes}
+        return self._session
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Returns a single session field."""
+        return (await self.get_session()).get(key)
+
+    async def get_state(self) -> Optional[str]:
+        """Returns the current FSM state."""
+        return await self.get(Keys.STATE)
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Stages session fields to be written on flush."""
+        self._changes.update(values)
+        if self._session is not None:
+            self._session.update(values)
+
+    def clear(self) -> None:
+        """Stages removal of the whole session, dropping any changes staged before."""
+        self._reset = True
+        self._changes = {}
+        self._session = {}
+
+    async def flush(self) -> None:
+        """Writes staged session changes, if any, in one round trip."""
+        if not (self._reset or self._changes):
+            return
+        await self.cache.save_user_session(self.uid, self._changes, reset=self._reset)
+        self._changes = {}
+        self._reset = False
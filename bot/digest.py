@@ -0,0 +1,229 @@
+"""
+Daily digest of every user's open tasks.
+
+The bot sends it at `DIGEST_TIME` when `DIGEST_ENABLED` is set. It can also be sent by hand, or rendered from the
+database without sending anything or touching the checkpoint:
+
+    python -m bot.digest
+    python -m bot.digest --dry-run
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from contextlib import suppress
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bot.reminders import Clock, to_local, to_utc
+from bot.sender import Priority
+from bot.utils import render_digest
+from config.config import load_config
+from metrics.metrics import DIGEST_PROGRESS, DIGESTS
+
+load_config()
+
+DIGEST_ENABLED = os.getenv("DIGEST_ENABLED", "false").lower() == "true"
+DIGEST_TIME = time.fromisoformat(os.getenv("DIGEST_TIME", "09:00"))
+DIGEST_CHUNK_SIZE = int(os.getenv("DIGEST_CHUNK_SIZE", 500))
+DIGEST_MAX_TASKS = int(os.getenv("DIGEST_MAX_TASKS", 10))
+DIGEST_CHECKPOINT_TTL = 7 * 24 * 3600
+DIGEST_RETRY_DELAY = 60
+
+
+class RedisDigestCheckpoint:
+    """
+    Keeps the progress of each day's digest in a Redis hash: the last `telegram_id` handled, the number of users
+    handled and whether the run finished. Hashes expire after a week.
+    """
+
+    def __init__(self, db: Any) -> None:
+        self.db = db
+
+    @staticmethod
+    def key(day: date) -> str:
+        return f"digest:{day.isoformat()}"
+
+    async def load(self, day: date) -> Dict[str, str]:
+        return await self.db.hgetall(self.key(day))
+
+    async def save(self, day: date, values: Dict[str, Any]) -> None:
+        async with self.db.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key(day), mapping=values)
+            pipe.expire(self.key(day), DIGEST_CHECKPOINT_TTL)
+            await pipe.execute()
+
+
+class MemoryCheckpoint:
+    """Implements the checkpoint API on a dict, for dry runs; nothing survives the process."""
+
+    def __init__(self) -> None:
+        self.days: Dict[date, Dict[str, str]] = {}
+
+    async def load(self, day: date) -> Dict[str, str]:
+        return dict(self.days.get(day, {}))
+
+    async def save(self, day: date, values: Dict[str, Any]) -> None:
+        self.days.setdefault(day, {}).update({key: str(value) for key, value in values.items()})
+
+
+class DryRunClient:
+    """Client stand-in that counts the digests and prints the first `show` of them instead of sending anything."""
+
+    def __init__(self, show: int = 3) -> None:
+        self.show = show
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> bool:
+        self.sent += 1
+        if self.sent <= self.show:
+            print(f"--- to {chat_id}\n{text}\n")
+        return True
+
+
+class DigestJob:
+    """
+    Sends every user with open tasks a summary of them once a day, from a single background task.
+
+    Users are read in chunks of `chunk_size`, in `telegram_id` order, with one aggregating query per chunk; the next
+    chunk is fetched while the current one is sent. Digests go through the client's send scheduler at `BULK`
+    priority, so its global rate keeps the broadcast within Telegram's limits and replies to users go first. After
+    each chunk is delivered the last `telegram_id` is checkpointed, so a run that crashes resumes after it. Delivery
+    is at least once: the digests of the chunk in flight during a crash are sent again.
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        client: Any,
+        checkpoint: Any,
+        clock: Optional[Clock] = None,
+        at: time = DIGEST_TIME,
+        chunk_size: int = DIGEST_CHUNK_SIZE,
+        max_tasks: int = DIGEST_MAX_TASKS,
+    ) -> None:
+        self.db = db
+        self.client = client
+        self.checkpoint = checkpoint
+        self.clock = clock or Clock()
+        self.at = at
+        self.chunk_size = chunk_size
+        self.max_tasks = max_tasks
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        """Starts the daily loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the loop; an unfinished run resumes from its checkpoint on the next start."""
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def run(self, day: date) -> int:
+        """Sends the digest of `day`, resuming after the last checkpointed user, and returns the number sent."""
+        state = await self.checkpoint.load(day)
+        if state.get("done"):
+            return 0
+        after, users, sent = state.get("after", ""), int(state.get("users", 0)), 0
+        DIGEST_PROGRESS.set(users)
+        rows = await self.db.get_digests(after, self.chunk_size, self.max_tasks)
+        while rows:
+            delivered, upcoming = await self._send_chunk(rows)
+            after, users, sent = rows[-1][0], users + len(rows), sent + delivered
+            await self.checkpoint.save(day, {"after": after, "users": users})
+            DIGEST_PROGRESS.set(users)
+            rows = await upcoming if upcoming else []
+        await self.checkpoint.save(day, {"done": 1})
+        logging.info(f"[digest] Digest of {day} finished, {sent} sent by this run")
+        return sent
+
+    async def send(self, telegram_id: str, open_tasks: int, titles: List[str], due_dates: List[Any]) -> bool:
+        """Queues one digest and waits until it is delivered; returns whether it was."""
+        local_dates = [to_local(due_at) if due_at else None for due_at in due_dates]
+        text = render_digest(open_tasks, titles, local_dates)
+        try:
+            queued = await self.client.send_message(int(telegram_id), text, priority=Priority.BULK, coalesce=False)
+            # The send scheduler returns a future of the result, which is None if delivery failed.
+            if asyncio.isfuture(queued) and await queued is None:
+                DIGESTS.labels("failed").inc()
+                return False
+        except Exception as e:
+            DIGESTS.labels("failed").inc()
+            logging.error(f"[digest] Failed to send the digest of {telegram_id}: {e}", exc_info=True)
+            return False
+        DIGESTS.labels("sent").inc()
+        return True
+
+    def scheduled(self, day: date) -> datetime:
+        """Returns the naive UTC time at which the digest of a local `day` is due."""
+        return to_utc(datetime.combine(day, self.at))
+
+    async def _send_chunk(self, rows: List[Any]) -> Tuple[int, "Optional[asyncio.Future[List[Any]]]"]:
+        # The next chunk is fetched while this one is sent; a full chunk may not be the last.
+        upcoming = None
+        if len(rows) == self.chunk_size:
+            upcoming = asyncio.ensure_future(self.db.get_digests(rows[-1][0], self.chunk_size, self.max_tasks))
+        try:
+            results = await asyncio.gather(*[self.send(*row) for row in rows])
+        except BaseException:
+            if upcoming:
+                upcoming.cancel()
+            raise
+        return sum(results), upcoming
+
+    async def _run(self) -> None:
+        while True:
+            now = self.clock.now()
+            day = to_local(now).date()
+            if now < self.scheduled(day):
+                await self.clock.sleep((self.scheduled(day) - now).total_seconds())
+                continue
+            try:
+                await self.run(day)
+            except Exception as e:
+                logging.error(f"[digest] Run of {day} failed, retrying: {e}", exc_info=True)
+                await self.clock.sleep(DIGEST_RETRY_DELAY)
+                continue
+            await self.clock.sleep((self.scheduled(day + timedelta(days=1)) - self.clock.now()).total_seconds())
+
+
+async def main(args: argparse.Namespace) -> None:
+    from bot.bot import create_backends, create_client
+
+    db, cache = create_backends("digest")
+    day = args.day or to_local(Clock().now()).date()
+    if args.dry_run:
+        client: Any = DryRunClient(args.show)
+        checkpoint: Any = MemoryCheckpoint()
+    else:
+        client = create_client("digest")
+        checkpoint = RedisDigestCheckpoint(cache.db)
+
+    await db.connect()
+    try:
+        if not args.dry_run:
+            await client.start()
+        sent = await DigestJob(db, client, checkpoint).run(day)
+        print(f"{'rendered' if args.dry_run else 'sent'} {sent} digests for {day}")
+    finally:
+        if not args.dry_run and client.is_connected:
+            await client.stop()
+        await db.close()
+        await cache.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="render the digests without sending or checkpointing")
+    parser.add_argument("--show", type=int, default=3, help="digests printed in a dry run")
+    parser.add_argument("--day", type=date.fromisoformat, help="local day of the digest, YYYY-MM-DD (default: today)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
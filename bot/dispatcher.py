@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
+
+from pyrogram.types import CallbackQuery, Message
+
+from bot.messages import Messages
+from config.config import load_config
+from metrics.metrics import UPDATES_DROPPED, UPDATES_QUEUED
+
+load_config()
+
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", 16))
+DISPATCH_MAX_PENDING = int(os.getenv("DISPATCH_MAX_PENDING", 20))
+
+Handler = Callable[[Any, Any], Awaitable[None]]
+
+
+def update_key(update: Union[Message, CallbackQuery]) -> int:
+    """Returns the ID the FSM session of an update is stored under: the chat for messages, the user for callbacks."""
+    if isinstance(update, CallbackQuery):
+        return update.from_user.id
+    return update.chat.id
+
+
+class Dispatcher:
+    """
+    Runs the updates of one chat strictly one after another and the updates of different chats concurrently.
+
+    Every chat has a FIFO of pending updates. A chat with pending updates sits in the ready queue exactly once, so a
+    worker takes one update from it, runs it and puts the chat back at the end; different chats therefore share the
+    workers round-robin while a single chat never runs two updates at the same time. Updates beyond `max_pending`
+    for a chat are dropped: callback queries are answered, and the chat is told once until its queue has drained.
+    """
+
+    def __init__(self, workers: int = DISPATCH_WORKERS, max_pending: int = DISPATCH_MAX_PENDING) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self._chats: Dict[int, Deque[Tuple[Handler, Any, Any, "asyncio.Future[None]"]]] = {}
+        self._ready: "Optional[asyncio.Queue[int]]" = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        # Chats told that updates were dropped since their queue last drained.
+        self._warned: Set[int] = set()
+        self._notices: Set["asyncio.Future[Any]"] = set()
+
+    def wrap(self, handler: Handler) -> Handler:
+        """Turns a handler into a Pyrogram callback that only queues the update."""
+
+        async def callback(client: Any, update: Any) -> None:
+            self.submit(update_key(update), handler, client, update)
+
+        return callback
+
+    def submit(self, key: int, handler: Handler, client: Any, update: Any) -> "asyncio.Future[None]":
+        """Queues an update behind the pending ones of the same chat; the future resolves once it was handled."""
+        if self._ready is None:
+            self.start()
+        future = asyncio.get_running_loop().create_future()
+        pending = self._chats.get(key)
+        if pending is None:
+            pending = self._chats[key] = deque()
+            self._ready.put_nowait(key)  # type: ignore
+        elif len(pending) >= self.max_pending:
+            logging.warning(f"[dispatcher] Dropped an update for {key}: {len(pending)} already pending")
+            self._drop(key, update)
+            future.set_result(None)
+            return future
+
+        pending.append((handler, client, update, future))
+        UPDATES_QUEUED.inc()
+        return future
+
+    def start(self) -> None:
+        """Starts the worker tasks; `submit` does this on first use."""
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def join(self) -> None:
+        """Waits until every queued update has been handled."""
+        while self._chats:
+            await asyncio.gather(*(entry[3] for pending in list(self._chats.values()) for entry in pending))
+
+    async def stop(self) -> None:
+        """Handles the queued updates and stops the workers."""
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._ready = None
+
+    def _drop(self, key: int, update: Any) -> None:
+        if isinstance(update, CallbackQuery):
+            UPDATES_DROPPED.labels("callback").inc()
+            # Unanswered, the button keeps spinning in the client.
+            notice = update.answer(Messages.TOO_MANY_UPDATES)
+        else:
+            UPDATES_DROPPED.labels("message").inc()
+            if key in self._warned:
+                return
+            self._warned.add(key)
+            notice = update.reply(Messages.TOO_MANY_UPDATES)
+        task = asyncio.ensure_future(notice)
+        self._notices.add(task)
+        task.add_done_callback(self._notice_done)
+
+    def _notice_done(self, task: "asyncio.Future[Any]") -> None:
+        self._notices.discard(task)
+        if not task.cancelled() and task.exception():
+            logging.error(f"[dispatcher] Failed to tell a chat about dropped updates: {task.exception()}")
+
+    async def _work(self) -> None:
+        while True:
+            key = await self._ready.get()  # type: ignore
+            pending = self._chats[key]
+            # The update stays queued while it runs, so updates submitted meanwhile do not mark the chat ready again.
+            handler, client, update, future = pending[0]
+            try:
+                await handler(client, update)
+            except Exception as e:
+                logging.error(f"[dispatcher] Unhandled error for {key}: {e}", exc_info=True)
+            finally:
+                pending.popleft()
+                UPDATES_QUEUED.dec()
+                future.set_result(None)
+                if pending:
+                    self._ready.put_nowait(key)  # type: ignore
+                else:
+                    del self._chats[key]
+                    self._warned.discard(key)
@@ -1,79 +1,125 @@
 import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Optional, Tuple
 
 from pyrogram.client import Client
-from pyrogram.types import CallbackQuery, Message
+from pyrogram.types import CallbackQuery, Document, InlineKeyboardMarkup, Message
 
+from bot.callbacks import decode_callback
+from bot.context import UpdateContext
 from bot.keyboards import Buttons, InlineButtons, InlineKeyboards, Keyboards
 from bot.messages import Messages
+from bot.reminders import Clock, to_local, to_utc
+from bot.sender import FileClient, SendingClient
 from bot.states import Keys, States
-from bot.utils import get_task_status_icon
+from bot.utils import (
+    DUE_DATE_FORMAT,
+    decode_page_cursor,
+    format_task_ranges,
+    get_task_status_icon,
+    parse_due_date,
+    parse_task_lines,
+    parse_task_ranges,
+    read_task_csv,
+    render_search_page,
+    render_tasks_page,
+    set_task_status_icon,
+)
 from cache.cache import Cache
+from config.config import load_config
 from database.database import Database
+from metrics.metrics import UPDATES_IN_FLIGHT, track_handler
 
-db = Database()
-cache = Cache()
+load_config()
+
+TASKS_PAGE_SIZE = int(os.getenv("TASKS_PAGE_SIZE", 20))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 10))
+TRANSFER_SPOOL_SIZE = int(os.getenv("TRANSFER_SPOOL_SIZE", 1024 * 1024))
+IMPORT_MAX_BYTES = int(os.getenv("IMPORT_MAX_BYTES", 10 * 1024 * 1024))
+IMPORT_MAX_TASKS = int(os.getenv("IMPORT_MAX_TASKS", 10000))
+EXPORT_FILE_NAME = "tasks.csv"
 
 
 class TaskHandler:
     """Handles text messages and user interactions in the chat."""
 
-    def __init__(self, client: Client) -> None:
+    def __init__(self, client: SendingClient, db: Database, cache: Cache) -> None:
         self.client = client
+        self.db = db
+        self.cache = cache
 
     async def handle_updates(self, client: Client, message: Message) -> None:
         """Processes user messages and determines the correct action."""
-        uid = str(message.chat.id)
-        state = cache.get_user_cache(uid, Keys.STATE)
-        user = db.get_user(uid)
-
-        if state:
-            await self.process_state(uid, state, message)
-        else:
-            await self.process_command(uid, user, message)
-
-    async def process_state(self, uid: str, state: str, message: Message) -> None:
+        ctx = UpdateContext(str(message.chat.id), self.db, self.cache)
+        with UPDATES_IN_FLIGHT.track_inprogress():
+            try:
+                state = await ctx.get_state()
+
+                if state:
+                    await self.process_state(ctx, state, message)
+                else:
+                    await self.process_command(ctx, message)
+            finally:
+                await ctx.flush()
+
+    async def process_state(self, ctx: UpdateContext, state: str, message: Message) -> None:
         """Handles different user states."""
         state_handlers = {
             States.ENTER_NAME: self.register_name,
             States.ENTER_USERNAME: self.register_username,
             States.ENTER_TASK_TITLE: self.add_task_title,
             States.ENTER_TASK_DESCRIPTION: self.add_task_description,
+            States.ENTER_TASK_LIST: self.add_task_list,
             States.ENTER_TASK_NUMBER: self.view_task_by_number,
+            States.ENTER_TASK_SELECTION: self.select_tasks,
+            States.ENTER_SEARCH_QUERY: self.search_tasks,
+            States.ENTER_DUE_DATE: self.set_due_date,
+            States.ENTER_IMPORT_FILE: self.import_tasks,
             States.EDIT_TASK_TITLE: self.edit_task_title,
             States.EDIT_TASK_DESCRIPTION: self.edit_task_description,
         }
-        if state in state_handlers:
-            await state_handlers[state](uid, message)
+        handler = state_handlers.get(state)
+        if handler:
+            with track_handler(handler.__name__):
+                await handler(ctx, message)
 
-    async def process_command(self, uid: str, user: object, message: Message) -> None:
+    async def process_command(self, ctx: UpdateContext, message: Message) -> None:
         """Handles user commands outside of states."""
         command_handlers = {
             "/start": self.handle_start,
             Buttons.REGISTRATION: self.initiate_registration,
             Buttons.ALL: self.list_all_tasks,
             Buttons.ADD: self.initiate_task_creation,
+            Buttons.ADD_MANY: self.initiate_bulk_task_creation,
             Buttons.VIEW_TASK: self.request_task_number,
+            Buttons.BULK_ACTIONS: self.show_bulk_actions,
+            Buttons.SEARCH: self.request_search_query,
+            "/search": self.request_search_query,
+            "/export": self.export_tasks,
+            "/import": self.request_import_file,
             "/help": self.handle_help,
             Buttons.HELP: self.handle_help,
         }
 
         handler = command_handlers.get(message.text)
         if handler:
-            if handler in [self.handle_start, self.handle_help]:
-                await handler(uid, user, message)  # type: ignore
-            else:
-                await handler(uid, message)  # type: ignore
+            with track_handler(handler.__name__):
+                await handler(ctx, message)
         else:
-            await self.handle_unknown_command(message)
+            with track_handler(self.handle_unknown_command.__name__):
+                await self.handle_unknown_command(message)
 
-    async def handle_start(self, uid: str, user: object, message: Message) -> None:
+    async def handle_start(self, ctx: UpdateContext, message: Message) -> None:
         """Handles the /start command."""
+        user = await ctx.get_user()
         await message.reply(
             Messages.START_REGISTERED if user else Messages.START_NEW,
             reply_markup=Keyboards.MainMenu if user else Keyboards.RegistrationMenu,
         )
 
-    async def handle_help(self, uid: str, user: object, message: Message) -> None:
+    async def handle_help(self, ctx: UpdateContext, message: Message) -> None:
         """Handles the /help or Help button command."""
         await message.reply(Messages.HELP_TEXT, reply_markup=Keyboards.MainMenu)
 
@@ -81,113 +127,264 @@ class TaskHandler:
         """Handles unknown commands."""
         await message.reply(Messages.UNKNOWN_COMMAND, reply_markup=Keyboards.MainMenu)
 
-    async def list_all_tasks(self, uid: str, message: Message) -> None:
-        """Lists all tasks for the user."""
-        tasks = db.get_tasks(uid)
+    async def list_all_tasks(self, ctx: UpdateContext, message: Message) -> None:
+        """Lists the first page of the user's tasks."""
+        tasks = await self.db.get_tasks_page(ctx.uid, TASKS_PAGE_SIZE + 1)
 
         if not tasks:
             await message.reply(Messages.NO_TASKS_YET, reply_markup=Keyboards.MainMenu)
         else:
-            task_list = "\n".join(
-                [f"{get_task_status_icon(bool(task[3]))} {i + 1}. {task[1]}" for i, task in enumerate(tasks)]
+            text, markup = render_tasks_page(
+                tasks[:TASKS_PAGE_SIZE], 1, has_prev=False, has_next=len(tasks) > TASKS_PAGE_SIZE, owner=int(ctx.uid)
             )
-            await message.reply(Messages.task_list(task_list), reply_markup=Keyboards.MainMenu)
+            await message.reply(text, reply_markup=markup or Keyboards.MainMenu)
 
-    async def initiate_registration(self, uid: str, message: Message) -> None:
+    async def initiate_registration(self, ctx: UpdateContext, message: Message) -> None:
         """Starts the registration process."""
         await message.reply(Messages.ENTER_YOUR_NAME)
-        cache.update_user_cache(uid, Keys.STATE, States.ENTER_NAME)
+        ctx.update({Keys.STATE: States.ENTER_NAME})
 
-    async def initiate_task_creation(self, uid: str, message: Message) -> None:
+    async def initiate_task_creation(self, ctx: UpdateContext, message: Message) -> None:
         """Starts the task creation process."""
         await message.reply(Messages.ENTER_TASK_TITLE, reply_markup=Keyboards.Hide)
-        cache.update_user_cache(uid, Keys.STATE, States.ENTER_TASK_TITLE)
+        ctx.update({Keys.STATE: States.ENTER_TASK_TITLE})
 
-    async def request_task_number(self, uid: str, message: Message) -> None:
+    async def initiate_bulk_task_creation(self, ctx: UpdateContext, message: Message) -> None:
+        """Starts adding many tasks from a single multi-line message."""
+        await message.reply(Messages.ENTER_TASK_LIST, reply_markup=Keyboards.Hide)
+        ctx.update({Keys.STATE: States.ENTER_TASK_LIST})
+
+    async def request_task_number(self, ctx: UpdateContext, message: Message) -> None:
         """Asks the user to enter a task number."""
-        tasks = db.get_tasks(uid)
+        task_count = await self.db.count_tasks(ctx.uid)
 
-        if not tasks:
+        if not task_count:
             await message.reply(Messages.NO_TASKS_YET, reply_markup=Keyboards.MainMenu)
         else:
-            await message.reply(Messages.task_number_request(len(tasks)))
-            cache.update_user_cache(uid, Keys.STATE, States.ENTER_TASK_NUMBER)
+            await message.reply(Messages.task_number_request(task_count))
+            ctx.update({Keys.STATE: States.ENTER_TASK_NUMBER})
+
+    async def show_bulk_actions(self, ctx: UpdateContext, message: Message) -> None:
+        """Shows the actions that apply to many tasks at once."""
+        await message.reply(Messages.CHOOSE_BULK_ACTION, reply_markup=InlineKeyboards.BulkActions(int(ctx.uid)))
+
+    async def request_search_query(self, ctx: UpdateContext, message: Message) -> None:
+        """Asks the user what to search for."""
+        await message.reply(Messages.ENTER_SEARCH_QUERY, reply_markup=Keyboards.Hide)
+        ctx.update({Keys.STATE: States.ENTER_SEARCH_QUERY})
+
+    async def search_tasks(self, ctx: UpdateContext, message: Message) -> None:
+        """Shows the first page of tasks matching the query and keeps the query for paging."""
+        query = (message.text or "").strip()
+        tasks = await self.db.search_tasks(ctx.uid, query, SEARCH_PAGE_SIZE + 1)
+        ctx.clear()
+        if not tasks:
+            await message.reply(Messages.NO_SEARCH_RESULTS, reply_markup=Keyboards.MainMenu)
+            return
+
+        ctx.update({Keys.SEARCH_QUERY: query})
+        text, markup = render_search_page(
+            tasks[:SEARCH_PAGE_SIZE], 0, SEARCH_PAGE_SIZE, has_next=len(tasks) > SEARCH_PAGE_SIZE, owner=int(ctx.uid)
+        )
+        await message.reply(text, reply_markup=markup or Keyboards.MainMenu)
+
+    async def set_due_date(self, ctx: UpdateContext, message: Message) -> None:
+        """Sets or removes the due date of the task chosen with the due date button."""
+        task_id = await ctx.get(Keys.EDITED_TASK_ID)
+        if not task_id:
+            ctx.clear()
+            await message.reply(Messages.TASK_NOT_FOUND, reply_markup=Keyboards.MainMenu)
+            return
+
+        try:
+            due_at = parse_due_date(message.text or "", to_local(Clock().now()))
+        except ValueError:
+            await message.reply(Messages.INVALID_DUE_DATE)
+            return
+
+        task = await self.db.set_task_due(int(task_id), ctx.uid, to_utc(due_at) if due_at else None)
+        ctx.clear()
+        await message.reply(self.due_date_reply(task, due_at), reply_markup=Keyboards.MainMenu)
+
+    @staticmethod
+    def due_date_reply(task: Optional[Tuple[int, str, Optional[datetime]]], due_at: Optional[datetime]) -> str:
+        """Describes the outcome of setting a due date for the reply to the user."""
+        if not task:
+            return Messages.TASK_NOT_FOUND
+        if due_at is None:
+            return Messages.DUE_DATE_REMOVED
+        return Messages.due_date_set(task[1], due_at.strftime(DUE_DATE_FORMAT))
+
+    async def export_tasks(self, ctx: UpdateContext, message: Message) -> None:
+        """Sends the user's tasks as a CSV document, streamed from the database through a bounded spool file."""
+        files = self.files
+        if files is None:
+            await message.reply(Messages.FILES_UNAVAILABLE, reply_markup=Keyboards.MainMenu)
+            return
+
+        with tempfile.SpooledTemporaryFile(max_size=TRANSFER_SPOOL_SIZE) as spool:
+
+            async def write(chunk: bytes) -> None:
+                spool.write(chunk)
+
+            count = await self.db.export_tasks(ctx.uid, write)
+            if not count:
+                await message.reply(Messages.NO_TASKS_YET, reply_markup=Keyboards.MainMenu)
+                return
+
+            spool.seek(0)
+            await files.send_document(
+                message.chat.id, spool, file_name=EXPORT_FILE_NAME, caption=Messages.tasks_exported(count)
+            )
+
+    async def request_import_file(self, ctx: UpdateContext, message: Message) -> None:
+        """Asks for a task file to import."""
+        if self.files is None:
+            await message.reply(Messages.FILES_UNAVAILABLE, reply_markup=Keyboards.MainMenu)
+            return
 
-    async def register_name(self, uid: str, message: Message) -> None:
+        await message.reply(Messages.SEND_IMPORT_FILE, reply_markup=Keyboards.Hide)
+        ctx.update({Keys.STATE: States.ENTER_IMPORT_FILE})
+
+    async def import_tasks(self, ctx: UpdateContext, message: Message) -> None:
+        """Appends the tasks of an uploaded CSV; the download is spooled and its rows are copied in as parsed."""
+        ctx.clear()
+        files = self.files
+        if files is None:
+            await message.reply(Messages.FILES_UNAVAILABLE, reply_markup=Keyboards.MainMenu)
+            return
+        problem = self.import_problem(message.document)
+        if problem:
+            await message.reply(problem, reply_markup=Keyboards.MainMenu)
+            return
+        await message.reply(await self.import_file(files, ctx.uid, message), reply_markup=Keyboards.MainMenu)
+
+    async def import_file(self, files: FileClient, uid: str, message: Message) -> str:
+        """Downloads the document of `message` to a spool file, copies its rows in and returns the reply to send."""
+        with tempfile.SpooledTemporaryFile(max_size=TRANSFER_SPOOL_SIZE) as spool:
+            async for chunk in files.stream_media(message):
+                spool.write(chunk)
+
+            spool.seek(0)
+            try:
+                count = await self.db.import_tasks(uid, read_task_csv(spool, Clock().now(), IMPORT_MAX_TASKS))
+            except ValueError as e:
+                return Messages.invalid_import(str(e))
+        return Messages.tasks_imported(count)
+
+    @property
+    def files(self) -> Optional[FileClient]:
+        """The client, if it can transfer files; worker processes cannot."""
+        return self.client if isinstance(self.client, FileClient) else None
+
+    @staticmethod
+    def import_problem(document: Optional[Document]) -> Optional[str]:
+        """Returns why `document` cannot be imported, or None if it can be downloaded."""
+        if not document:
+            return Messages.NO_IMPORT_FILE
+        if (document.file_size or 0) > IMPORT_MAX_BYTES:
+            return Messages.IMPORT_TOO_LARGE
+        return None
+
+    async def select_tasks(self, ctx: UpdateContext, message: Message) -> None:
+        """Stores a selection of task numbers and ranges and offers actions for it."""
+        try:
+            ranges = parse_task_ranges(message.text or "")
+        except ValueError:
+            await message.reply(Messages.INVALID_SELECTION)
+            return
+
+        selection = format_task_ranges(ranges)
+        ctx.clear()
+        ctx.update({Keys.TASK_SELECTION: selection})
+        await message.reply(
+            Messages.tasks_selected(selection), reply_markup=InlineKeyboards.SelectionActions(int(ctx.uid))
+        )
+
+    async def register_name(self, ctx: UpdateContext, message: Message) -> None:
         """Processes the user's name during registration."""
-        cache.update_user_cache(uid, Keys.NAME, message.text)
-        cache.update_user_cache(uid, Keys.STATE, States.ENTER_USERNAME)
+        ctx.update({Keys.NAME: message.text, Keys.STATE: States.ENTER_USERNAME})
         await message.reply(Messages.ENTER_YOUR_USERNAME)
 
-    async def register_username(self, uid: str, message: Message) -> None:
+    async def register_username(self, ctx: UpdateContext, message: Message) -> None:
         """Handles username registration and checks if the username is already taken."""
-        name = cache.get_user_cache(uid, Keys.NAME)
+        name = await ctx.get(Keys.NAME)
+        if not name:
+            # The name is gone from the session, so ask for it again rather than registering without one.
+            ctx.update({Keys.STATE: States.ENTER_NAME})
+            await message.reply(Messages.ENTER_YOUR_NAME)
+            return
+
         username = message.text.strip()
 
-        if db.get_user_by_username(username):
+        if await self.db.get_user_by_username(username) or not await self.db.create_user(name, username, ctx.uid):
             await message.reply(Messages.USERNAME_EXISTS)
             return
 
-        db.create_user(name, username, uid)
-        cache.delete_user_cache(uid)
+        ctx.clear()
         await message.reply(Messages.welcome(name), reply_markup=Keyboards.MainMenu)
 
-    async def add_task_title(self, uid: str, message: Message) -> None:
+    async def add_task_title(self, ctx: UpdateContext, message: Message) -> None:
         """Adds a task title to the cache."""
-        cache.update_user_cache(uid, Keys.TASK_TITLE, message.text)
-        cache.update_user_cache(uid, Keys.STATE, States.ENTER_TASK_DESCRIPTION)
+        ctx.update({Keys.TASK_TITLE: message.text, Keys.STATE: States.ENTER_TASK_DESCRIPTION})
         await message.reply(Messages.ENTER_TASK_DESCRIPTION, reply_markup=Keyboards.Hide)
 
-    async def add_task_description(self, uid: str, message: Message) -> None:
+    async def add_task_description(self, ctx: UpdateContext, message: Message) -> None:
         """Saves the task to the database."""
-        title = cache.get_user_cache(uid, Keys.TASK_TITLE)
-        db.create_task(uid, title, message.text)
-        cache.delete_user_cache(uid)
+        title = await ctx.get(Keys.TASK_TITLE)
+        if not title:
+            ctx.update({Keys.STATE: States.ENTER_TASK_TITLE})
+            await message.reply(Messages.ENTER_TASK_TITLE, reply_markup=Keyboards.Hide)
+            return
+
+        await self.db.create_task(ctx.uid, title, message.text)
+        ctx.clear()
         await message.reply(Messages.TASK_ADDED, reply_markup=Keyboards.MainMenu)
 
-    async def edit_task_title(self, uid: str, message: Message) -> None:
+    async def add_task_list(self, ctx: UpdateContext, message: Message) -> None:
+        """Saves every line of the message as a task with a single insert."""
+        tasks = parse_task_lines(message.text or "")
+        if not tasks:
+            await message.reply(Messages.NO_TASKS_IN_MESSAGE)
+            return
+
+        count = await self.db.create_tasks(ctx.uid, tasks)
+        ctx.clear()
+        await message.reply(Messages.tasks_added(count), reply_markup=Keyboards.MainMenu)
+
+    async def edit_task_title(self, ctx: UpdateContext, message: Message) -> None:
         """Edits the title of a task."""
-        await self.update_task(uid, message, Keys.TASK_TITLE)
+        await self.update_task(ctx, message, Keys.TASK_TITLE)
 
-    async def edit_task_description(self, uid: str, message: Message) -> None:
+    async def edit_task_description(self, ctx: UpdateContext, message: Message) -> None:
         """Edits the description of a task."""
-        await self.update_task(uid, message, Keys.TASK_DESCRIPTION)
+        await self.update_task(ctx, message, Keys.TASK_DESCRIPTION)
 
-    async def update_task(self, uid: str, message: Message, field: str) -> None:
+    async def update_task(self, ctx: UpdateContext, message: Message, field: str) -> None:
         """Updates the task title or description in the database."""
-        task_id = cache.get_user_cache(uid, Keys.EDITED_TASK_ID)
+        edited_task_id = await ctx.get(Keys.EDITED_TASK_ID)
 
-        if not task_id:
+        if not edited_task_id:
             await message.reply(Messages.TASK_NOT_FOUND)
             return
 
-        task = db.get_task(task_id)
+        task_id = int(edited_task_id)
+        task = await self.db.update_task(task_id, ctx.uid, field, message.text.strip())
         if not task:
-            await message.reply(Messages.TASK_NOT_FOUND)
+            exists = await self.db.get_user_task(task_id, ctx.uid)
+            await message.reply(Messages.NO_CHANGES_MADE if exists else Messages.TASK_NOT_FOUND)
             return
 
-        original_value = task[1] if field == Keys.TASK_TITLE else task[2]
-        updated_value = message.text.strip()
-
-        if original_value == updated_value:
-            await message.reply(Messages.NO_CHANGES_MADE)
+        task_order = await self.db.get_task_order(task_id, ctx.uid)
+        if task_order is None:
+            await message.reply(Messages.TASK_NOT_FOUND)
             return
 
-        db.update_task(task_id, field, updated_value)
-
-        tasks = db.get_tasks(uid)
-        task_order = next((i + 1 for i, t in enumerate(tasks) if t[0] == task_id), -1)
-
+        title_display, description_display = task[1], task[2]
         if field == Keys.TASK_TITLE:
-            title_display = Messages.add_pencil(updated_value)
-            description_display = task[2]
-        elif field == Keys.TASK_DESCRIPTION:
-            title_display = task[1]
-            description_display = Messages.add_pencil(updated_value)
-
-        if task_order == -1:
-            await message.reply(Messages.TASK_NOT_FOUND)
-            return
+            title_display = Messages.add_pencil(task[1])
+        else:
+            description_display = Messages.add_pencil(task[2])
 
         await message.reply(
             Messages.task_details(
@@ -196,33 +393,33 @@ class TaskHandler:
                 task_description=description_display,
                 status_icon=get_task_status_icon(task[3]),
             ),
-            reply_markup=InlineKeyboards.TaskActions(task_id, bool(task[3]), ""),
+            reply_markup=InlineKeyboards.TaskActions(task_id, bool(task[3]), "", int(ctx.uid)),
         )
 
         await message.reply(Messages.MAIN_MENU, reply_markup=Keyboards.MainMenu)
-        cache.delete_user_cache(uid)
+        ctx.clear()
 
-    async def view_task_by_number(self, uid: str, message: Message) -> None:
+    async def view_task_by_number(self, ctx: UpdateContext, message: Message) -> None:
         """Allows user to view a specific task by its number."""
         try:
-            task_number = int(message.text) - 1
-            tasks = db.get_tasks(uid)
+            task_number = int(message.text)
+            task = await self.db.get_task_by_number(ctx.uid, task_number)
 
-            if 0 <= task_number < len(tasks):
-                task_id, title, description, is_completed = tasks[task_number]
+            if task:
+                task_id, title, description, is_completed = task
 
                 await message.reply(
                     Messages.task_details(
-                        task_number=task_number + 1,
+                        task_number=task_number,
                         task_title=title,
                         task_description=description,
                         status_icon=get_task_status_icon(is_completed),
                     ),
-                    reply_markup=InlineKeyboards.TaskActions(int(task_id), bool(is_completed), ""),
+                    reply_markup=InlineKeyboards.TaskActions(int(task_id), bool(is_completed), "", int(ctx.uid)),
                 )
 
                 await message.reply(Messages.MAIN_MENU, reply_markup=Keyboards.MainMenu)
-                cache.delete_user_cache(uid)
+                ctx.clear()
 
             else:
                 await message.reply(Messages.TASK_NOT_FOUND_ENT_VALID)
@@ -236,112 +433,251 @@ class TaskHandler:
 class CallbackHandler:
     """Handles inline button interactions."""
 
-    def __init__(self, client: Client) -> None:
+    def __init__(self, client: SendingClient, db: Database, cache: Cache) -> None:
         self.client = client
+        self.db = db
+        self.cache = cache
 
     async def handle_callback(self, client: Client, callback_query: CallbackQuery) -> None:
         """Processes inline button clicks."""
-        data = callback_query.data.split(":")  # type: ignore
-        if len(data) < 2:
+        try:
+            callback = decode_callback(callback_query.data)  # type: ignore
+            action = InlineButtons(callback.action)
+        except ValueError:
+            callback, action = None, None
+
+        label = action.name.lower() if action else "invalid"
+        with UPDATES_IN_FLIGHT.track_inprogress(), track_handler(f"callback:{label}"):
+            if action is None or callback.owner != callback_query.from_user.id:  # type: ignore
+                await callback_query.answer(Messages.INVALID_ACTION, show_alert=True)
+                return
+            await self.dispatch_callback(callback_query, action, callback.args)  # type: ignore
+
+    async def dispatch_callback(
+        self, callback_query: CallbackQuery, action: InlineButtons, args: Tuple[int, ...]
+    ) -> None:
+        """Routes a verified callback to the matching action handler."""
+        list_handlers = {
+            InlineButtons.PREV_PAGE: lambda: self.turn_page(callback_query, action, args),
+            InlineButtons.NEXT_PAGE: lambda: self.turn_page(callback_query, action, args),
+            InlineButtons.COMPLETE_ALL: lambda: self.complete_all_tasks(callback_query),
+            InlineButtons.DELETE_COMPLETED: lambda: self.delete_completed_tasks(callback_query),
+            InlineButtons.SELECT_TASKS: lambda: self.start_task_selection(callback_query),
+            InlineButtons.COMPLETE_SELECTED: lambda: self.apply_to_selection(callback_query, action),
+            InlineButtons.REOPEN_SELECTED: lambda: self.apply_to_selection(callback_query, action),
+            InlineButtons.DELETE_SELECTED: lambda: self.apply_to_selection(callback_query, action),
+            InlineButtons.SEARCH_PREV: lambda: self.turn_search_page(callback_query, args),
+            InlineButtons.SEARCH_NEXT: lambda: self.turn_search_page(callback_query, args),
+        }
+        if action in list_handlers:
+            await list_handlers[action]()
+        elif len(args) != 1:
             await callback_query.answer(Messages.INVALID_ACTION, show_alert=True)
+        else:
+            await self.dispatch_task_callback(callback_query, action, args[0])
+
+    async def dispatch_task_callback(self, callback_query: CallbackQuery, action: InlineButtons, task_id: int) -> None:
+        """Routes a callback on a single task; actions that need the row only get it if the user owns the task."""
+        write_handlers = {
+            InlineButtons.TOGGLE_STATUS: lambda: self.toggle_task_status(callback_query, task_id),
+            InlineButtons.DELETE_TASK: lambda: self.delete_task(callback_query, task_id),
+            InlineButtons.SET_DUE: lambda: self.request_due_date(callback_query, task_id),
+        }
+        if action in write_handlers:
+            await write_handlers[action]()
             return
 
-        action, task_id = data[0], int(data[1]) if isinstance(data[1], str) and data[1].isdigit() else data[1]
-        task = db.get_task(int(task_id))
-
+        task = await self.db.get_user_task(task_id, str(callback_query.from_user.id))
         if not task:
             await callback_query.answer(Messages.TASK_NOT_FOUND, show_alert=True)
             return
 
-        action_handlers = {
-            InlineButtons.TOGGLE_STATUS: lambda: self.toggle_task_status(callback_query, task[0]),
-            InlineButtons.EDIT_TITLE: lambda: self.start_editing(callback_query, task[0], States.EDIT_TASK_TITLE),
+        row_handlers = {
+            InlineButtons.EDIT_TITLE: lambda: self.start_editing(callback_query, task, States.EDIT_TASK_TITLE),
             InlineButtons.EDIT_DESCRIPTION: lambda: self.start_editing(
-                callback_query, task[0], States.EDIT_TASK_DESCRIPTION
+                callback_query, task, States.EDIT_TASK_DESCRIPTION
             ),
-            InlineButtons.CANCEL_EDIT: lambda: self.cancel_edit(callback_query, task[0]),
-            InlineButtons.DELETE_TASK: lambda: self.delete_task(callback_query, task[0]),
+            InlineButtons.CANCEL_EDIT: lambda: self.cancel_edit(callback_query, task),
         }
+        if action in row_handlers:
+            await row_handlers[action]()  # type: ignore
 
-        if action in action_handlers:
-            await action_handlers[action]()  # type: ignore
+    async def turn_page(
+        self, callback_query: CallbackQuery, action: InlineButtons, cursor_args: Tuple[int, ...]
+    ) -> None:
+        """Replaces the listed page with the previous or next one using the cursor from the callback data."""
+        try:
+            cursor, cursor_number = decode_page_cursor(cursor_args)
+        except ValueError:
+            await callback_query.answer(Messages.INVALID_ACTION, show_alert=True)
+            return
 
-    async def toggle_task_status(self, callback_query: CallbackQuery, task_id: int) -> None:
-        """Toggles the completion status of a task and updates the message."""
-        task = db.get_task(task_id)
-        if not task:
-            await callback_query.answer(Messages.TASK_NOT_FOUND, show_alert=True)
+        owner = callback_query.from_user.id
+        backward = action == InlineButtons.PREV_PAGE
+        tasks = await self.db.get_tasks_page(str(owner), TASKS_PAGE_SIZE + 1, cursor, backward=backward)
+        if not tasks:
+            await callback_query.answer(Messages.NO_MORE_TASKS)
             return
 
-        task_id, title, description, is_completed = task
-        new_status = not bool(is_completed)
-        db.update_task(task_id, "is_completed", str(int(new_status)))
+        if backward:
+            has_prev = len(tasks) > TASKS_PAGE_SIZE
+            tasks = tasks[-TASKS_PAGE_SIZE:]
+            first_number = max(cursor_number - len(tasks), 1) if has_prev else 1
+            text, markup = render_tasks_page(tasks, first_number, has_prev=has_prev, has_next=True, owner=owner)
+        else:
+            text, markup = render_tasks_page(
+                tasks[:TASKS_PAGE_SIZE],
+                cursor_number + 1,
+                has_prev=True,
+                has_next=len(tasks) > TASKS_PAGE_SIZE,
+                owner=owner,
+            )
 
-        new_icon = get_task_status_icon(new_status)
-        old_icon = get_task_status_icon(is_completed)
-        updated_text = callback_query.message.text.replace(old_icon, new_icon)
+        await self.show_page(callback_query, text, markup)
 
-        try:
-            if updated_text != callback_query.message.text:
-                await callback_query.message.edit_text(
-                    updated_text,
-                    reply_markup=InlineKeyboards.TaskActions(task_id, new_status, ""),
-                )
-                await callback_query.answer(Messages.TASK_STATUS_UPDATED)
-            else:
-                await callback_query.answer(Messages.TASK_ALREADY_IN_STATUS)
-        except Exception as e:
-            logging.error(f"[toggle_task_status] Error: {e}", exc_info=True)
-            await callback_query.answer(Messages.UNABLE_TO_UPDATE_STATUS)
+    async def turn_search_page(self, callback_query: CallbackQuery, args: Tuple[int, ...]) -> None:
+        """Replaces the shown search results with the page at the offset from the callback data."""
+        if len(args) != 1:
+            await callback_query.answer(Messages.INVALID_ACTION, show_alert=True)
+            return
 
-    async def start_editing(self, callback_query: CallbackQuery, task_id: int, state: str) -> None:
-        """Handles editing task title or description."""
-        task = db.get_task(task_id)
+        uid = str(callback_query.from_user.id)
+        query = await self.cache.get_user_cache(uid, Keys.SEARCH_QUERY)
+        if not query:
+            await callback_query.answer(Messages.SEARCH_EXPIRED, show_alert=True)
+            return
+
+        offset = args[0]
+        tasks = await self.db.search_tasks(uid, query, SEARCH_PAGE_SIZE + 1, offset)
+        if not tasks:
+            await callback_query.answer(Messages.NO_MORE_TASKS)
+            return
+
+        text, markup = render_search_page(
+            tasks[:SEARCH_PAGE_SIZE],
+            offset,
+            SEARCH_PAGE_SIZE,
+            has_next=len(tasks) > SEARCH_PAGE_SIZE,
+            owner=callback_query.from_user.id,
+        )
+        await self.show_page(callback_query, text, markup)
+
+    @staticmethod
+    async def show_page(callback_query: CallbackQuery, text: str, markup: Optional[InlineKeyboardMarkup]) -> None:
+        """Replaces the shown page; a page without navigation buttons loses the keyboard."""
+        if markup:
+            await callback_query.message.edit_text(text, reply_markup=markup)
+        else:
+            await callback_query.message.edit_text(text)
+        await callback_query.answer()
+
+    async def complete_all_tasks(self, callback_query: CallbackQuery) -> None:
+        """Marks every open task of the user as done with a single statement."""
+        count = await self.db.complete_all_tasks(str(callback_query.from_user.id))
+        await callback_query.message.edit_text(Messages.tasks_completed(count))
+        await callback_query.answer()
+
+    async def delete_completed_tasks(self, callback_query: CallbackQuery) -> None:
+        """Deletes every completed task of the user with a single statement."""
+        count = await self.db.delete_completed_tasks(str(callback_query.from_user.id))
+        await callback_query.message.edit_text(Messages.tasks_deleted(count))
+        await callback_query.answer()
+
+    async def start_task_selection(self, callback_query: CallbackQuery) -> None:
+        """Asks the user for the task numbers a bulk action should apply to."""
+        await self.cache.update_user_cache(callback_query.from_user.id, {Keys.STATE: States.ENTER_TASK_SELECTION})
+        await callback_query.message.reply(Messages.ENTER_TASK_SELECTION, reply_markup=Keyboards.Hide)
+        await callback_query.answer()
+
+    async def apply_to_selection(self, callback_query: CallbackQuery, action: InlineButtons) -> None:
+        """Completes, reopens or deletes the selected tasks with a single statement."""
+        uid = str(callback_query.from_user.id)
+        selection = await self.cache.pop_user_cache(uid, Keys.TASK_SELECTION)
+        if not selection:
+            await callback_query.answer(Messages.SELECTION_EXPIRED, show_alert=True)
+            return
+
+        ranges = parse_task_ranges(selection)
+        if action == InlineButtons.DELETE_SELECTED:
+            result = Messages.tasks_deleted(await self.db.delete_tasks_by_numbers(uid, ranges))
+        else:
+            is_completed = action == InlineButtons.COMPLETE_SELECTED
+            count = await self.db.set_tasks_completed_by_numbers(uid, ranges, is_completed)
+            result = Messages.tasks_completed(count) if is_completed else Messages.tasks_reopened(count)
+
+        await callback_query.message.edit_text(result)
+        await callback_query.message.reply(Messages.MAIN_MENU, reply_markup=Keyboards.MainMenu)
+        await callback_query.answer()
+
+    async def toggle_task_status(self, callback_query: CallbackQuery, task_id: int) -> None:
+        """Toggles the completion status of a task in one statement and updates the message."""
+        task = await self.db.toggle_task(task_id, str(callback_query.from_user.id))
         if not task:
             await callback_query.answer(Messages.TASK_NOT_FOUND, show_alert=True)
             return
 
+        new_status = bool(task[3])
+        reply_markup = InlineKeyboards.TaskActions(task_id, new_status, "", callback_query.from_user.id)
+        updated_text = set_task_status_icon(callback_query.message.text, new_status)
+        # The send scheduler queues the edit and logs it if delivery fails, so nothing is raised here.
+        if updated_text is None:
+            # Reminders carry no status icon, so only their buttons follow the task.
+            await callback_query.message.edit_reply_markup(reply_markup)
+        else:
+            await callback_query.message.edit_text(updated_text, reply_markup=reply_markup)
+        await callback_query.answer(Messages.TASK_STATUS_UPDATED)
+
+    async def start_editing(self, callback_query: CallbackQuery, task: Tuple[int, str, str, bool], state: str) -> None:
+        """Handles editing task title or description."""
         task_id, title, description, is_completed = task
         is_completed = bool(is_completed)
 
-        cache.update_user_cache(callback_query.from_user.id, Keys.STATE, state)
-        cache.update_user_cache(callback_query.from_user.id, Keys.EDITED_TASK_ID, task_id)
+        await self.cache.update_user_cache(
+            callback_query.from_user.id, {Keys.STATE: state, Keys.EDITED_TASK_ID: task_id}
+        )
 
-        await callback_query.message.edit_reply_markup(InlineKeyboards.TaskActions(task_id, is_completed, state))
+        await callback_query.message.edit_reply_markup(
+            InlineKeyboards.TaskActions(task_id, is_completed, state, callback_query.from_user.id)
+        )
 
         if state == States.EDIT_TASK_TITLE:
             await callback_query.message.reply(Messages.EDIT_TASK_TITLE)
-            await callback_query.message.reply(title)
+            await self.client.send_message(callback_query.message.chat.id, title, coalesce=False)
             await callback_query.message.reply(Messages.SEND_NEW_TITLE)
         elif state == States.EDIT_TASK_DESCRIPTION:
             await callback_query.message.reply(Messages.EDIT_TASK_DESCRIPTION)
-            await callback_query.message.reply(description if description else Messages.NO_DESCRIPTION_YET)
+            await self.client.send_message(
+                callback_query.message.chat.id, description or Messages.NO_DESCRIPTION_YET, coalesce=False
+            )
             await callback_query.message.reply(Messages.SEND_NEW_DESCRIPTION)
 
         await callback_query.answer()
 
-    async def cancel_edit(self, callback_query: CallbackQuery, task_id: int) -> None:
+    async def cancel_edit(self, callback_query: CallbackQuery, task: Tuple[int, str, str, bool]) -> None:
         """Cancels the editing mode."""
-        task = db.get_task(task_id)
-        if not task:
-            await callback_query.answer(Messages.TASK_NOT_FOUND, show_alert=True)
-            return
-
         task_id, _, _, is_completed = task
         is_completed = bool(is_completed)
 
-        cache.delete_user_cache(callback_query.from_user.id)
-        await callback_query.message.edit_reply_markup(InlineKeyboards.TaskActions(task_id, is_completed, ""))
+        await self.cache.delete_user_cache(callback_query.from_user.id)
+        await callback_query.message.edit_reply_markup(
+            InlineKeyboards.TaskActions(task_id, is_completed, "", callback_query.from_user.id)
+        )
         await callback_query.message.reply(Messages.EDITING_CANCELLED)
         await callback_query.answer()
 
+    async def request_due_date(self, callback_query: CallbackQuery, task_id: int) -> None:
+        """Asks for the due date of a task; ownership is checked when the date is set."""
+        await self.cache.update_user_cache(
+            callback_query.from_user.id, {Keys.STATE: States.ENTER_DUE_DATE, Keys.EDITED_TASK_ID: task_id}
+        )
+        await callback_query.message.reply(Messages.ENTER_DUE_DATE, reply_markup=Keyboards.Hide)
+        await callback_query.answer()
+
     async def delete_task(self, callback_query: CallbackQuery, task_id: int) -> None:
         """Deletes a task from the database."""
-        task = db.get_task(task_id)
-        if not task:
+        if not await self.db.delete_task(task_id, str(callback_query.from_user.id)):
             await callback_query.answer(Messages.TASK_NOT_FOUND, show_alert=True)
             return
 
-        db.delete_task(task_id)
         await callback_query.message.edit_text(Messages.TASK_DELETED_SUCCESSFULLY)
         await callback_query.answer(Messages.TASK_DELETED)
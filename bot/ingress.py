@@ -0,0 +1,98 @@
+"""
+Ingress process of the scaled-out bot: receives updates from Telegram, fans them out to the worker partitions and
+sends the workers' replies.
+
+    python -m bot.ingress
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Set
+
+from pyrogram.handlers.callback_query_handler import CallbackQueryHandler
+from pyrogram.handlers.message_handler import MessageHandler
+from pyrogram.methods.utilities.idle import idle
+
+from bot.bot import create_client
+from bot.dispatcher import update_key
+from bot.transport import (
+    OUTBOX_STREAM,
+    RedisStreamTransport,
+    partition_of,
+    update_stream,
+)
+from bot.updates import decode_markup, encode_update
+from config.config import load_config
+from metrics.metrics import start_metrics_server
+
+load_config()
+
+OUTBOX_CONSUMER = "ingress"
+
+
+class Ingress:
+    """Publishes every incoming update to the partition of its chat."""
+
+    def __init__(self, transport: Any) -> None:
+        self.transport = transport
+
+    async def publish_update(self, client: Any, update: Any) -> None:
+        await self.transport.publish(update_stream(partition_of(update_key(update))), encode_update(update))
+
+
+class OutboxRelay:
+    """Sends the calls published by workers through the client's send scheduler, acknowledging each once delivered."""
+
+    def __init__(self, transport: Any, client: Any) -> None:
+        self.transport = transport
+        self.client = client
+        self._acks: Set["asyncio.Task[None]"] = set()
+
+    async def run(self) -> None:
+        """Relays outbox entries until cancelled."""
+        while True:
+            for stream, entry_id, fields in await self.transport.read([OUTBOX_STREAM], OUTBOX_CONSUMER):
+                await self.relay(stream, entry_id, fields)
+
+    async def relay(self, stream: str, entry_id: str, fields: Dict[str, str]) -> None:
+        call = json.loads(fields["call"])
+        try:
+            kwargs = call["kwargs"]
+            if call["reply_markup"] is not None:
+                kwargs["reply_markup"] = decode_markup(call["reply_markup"])
+            delivered = await getattr(self.client, call["method"])(**kwargs)
+        except Exception as e:
+            logging.error(f"[ingress] Dropped outbox call {call['method']}: {e}", exc_info=True)
+            await self.transport.ack(stream, entry_id)
+            return
+
+        task = asyncio.ensure_future(self._ack_when_delivered(delivered, stream, entry_id))
+        self._acks.add(task)
+        task.add_done_callback(self._acks.discard)
+
+    async def _ack_when_delivered(self, delivered: Any, stream: str, entry_id: str) -> None:
+        await delivered
+        await self.transport.ack(stream, entry_id)
+
+
+async def main() -> None:
+    app = create_client()
+    transport = RedisStreamTransport()
+    ingress = Ingress(transport)
+    app.add_handler(MessageHandler(ingress.publish_update))
+    app.add_handler(CallbackQueryHandler(ingress.publish_update))
+
+    start_metrics_server()
+    await app.start()
+    relay = asyncio.create_task(OutboxRelay(transport, app).run())
+    try:
+        await idle()
+    finally:
+        relay.cancel()
+        await app.stop()
+        await transport.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,8 @@
+import os
+from enum import IntEnum
+from functools import lru_cache
+from typing import Optional, Tuple
+
 from pyrogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -6,27 +11,50 @@ from pyrogram.types import (
     ReplyKeyboardRemove,
 )
 
+from bot.callbacks import encode_callback
 from bot.states import States
+from config.config import load_config
+
+load_config()
+
+KEYBOARD_CACHE_SIZE = int(os.getenv("KEYBOARD_CACHE_SIZE", 4096))
+EDIT_STATES = frozenset({States.EDIT_TASK_TITLE, States.EDIT_TASK_DESCRIPTION})
+
+Layout = Tuple[Tuple[Tuple[str, int], ...], ...]
 
 
 class Buttons:
     """Defines text labels for main menu buttons."""
 
     ADD = "➕ Add new task"
+    ADD_MANY = "📋 Add many tasks"
     ALL = "📇 All tasks"
     VIEW_TASK = "🎯 Task by №"
+    BULK_ACTIONS = "🧹 Bulk actions"
+    SEARCH = "🔎 Search"
     REGISTRATION = "😎 Registration"
     HELP = "Help"
 
 
-class InlineButtons:
-    """Defines callback data for inline buttons."""
+class InlineButtons(IntEnum):
+    """Defines the action codes packed into inline button callback data."""
 
-    TOGGLE_STATUS = "toggle_status"
-    EDIT_TITLE = "edit_task_title"
-    EDIT_DESCRIPTION = "edit_task_description"
-    DELETE_TASK = "delete_task"
-    CANCEL_EDIT = "cancel_edit"
+    TOGGLE_STATUS = 1
+    EDIT_TITLE = 2
+    EDIT_DESCRIPTION = 3
+    DELETE_TASK = 4
+    CANCEL_EDIT = 5
+    PREV_PAGE = 6
+    NEXT_PAGE = 7
+    COMPLETE_ALL = 8
+    DELETE_COMPLETED = 9
+    SELECT_TASKS = 10
+    COMPLETE_SELECTED = 11
+    REOPEN_SELECTED = 12
+    DELETE_SELECTED = 13
+    SEARCH_PREV = 14
+    SEARCH_NEXT = 15
+    SET_DUE = 16
 
 
 class Labels:
@@ -34,12 +62,23 @@ class Labels:
 
     CANCEL_EDIT = "🚫 Cancel Editing"
     DELETE_TASK = "❌ Delete"
+    SET_DUE = "⏰ Due"
 
     TOGGLE_TODO = "➡️ TODO"
     TOGGLE_DONE = "✅ Done"
     EDIT_TITLE = "✏️ Title"
     EDIT_DESCRIPTION = "✏️ Descr"
 
+    PREV_PAGE = "⬅️ Prev"
+    NEXT_PAGE = "Next ➡️"
+
+    COMPLETE_ALL = "✅ Complete all"
+    DELETE_COMPLETED = "🗑 Delete completed"
+    SELECT_TASKS = "🔢 Select by numbers"
+    COMPLETE_SELECTED = "✅ Done"
+    REOPEN_SELECTED = "➡️ TODO"
+    DELETE_SELECTED = "❌ Delete"
+
 
 class Keyboards:
     """Defines main menu keyboards with reply buttons."""
@@ -51,7 +90,12 @@ class Keyboards:
     MainMenu = ReplyKeyboardMarkup(
         [
             [KeyboardButton(Buttons.ADD), KeyboardButton(Buttons.ALL), KeyboardButton(Buttons.VIEW_TASK)],
-            [KeyboardButton(Buttons.HELP)],
+            [
+                KeyboardButton(Buttons.ADD_MANY),
+                KeyboardButton(Buttons.BULK_ACTIONS),
+                KeyboardButton(Buttons.SEARCH),
+                KeyboardButton(Buttons.HELP),
+            ],
         ],
         resize_keyboard=True,
     )
@@ -59,37 +103,142 @@ class Keyboards:
     Hide = ReplyKeyboardRemove()
 
 
+class Layouts:
+    """Static `(label, action)` layouts of the inline keyboards; only the callback data differs between users."""
+
+    TaskActions = (
+        ((Labels.TOGGLE_DONE, InlineButtons.TOGGLE_STATUS),),
+        ((Labels.EDIT_TITLE, InlineButtons.EDIT_TITLE), (Labels.EDIT_DESCRIPTION, InlineButtons.EDIT_DESCRIPTION)),
+        ((Labels.SET_DUE, InlineButtons.SET_DUE), (Labels.DELETE_TASK, InlineButtons.DELETE_TASK)),
+    )
+    CompletedTaskActions = (((Labels.TOGGLE_TODO, InlineButtons.TOGGLE_STATUS),),) + TaskActions[1:]
+    EditingTaskActions = (
+        TaskActions[0],
+        ((Labels.CANCEL_EDIT, InlineButtons.CANCEL_EDIT),),
+        TaskActions[2],
+    )
+    EditingCompletedTaskActions = (CompletedTaskActions[0],) + EditingTaskActions[1:]
+
+    BulkActions = (
+        ((Labels.COMPLETE_ALL, InlineButtons.COMPLETE_ALL),),
+        ((Labels.DELETE_COMPLETED, InlineButtons.DELETE_COMPLETED),),
+        ((Labels.SELECT_TASKS, InlineButtons.SELECT_TASKS),),
+    )
+    SelectionActions = (
+        (
+            (Labels.COMPLETE_SELECTED, InlineButtons.COMPLETE_SELECTED),
+            (Labels.REOPEN_SELECTED, InlineButtons.REOPEN_SELECTED),
+        ),
+        ((Labels.DELETE_SELECTED, InlineButtons.DELETE_SELECTED),),
+    )
+
+
+def build_markup(layout: Layout, owner: int, *args: int) -> InlineKeyboardMarkup:
+    """Fills a static layout with callback data bound to `owner` and the given arguments."""
+    return InlineKeyboardMarkup(
+        [
+            [InlineKeyboardButton(label, callback_data=encode_callback(action, owner, *args)) for label, action in row]
+            for row in layout
+        ]
+    )
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _task_actions(task_id: int, is_completed: bool, editing: bool, owner: int) -> InlineKeyboardMarkup:
+    layout: Layout
+    if editing:
+        layout = Layouts.EditingCompletedTaskActions if is_completed else Layouts.EditingTaskActions
+    else:
+        layout = Layouts.CompletedTaskActions if is_completed else Layouts.TaskActions
+    return build_markup(layout, owner, task_id)
+
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+def _owner_markup(layout: Layout, owner: int) -> InlineKeyboardMarkup:
+    return build_markup(layout, owner)
+
+
 class InlineKeyboards:
-    """Defines inline keyboards for task actions."""
+    """Defines inline keyboards for task actions.
+
+    Markups are memoized per input and shared between replies, so they must not be mutated after they are returned.
+    """
 
     @staticmethod
-    def TaskActions(task_id: int, is_completed: bool, user_state: str) -> InlineKeyboardMarkup:
+    def TaskActions(task_id: int, is_completed: bool, user_state: str, owner: int) -> InlineKeyboardMarkup:
         """
         Returns an inline keyboard for managing tasks.
 
         :param task_id: The unique ID of the task.
         :param is_completed: Whether the task is marked as completed.
         :param user_state: The current state of the user (e.g., editing).
+        :param owner: Telegram ID of the user the keyboard is shown to.
         :return: Inline keyboard markup for task actions.
         """
-        toggle_text = Labels.TOGGLE_TODO if is_completed else Labels.TOGGLE_DONE
-
-        if user_state in {States.EDIT_TASK_TITLE, States.EDIT_TASK_DESCRIPTION}:
-            buttons = [
-                [InlineKeyboardButton(toggle_text, callback_data=f"{InlineButtons.TOGGLE_STATUS}:{task_id}")],
-                [InlineKeyboardButton(Labels.CANCEL_EDIT, callback_data=f"{InlineButtons.CANCEL_EDIT}:{task_id}")],
-                [InlineKeyboardButton(Labels.DELETE_TASK, callback_data=f"{InlineButtons.DELETE_TASK}:{task_id}")],
-            ]
-        else:
-            buttons = [
-                [InlineKeyboardButton(toggle_text, callback_data=f"{InlineButtons.TOGGLE_STATUS}:{task_id}")],
-                [
-                    InlineKeyboardButton(Labels.EDIT_TITLE, callback_data=f"{InlineButtons.EDIT_TITLE}:{task_id}"),
-                    InlineKeyboardButton(
-                        Labels.EDIT_DESCRIPTION, callback_data=f"{InlineButtons.EDIT_DESCRIPTION}:{task_id}"
-                    ),
-                ],
-                [InlineKeyboardButton(Labels.DELETE_TASK, callback_data=f"{InlineButtons.DELETE_TASK}:{task_id}")],
-            ]
-
-        return InlineKeyboardMarkup(buttons)
+        return _task_actions(task_id, bool(is_completed), user_state in EDIT_STATES, owner)
+
+    @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def TasksPage(
+        owner: int, prev_cursor: Optional[Tuple[int, ...]], next_cursor: Optional[Tuple[int, ...]]
+    ) -> InlineKeyboardMarkup:
+        """
+        Returns an inline keyboard for navigating between task list pages.
+
+        :param owner: Telegram ID of the user the keyboard is shown to.
+        :param prev_cursor: Encoded cursor of the first task on the page, or None on the first page.
+        :param next_cursor: Encoded cursor of the last task on the page, or None on the last page.
+        :return: Inline keyboard markup with previous/next page buttons.
+        """
+        buttons = []
+        if prev_cursor:
+            buttons.append(
+                InlineKeyboardButton(
+                    Labels.PREV_PAGE, callback_data=encode_callback(InlineButtons.PREV_PAGE, owner, *prev_cursor)
+                )
+            )
+        if next_cursor:
+            buttons.append(
+                InlineKeyboardButton(
+                    Labels.NEXT_PAGE, callback_data=encode_callback(InlineButtons.NEXT_PAGE, owner, *next_cursor)
+                )
+            )
+
+        return InlineKeyboardMarkup([buttons])
+
+    @staticmethod
+    @lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
+    def SearchPage(owner: int, prev_offset: Optional[int], next_offset: Optional[int]) -> InlineKeyboardMarkup:
+        """
+        Returns an inline keyboard for navigating between pages of search results.
+
+        :param owner: Telegram ID of the user the keyboard is shown to.
+        :param prev_offset: Offset of the previous page, or None on the first page.
+        :param next_offset: Offset of the next page, or None on the last page.
+        :return: Inline keyboard markup with previous/next page buttons.
+        """
+        buttons = []
+        if prev_offset is not None:
+            buttons.append(
+                InlineKeyboardButton(
+                    Labels.PREV_PAGE, callback_data=encode_callback(InlineButtons.SEARCH_PREV, owner, prev_offset)
+                )
+            )
+        if next_offset is not None:
+            buttons.append(
+                InlineKeyboardButton(
+                    Labels.NEXT_PAGE, callback_data=encode_callback(InlineButtons.SEARCH_NEXT, owner, next_offset)
+                )
+            )
+
+        return InlineKeyboardMarkup([buttons])
+
+    @staticmethod
+    def BulkActions(owner: int) -> InlineKeyboardMarkup:
+        """Returns the keyboard with actions that apply to many tasks at once."""
+        return _owner_markup(Layouts.BulkActions, owner)
+
+    @staticmethod
+    def SelectionActions(owner: int) -> InlineKeyboardMarkup:
+        """Returns the keyboard with actions for the selected tasks."""
+        return _owner_markup(Layouts.SelectionActions, owner)
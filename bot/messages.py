@@ -14,6 +14,8 @@ class Messages:
 
     ENTER_TASK_TITLE = "Enter task title:"
     ENTER_TASK_DESCRIPTION = "Enter task description:"
+    ENTER_TASK_LIST = "Send your tasks, one per line.\nAdd a description after a vertical bar: Title | Description"
+    NO_TASKS_IN_MESSAGE = "❌ No tasks found. Send at least one non-empty line:"
 
     EDIT_TASK_TITLE = "✏️ Edit Task Title:\n\nOld Title to copy:"
     EDIT_TASK_DESCRIPTION = "✏️ Edit Task Description:\n\nOld Description to copy:"
@@ -29,18 +31,37 @@ class Messages:
     TASK_NOT_FOUND = "❌ Task not found!"
     TASK_NOT_FOUND_ENT_VALID = "❌ Task not found. Enter a valid task number."
     NO_TASKS_YET = "You don't have any tasks yet."
+    NO_MORE_TASKS = "No more tasks on this page."
+
+    CHOOSE_BULK_ACTION = "🧹 Choose a bulk action:"
+    ENTER_TASK_SELECTION = "Enter task numbers or ranges, e.g. 1-5,8:"
+    INVALID_SELECTION = "❌ Invalid selection. Use numbers and ranges like 1-5,8:"
+    SELECTION_EXPIRED = "⚠️ Selection expired, please select tasks again."
+
+    ENTER_SEARCH_QUERY = "🔎 Enter words to look for in task titles and descriptions:"
+    NO_SEARCH_RESULTS = "🔎 No tasks found."
+    SEARCH_EXPIRED = "⚠️ Search expired, please search again."
+
+    ENTER_DUE_DATE = "⏰ Send the due date as YYYY-MM-DD HH:MM or HH:MM, or - to remove it:"
+    INVALID_DUE_DATE = "❌ Invalid due date. Send a future YYYY-MM-DD HH:MM or HH:MM, or - to remove it:"
+    DUE_DATE_REMOVED = "⏰ Due date removed."
+
+    SEND_IMPORT_FILE = "📥 Send a CSV file exported with /export. Its tasks are added after your current ones:"
+    NO_IMPORT_FILE = "❌ No file received, import cancelled."
+    IMPORT_TOO_LARGE = "❌ The file is too large to import."
+    FILES_UNAVAILABLE = "⚠️ Export and import are not available on this bot."
 
     TASK_STATUS_UPDATED = "✅ Task status updated!"
-    TASK_ALREADY_IN_STATUS = "️️⚠️ Task is already in this state."
-    UNABLE_TO_UPDATE_STATUS = "⚠️ Unable to update task status!"
 
     HELP_TEXT = "This bot helps you manage your tasks. You can add, list, and delete tasks."
     INVALID_INPUT = "❌ Invalid input. Please enter a valid task number."
     INVALID_ACTION = "❌ Invalid action!"
     UNEXPECTED_ERROR = "⚠️ Unexpected error occurred."
+    TOO_MANY_UPDATES = "⚠️ You are sending too fast, some of your messages were skipped. Please wait a moment."
     UNKNOWN_COMMAND = "Unknown command"
 
     MISSING_API_CREDENTIALS = "❌ Missing API credentials! Check .env file."
+    MISSING_CALLBACK_SECRET = "❌ Missing CALLBACK_SECRET (or BOT_TOKEN) to sign inline buttons! Check .env file."
     INTERNAL_SERVER_ERROR = "⚠️ Internal server error. Please try again later."
 
     @staticmethod
@@ -53,6 +74,71 @@ class Messages:
         """Formats the task list message."""
         return f"Your tasks:\n\n{task_list}"
 
+    @staticmethod
+    def search_results(task_list: str) -> str:
+        """Formats a page of search results."""
+        return f"🔎 Found tasks:\n\n{task_list}"
+
+    @staticmethod
+    def due_date_set(title: str, due_at: str) -> str:
+        """Returns the confirmation for a task due date."""
+        return f"⏰ {title} is due {due_at}. You will get a reminder then."
+
+    @staticmethod
+    def reminder(title: str) -> str:
+        """Formats a due task reminder."""
+        return f"⏰ Reminder: {title} is due now."
+
+    @staticmethod
+    def digest(open_tasks: int, task_list: str) -> str:
+        """Formats the daily digest of a user's open tasks."""
+        return f"🗓 Daily digest: you have {open_tasks} open tasks:\n\n{task_list}"
+
+    @staticmethod
+    def digest_more(count: int) -> str:
+        """Returns the last line of a digest listing only some of the open tasks."""
+        return f"...and {count} more."
+
+    @staticmethod
+    def tasks_exported(count: int) -> str:
+        """Returns the caption of an exported task file."""
+        return f"📤 {count} tasks exported."
+
+    @staticmethod
+    def tasks_imported(count: int) -> str:
+        """Returns the confirmation for an imported task file."""
+        return f"📥 {count} tasks imported successfully!"
+
+    @staticmethod
+    def invalid_import(reason: str) -> str:
+        """Returns why an uploaded task file was rejected."""
+        return f"❌ Nothing was imported. {reason}."
+
+    @staticmethod
+    def tasks_added(count: int) -> str:
+        """Returns the confirmation for tasks added in bulk."""
+        return f"{count} tasks added successfully!"
+
+    @staticmethod
+    def tasks_selected(selection: str) -> str:
+        """Returns the prompt shown for a multi-task selection."""
+        return f"Selected tasks: {selection}\nChoose an action:"
+
+    @staticmethod
+    def tasks_completed(count: int) -> str:
+        """Returns the result of a bulk completion."""
+        return f"✅ {count} tasks marked as done."
+
+    @staticmethod
+    def tasks_reopened(count: int) -> str:
+        """Returns the result of a bulk reopen."""
+        return f"➡️ {count} tasks moved back to TODO."
+
+    @staticmethod
+    def tasks_deleted(count: int) -> str:
+        """Returns the result of a bulk deletion."""
+        return f"🗑 {count} tasks deleted."
+
     @staticmethod
     def task_number_request(max_tasks: int) -> str:
         """Returns the task number request message."""
@@ -0,0 +1,177 @@
+import asyncio
+import heapq
+import logging
+import os
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from bot.keyboards import InlineKeyboards
+from bot.messages import Messages
+from config.config import load_config
+from metrics.metrics import REMINDERS, REMINDERS_HELD
+
+load_config()
+
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+REMINDER_MAX_HELD = int(os.getenv("REMINDER_MAX_HELD", 10000))
+REMINDER_LOOKAHEAD = float(os.getenv("REMINDER_LOOKAHEAD", 60))
+REMINDER_POLL_INTERVAL = float(os.getenv("REMINDER_POLL_INTERVAL", 10))
+REMINDER_LEASE = float(os.getenv("REMINDER_LEASE", 120))
+REMINDER_TIMEZONE = ZoneInfo(os.getenv("REMINDER_TIMEZONE", "UTC"))
+
+# (remind_at, id, telegram_id, title), ordered by due time in the heap.
+Reminder = Tuple[datetime, int, str, str]
+
+
+def to_utc(local: datetime) -> datetime:
+    """Converts a naive time in `REMINDER_TIMEZONE` to the naive UTC time stored in the database."""
+    return local.replace(tzinfo=REMINDER_TIMEZONE).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(utc: datetime) -> datetime:
+    """Converts a naive UTC time from the database to a naive time in `REMINDER_TIMEZONE`."""
+    return utc.replace(tzinfo=timezone.utc).astimezone(REMINDER_TIMEZONE).replace(tzinfo=None)
+
+
+class Clock:
+    """Current time in naive UTC, as stored in the database, and sleeping; benchmarks swap in a fake one."""
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc).replace(tzinfo=None)
+
+    async def sleep(self, seconds: float) -> None:
+        await asyncio.sleep(seconds)
+
+
+class ReminderScheduler:
+    """
+    Sends task reminders when they come due, from a single background task.
+
+    Every `poll_interval` seconds it claims the reminders due within `lookahead` in batches, earliest first, from the
+    partial index on `remind_at`. Claimed rows are leased, and rows locked by another instance are skipped, so several
+    bot processes can run schedulers side by side. The claimed reminders wait in a heap and the loop sleeps until the
+    earliest one is due. Due reminders are marked as sent in one statement right before they are queued on the client,
+    whose send scheduler applies the rate limits: a reminder is sent at most once, and never for a task that was
+    completed or got a new due date meanwhile.
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        client: Any,
+        clock: Optional[Clock] = None,
+        batch_size: int = REMINDER_BATCH_SIZE,
+        max_held: int = REMINDER_MAX_HELD,
+        lookahead: float = REMINDER_LOOKAHEAD,
+        poll_interval: float = REMINDER_POLL_INTERVAL,
+        lease: float = REMINDER_LEASE,
+    ) -> None:
+        self.db = db
+        self.client = client
+        self.clock = clock or Clock()
+        self.batch_size = batch_size
+        self.max_held = max_held
+        self.lookahead = timedelta(seconds=lookahead)
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease)
+        self.held: List[Reminder] = []
+        self.held_ids: Set[int] = set()
+        self.claimed_at: Optional[datetime] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        """Starts the scheduler loop."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the loop and releases the held reminders, so that other instances can claim them right away."""
+        if self._task:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self.held_ids:
+            await self.db.release_reminders(list(self.held_ids))
+            self.held, self.held_ids = [], set()
+            REMINDERS_HELD.set(0)
+
+    async def tick(self) -> float:
+        """Claims upcoming reminders when the poll interval has passed, sends the due ones and returns the delay."""
+        now = self.clock.now()
+        if self.claimed_at is None or (now - self.claimed_at).total_seconds() >= self.poll_interval:
+            await self.claim(now)
+        await self.dispatch(now)
+
+        delay = self.poll_interval
+        if self.claimed_at is not None:
+            delay -= (self.clock.now() - self.claimed_at).total_seconds()
+        if self.held:
+            delay = min(delay, (self.held[0][0] - self.clock.now()).total_seconds())
+        return max(delay, 0.0)
+
+    async def claim(self, now: datetime) -> None:
+        """Claims the reminders due before `now + lookahead` until a batch comes back short or the heap is full."""
+        self.claimed_at = now
+        horizon = now + self.lookahead
+        # Held reminders are dispatched by the horizon; the lease only runs out if this process stalls or dies.
+        lease_until = horizon + self.lease
+        while len(self.held) < self.max_held:
+            limit = min(self.batch_size, self.max_held - len(self.held))
+            rows = await self.db.claim_reminders(horizon, now, lease_until, limit)
+            for task_id, telegram_id, title, remind_at in rows:
+                if task_id not in self.held_ids:
+                    self.held_ids.add(task_id)
+                    heapq.heappush(self.held, (remind_at, task_id, telegram_id, title))
+            if len(rows) < limit:
+                break
+        REMINDERS_HELD.set(len(self.held))
+
+    async def dispatch(self, now: datetime) -> None:
+        """Marks the reminders due by `now` as sent and queues those still current."""
+        due: List[Reminder] = []
+        while self.held and self.held[0][0] <= now:
+            due.append(heapq.heappop(self.held))
+        for start in range(0, len(due), self.batch_size):
+            await self._dispatch_batch(due, start)
+        REMINDERS_HELD.set(len(self.held))
+
+    async def _dispatch_batch(self, due: List[Reminder], start: int) -> None:
+        """Finishes one batch of `due` from `start`, putting the rest back into the heap if the database fails."""
+        batch = due[start : start + self.batch_size]
+        try:
+            current = dict(await self.db.finish_reminders([(task_id, remind_at) for remind_at, task_id, _, _ in batch]))
+        except Exception:
+            for reminder in due[start:]:
+                heapq.heappush(self.held, reminder)
+            raise
+        self.held_ids.difference_update(task_id for _, task_id, _, _ in batch)
+        sends = [
+            self.send(task_id, telegram_id, title)
+            for _, task_id, telegram_id, title in batch
+            if current.get(task_id) is False
+        ]
+        REMINDERS.labels("skipped").inc(len(batch) - len(sends))
+        await asyncio.gather(*sends)
+
+    async def send(self, task_id: int, telegram_id: str, title: str) -> None:
+        """Queues one reminder with the actions of its task."""
+        chat_id = int(telegram_id)
+        try:
+            await self.client.send_message(
+                chat_id, Messages.reminder(title), reply_markup=InlineKeyboards.TaskActions(task_id, False, "", chat_id)
+            )
+            REMINDERS.labels("sent").inc()
+        except Exception as e:
+            REMINDERS.labels("failed").inc()
+            logging.error(f"[reminders] Failed to send the reminder of task {task_id}: {e}", exc_info=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                delay = await self.tick()
+            except Exception as e:
+                logging.error(f"[reminders] Tick failed, retrying: {e}", exc_info=True)
+                delay = self.poll_interval
+            await self.clock.sleep(delay)
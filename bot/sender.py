@@ -0,0 +1,297 @@
+import asyncio
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from enum import IntEnum
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+    runtime_checkable,
+)
+
+from pyrogram.client import Client
+from pyrogram.errors import FloodWait
+
+from cache.lru import MISSING, LRUCache
+from config.config import load_config
+from metrics.metrics import FLOOD_WAITS, SEND_LATENCY, SEND_QUEUE
+
+load_config()
+
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", 30))
+SEND_GLOBAL_BURST = float(os.getenv("SEND_GLOBAL_BURST", 30))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", 1))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", 3))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", 3))
+CHAT_BUCKETS_SIZE = 10000
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = "\n\n"
+ANSWER_LANE = "answer"
+
+
+class Priority(IntEnum):
+    """Order in which queued calls get a global send token; lower goes first."""
+
+    HIGH = 0
+    NORMAL = 1
+    BULK = 2
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average and bursts of up to `capacity` calls."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def reserve(self) -> float:
+        """Takes a token, going into debt if none is left, and returns the seconds to wait before using it."""
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(-self.tokens / self.rate, 0.0)
+
+
+def _telegram_length(text: str) -> int:
+    """Length of `text` as Telegram counts it against its limits, in UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class Outgoing:
+    """A queued client call and the future that receives its result."""
+
+    def __init__(self, method: str, kwargs: Dict[str, Any], priority: Priority, coalesce: bool) -> None:
+        self.method = method
+        self.kwargs = kwargs
+        self.priority = priority
+        self.coalesce = coalesce
+        self.queued = time.perf_counter()
+        self.future: "asyncio.Future[Any]" = asyncio.get_running_loop().create_future()
+
+    def can_absorb(self, other: "Outgoing") -> bool:
+        """Whether `other`, queued right after this plain text message, can be appended to it."""
+        if not (self.method == other.method == "send_message" and self.coalesce and other.coalesce):
+            return False
+        if self.kwargs.get("reply_markup") is not None:
+            return False
+        merged = self.kwargs["text"] + COALESCE_SEPARATOR + other.kwargs["text"]
+        if _telegram_length(merged) > MAX_MESSAGE_LENGTH:
+            return False
+        ignored = {"text", "reply_markup"}
+        return {k: v for k, v in self.kwargs.items() if k not in ignored} == {
+            k: v for k, v in other.kwargs.items() if k not in ignored
+        }
+
+    def absorb(self, other: "Outgoing") -> None:
+        """Appends the text and takes over the keyboard of `other`."""
+        self.kwargs["text"] += COALESCE_SEPARATOR + other.kwargs["text"]
+        self.kwargs["reply_markup"] = other.kwargs.get("reply_markup")
+
+
+class SendingClient(Protocol):
+    """The client the handlers send through: `ScheduledClient`, or `OutboxClient` in worker processes."""
+
+    async def send_message(
+        self, chat_id: Union[int, str], text: str, *, priority: Priority = ..., coalesce: bool = ..., **kwargs: Any
+    ) -> Any: ...
+
+
+@runtime_checkable
+class FileClient(SendingClient, Protocol):
+    """A `SendingClient` that can also send and download files, which only the Telegram connection's process can."""
+
+    async def send_document(self, chat_id: Union[int, str], document: Any, **kwargs: Any) -> Any: ...
+
+    def stream_media(self, message: Any, limit: int = 0, offset: int = 0) -> AsyncIterator[bytes]: ...
+
+
+def _check_keywords(method: str, args: Tuple[Any, ...]) -> None:
+    # Queued calls are replayed by keyword, as Pyrogram's bound methods make them.
+    if args:
+        raise TypeError(f"{method}() takes its optional arguments by keyword only")
+
+
+class SendScheduler:
+    """
+    Client mixin that queues outgoing messages, edits and callback answers instead of sending them inline.
+
+    Calls to one chat are delivered in order through a per-chat token bucket, consecutive plain replies are merged
+    into one message, and all chats share a global token bucket that is handed out by priority. A FloodWait pauses
+    sending for the requested time and the call is retried. Queued methods return at once with a future that
+    resolves to the method's result, or to None if delivery failed (the error is logged). They accept the client's
+    signatures, so they override its methods, but take optional arguments by keyword only.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        global_rate: float = SEND_GLOBAL_RATE,
+        global_burst: float = SEND_GLOBAL_BURST,
+        chat_rate: float = SEND_CHAT_RATE,
+        chat_burst: float = SEND_CHAT_BURST,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.chat_buckets = LRUCache(CHAT_BUCKETS_SIZE, float("inf"))
+        self._lanes: Dict[Hashable, Deque[Outgoing]] = {}
+        self._lane_tasks: Dict[Hashable, "asyncio.Task[None]"] = {}
+        self._waiters: "Optional[asyncio.PriorityQueue[Any]]" = None
+        self._pacer: "Optional[asyncio.Task[None]]" = None
+        self._resume_at = 0.0
+        self._sequence = itertools.count()
+
+    async def send_message(
+        self,
+        chat_id: Union[int, str],
+        text: str,
+        *args: Any,
+        priority: Priority = Priority.NORMAL,
+        coalesce: bool = True,
+        **kwargs: Any,
+    ) -> Any:
+        """Queues a message; `coalesce=False` keeps it separate, e.g. for text the user should copy."""
+        _check_keywords("send_message", args)
+        return self._enqueue(chat_id, "send_message", dict(kwargs, chat_id=chat_id, text=text), priority, coalesce)
+
+    async def send_document(self, chat_id: Union[int, str], document: Any, *args: Any, **kwargs: Any) -> Any:
+        """Queues an upload behind the chat's other calls and waits for it, so the caller may close the file after."""
+        _check_keywords("send_document", args)
+        kwargs = dict(kwargs, chat_id=chat_id, document=document)
+        return await self._enqueue(chat_id, "send_document", kwargs, Priority.BULK, False)
+
+    async def edit_message_text(
+        self, chat_id: Union[int, str], message_id: int, text: str, *args: Any, **kwargs: Any
+    ) -> Any:
+        _check_keywords("edit_message_text", args)
+        kwargs = dict(kwargs, chat_id=chat_id, message_id=message_id, text=text)
+        return self._enqueue(chat_id, "edit_message_text", kwargs, Priority.NORMAL, False)
+
+    async def edit_message_reply_markup(
+        self, chat_id: Union[int, str], message_id: int, *args: Any, **kwargs: Any
+    ) -> Any:
+        _check_keywords("edit_message_reply_markup", args)
+        kwargs = dict(kwargs, chat_id=chat_id, message_id=message_id)
+        return self._enqueue(chat_id, "edit_message_reply_markup", kwargs, Priority.NORMAL, False)
+
+    async def answer_callback_query(self, callback_query_id: str, *args: Any, **kwargs: Any) -> Any:
+        """Queues a callback answer ahead of everything else; answers are not bound to a chat."""
+        _check_keywords("answer_callback_query", args)
+        kwargs = dict(kwargs, callback_query_id=callback_query_id)
+        return self._enqueue((ANSWER_LANE, callback_query_id), "answer_callback_query", kwargs, Priority.HIGH, False)
+
+    async def drain(self, chat_id: Optional[Any] = None) -> None:
+        """Waits until everything queued for the chat, or for all chats, has been delivered."""
+        while True:
+            if chat_id is None:
+                tasks = list(self._lane_tasks.values())
+            else:
+                tasks = [self._lane_tasks[chat_id]] if chat_id in self._lane_tasks else []
+            if not tasks:
+                return
+            await asyncio.gather(*tasks)
+
+    async def stop(self, *args: Any, **kwargs: Any) -> Any:
+        """Delivers the queued calls before disconnecting."""
+        await self.drain()
+        if self._pacer:
+            self._pacer.cancel()
+            self._pacer = None
+        return await super().stop(*args, **kwargs)  # type: ignore
+
+    def _enqueue(
+        self, lane: Hashable, method: str, kwargs: Dict[str, Any], priority: Priority, coalesce: bool
+    ) -> "asyncio.Future[Any]":
+        outgoing = Outgoing(method, kwargs, priority, coalesce)
+        self._lanes.setdefault(lane, deque()).append(outgoing)
+        SEND_QUEUE.inc()
+        if lane not in self._lane_tasks:
+            self._lane_tasks[lane] = asyncio.create_task(self._drain_lane(lane))
+        return outgoing.future
+
+    async def _drain_lane(self, lane: Hashable) -> None:
+        queue = self._lanes[lane]
+        try:
+            while queue:
+                if not (isinstance(lane, tuple) and lane[0] == ANSWER_LANE):
+                    await asyncio.sleep(self._chat_bucket(lane).reserve())
+                await self._acquire(queue[0].priority)
+                batch = [queue.popleft()]
+                while queue and batch[0].can_absorb(queue[0]):
+                    batch[0].absorb(queue[0])
+                    batch.append(queue.popleft())
+                await self._deliver(batch)
+        finally:
+            del self._lanes[lane]
+            del self._lane_tasks[lane]
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is MISSING:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    async def _acquire(self, priority: Priority) -> None:
+        """Waits for a global send token; waiters with a lower priority value are served first."""
+        if self._waiters is None:
+            self._waiters = asyncio.PriorityQueue()
+        if self._pacer is None:
+            self._pacer = asyncio.create_task(self._pace())
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.put_nowait((priority, next(self._sequence), waiter))
+        await waiter
+
+    async def _pace(self) -> None:
+        while True:
+            _, _, waiter = await self._waiters.get()  # type: ignore
+            await asyncio.sleep(max(self._resume_at - time.monotonic(), 0.0))
+            await asyncio.sleep(self.global_bucket.reserve())
+            waiter.set_result(None)
+
+    async def _deliver(self, batch: List[Outgoing]) -> None:
+        result = await self._call(batch[0])
+        for sent in batch:
+            SEND_QUEUE.dec()
+            SEND_LATENCY.labels(sent.method).observe(time.perf_counter() - sent.queued)
+            if not sent.future.done():
+                sent.future.set_result(result)
+
+    async def _call(self, outgoing: Outgoing) -> Any:
+        """Makes the call, retrying after FloodWaits; returns its result, or None if it failed."""
+        method = getattr(super(), outgoing.method)
+        for attempt in range(SEND_MAX_RETRIES + 1):
+            try:
+                return await method(**outgoing.kwargs)
+            except FloodWait as e:
+                FLOOD_WAITS.inc()
+                self._resume_at = max(self._resume_at, time.monotonic() + e.value)  # type: ignore
+                logging.warning(f"[sender] FloodWait of {e.value}s on {outgoing.method}, attempt {attempt + 1}")
+                await asyncio.sleep(e.value)  # type: ignore
+            except Exception as e:
+                logging.error(f"[sender] {outgoing.method} failed: {e}", exc_info=True)
+                return None
+        return None
+
+
+# Pyrogram's own AddHandler and RemoveHandler mixins disagree on `disconnect_handler`, which mypy only reports on
+# classes with several bases.
+class ScheduledClient(SendScheduler, Client):  # type: ignore[misc]
+    """Pyrogram client whose outgoing calls go through the send scheduler."""
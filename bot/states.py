@@ -2,6 +2,8 @@ class Keys:
     STATE = "state"
     NAME = "name"
     EDITED_TASK_ID = "edited_task_id"
+    TASK_SELECTION = "task_selection"
+    SEARCH_QUERY = "search_query"
 
     TASK_TITLE = "title"
     TASK_DESCRIPTION = "description"
@@ -13,8 +15,13 @@ class States:
 
     ENTER_TASK_TITLE = "enter_task_title"
     ENTER_TASK_DESCRIPTION = "enter_task_description"
+    ENTER_TASK_LIST = "enter_task_list"
 
     ENTER_TASK_NUMBER = "enter_task_number"
+    ENTER_TASK_SELECTION = "enter_task_selection"
+    ENTER_SEARCH_QUERY = "enter_search_query"
+    ENTER_DUE_DATE = "enter_due_date"
+    ENTER_IMPORT_FILE = "enter_import_file"
 
     EDIT_TASK_TITLE = "edit_task_title"
     EDIT_TASK_DESCRIPTION = "edit_task_description"
@@ -0,0 +1,208 @@
+import asyncio
+import itertools
+import os
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from cache.cache import REDIS_HOST, REDIS_PORT
+from config.config import load_config
+
+load_config()
+
+UPDATE_PARTITIONS = int(os.getenv("UPDATE_PARTITIONS", 16))
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 100000))
+STREAM_READ_COUNT = int(os.getenv("STREAM_READ_COUNT", 100))
+STREAM_BLOCK_MS = int(os.getenv("STREAM_BLOCK_MS", 1000))
+DEDUP_TTL = int(os.getenv("DEDUP_TTL", 86400))
+
+CONSUMER_GROUP = "bot"
+OUTBOX_STREAM = "outbox"
+
+Entry = Tuple[str, str, Dict[str, str]]
+# Entries of one stream as XREADGROUP returns them; fields are empty for entries trimmed while pending.
+StreamBatch = List[Tuple[str, Optional[Dict[str, str]]]]
+
+
+def update_stream(partition: int) -> str:
+    """Returns the name of the stream holding one partition of incoming updates."""
+    return f"updates:{partition}"
+
+
+def partition_of(chat_id: int, partitions: int = UPDATE_PARTITIONS) -> int:
+    """Maps a chat to its update partition, so that all updates of a chat are consumed by the same worker."""
+    return chat_id % partitions
+
+
+def next_read_id(batch: Sequence[Tuple[str, Any]], count: int) -> str:
+    """
+    Returns the ID to read a consumer's pending entries from after `batch`: past its last entry, or `>` for new
+    entries once a short batch shows that every pending entry was delivered again.
+    """
+    return batch[-1][0] if len(batch) >= count else ">"
+
+
+class RedisStreamTransport:
+    """
+    Moves updates and outgoing calls between processes over Redis Streams.
+
+    Every stream is read through one consumer group with at-least-once semantics: an entry stays pending until it is
+    acknowledged, and a consumer restarted under the same name first receives its pending entries again, once each.
+    """
+
+    def __init__(self) -> None:
+        import redis.asyncio as redis
+
+        self.db = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        self._groups: Set[str] = set()
+        # ID each consumer reads a stream from: its pending entries after this one, or new entries once it is `>`.
+        self._read_ids: Dict[Tuple[str, str], str] = {}
+
+    async def publish(self, stream: str, fields: Dict[str, str]) -> None:
+        """Appends an entry, trimming the stream to about `STREAM_MAXLEN` entries."""
+        await self.db.xadd(stream, fields, maxlen=STREAM_MAXLEN, approximate=True)  # type: ignore
+
+    async def read(
+        self, streams: List[str], consumer: str, count: int = STREAM_READ_COUNT, block_ms: int = STREAM_BLOCK_MS
+    ) -> List[Entry]:
+        """
+        Returns `(stream, entry_id, fields)` entries: first those left pending by the consumer, then new ones.
+
+        Pending entries stay pending until they are acknowledged, so they are paged through by ID rather than read
+        from `0` again; Redis ignores `block_ms` while any stream is still reading them.
+        """
+        await self._ensure_groups(streams)
+        ids = {stream: self._read_ids.get((consumer, stream), "0") for stream in streams}
+        response: Any = await self.db.xreadgroup(
+            CONSUMER_GROUP, consumer, ids, count=count, block=block_ms  # type: ignore[arg-type]
+        )
+        # A list of `[stream, entries]` pairs over RESP2, a dict over RESP3.
+        batches: Dict[str, StreamBatch] = dict(response or [])
+
+        entries: List[Entry] = []
+        for stream in streams:
+            batch = batches.get(stream, [])
+            if ids[stream] != ">":
+                self._read_ids[(consumer, stream)] = next_read_id(batch, count)
+            entries += await self._live_entries(stream, batch)
+        return entries
+
+    async def ack(self, stream: str, entry_id: str) -> None:
+        """Marks an entry as handled."""
+        await self.db.xack(stream, CONSUMER_GROUP, entry_id)
+
+    async def is_done(self, key: str) -> bool:
+        """Whether an update with this dedup key was already handled."""
+        return bool(await self.db.exists(f"done:{key}"))
+
+    async def mark_done(self, key: str) -> None:
+        """Remembers for `DEDUP_TTL` seconds that an update was handled."""
+        await self.db.set(f"done:{key}", 1, ex=DEDUP_TTL)
+
+    async def close(self) -> None:
+        await self.db.aclose()
+
+    async def _live_entries(self, stream: str, batch: StreamBatch) -> List[Entry]:
+        entries = []
+        for entry_id, fields in batch:
+            if fields:
+                entries.append((stream, entry_id, fields))
+            else:
+                # Trimmed away while pending; nothing left to handle.
+                await self.ack(stream, entry_id)
+        return entries
+
+    async def _ensure_groups(self, streams: List[str]) -> None:
+        for stream in streams:
+            if stream not in self._groups:
+                await self._create_group(stream)
+                self._groups.add(stream)
+
+    async def _create_group(self, stream: str) -> None:
+        from redis.exceptions import ResponseError
+
+        try:
+            await self.db.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+
+class LocalTransport:
+    """
+    In-process stand-in for `RedisStreamTransport` with the same delivery semantics, for local runs and tests.
+
+    Reads follow XREADGROUP: a consumer reading from an ID gets its pending entries after it, however often it asks,
+    while `>` delivers new entries and is the only read that blocks.
+    """
+
+    def __init__(self) -> None:
+        self.streams: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+        self.delivered: Dict[str, int] = {}
+        self.pending: Dict[str, Dict[str, Tuple[str, Dict[str, str]]]] = {}
+        self.done: Set[str] = set()
+        self.redelivered = 0
+        self._read_ids: Dict[Tuple[str, str], str] = {}
+        self._ids = itertools.count(1)
+        self._changed = asyncio.Event()
+
+    async def publish(self, stream: str, fields: Dict[str, str]) -> None:
+        self.streams.setdefault(stream, []).append((f"{next(self._ids)}-0", fields))
+        self._changed.set()
+
+    async def read(
+        self, streams: List[str], consumer: str, count: int = STREAM_READ_COUNT, block_ms: int = STREAM_BLOCK_MS
+    ) -> List[Entry]:
+        ids = {stream: self._read_ids.get((consumer, stream), "0") for stream in streams}
+        entries = self._read(ids, consumer, count)
+        if entries or not block_ms or set(ids.values()) != {">"}:
+            return entries
+        self._changed.clear()
+        try:
+            await asyncio.wait_for(self._changed.wait(), block_ms / 1000)
+        except asyncio.TimeoutError:
+            return []
+        return self._read(ids, consumer, count)
+
+    async def ack(self, stream: str, entry_id: str) -> None:
+        self.pending.get(stream, {}).pop(entry_id, None)
+
+    async def is_done(self, key: str) -> bool:
+        return key in self.done
+
+    async def mark_done(self, key: str) -> None:
+        self.done.add(key)
+
+    async def close(self) -> None:
+        pass
+
+    def restart(self, consumer: str) -> None:
+        """Simulates a crash of the consumer: it reads its pending entries from `0` again, as a new process does."""
+        self._read_ids = {key: read_id for key, read_id in self._read_ids.items() if key[0] != consumer}
+
+    def _read(self, ids: Dict[str, str], consumer: str, count: int) -> List[Entry]:
+        entries: List[Entry] = []
+        for stream, read_id in ids.items():
+            if read_id == ">":
+                entries += self._take(stream, consumer, count)
+                continue
+            batch = self._pending_after(stream, consumer, read_id, count)
+            self._read_ids[(consumer, stream)] = next_read_id(batch, count)
+            self.redelivered += len(batch)
+            entries += [(stream, entry_id, fields) for entry_id, fields in batch]
+        return entries
+
+    def _pending_after(self, stream: str, consumer: str, read_id: str, count: int) -> List[Tuple[str, Dict[str, str]]]:
+        after = int(read_id.partition("-")[0])
+        owned = [
+            (entry_id, fields)
+            for entry_id, (owner, fields) in self.pending.get(stream, {}).items()
+            if owner == consumer and int(entry_id.partition("-")[0]) > after
+        ]
+        return owned[:count]
+
+    def _take(self, stream: str, consumer: str, count: int) -> List[Entry]:
+        start = self.delivered.get(stream, 0)
+        batch = self.streams.get(stream, [])[start : start + count]
+        self.delivered[stream] = start + len(batch)
+        for entry_id, fields in batch:
+            self.pending.setdefault(stream, {})[entry_id] = (consumer, fields)
+        return [(stream, entry_id, fields) for entry_id, fields in batch]
@@ -0,0 +1,122 @@
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from pyrogram import enums
+from pyrogram.types import (
+    CallbackQuery,
+    Chat,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    KeyboardButton,
+    Message,
+    ReplyKeyboardMarkup,
+    ReplyKeyboardRemove,
+    User,
+)
+
+from bot.dispatcher import update_key
+
+Update = Union[Message, CallbackQuery]
+Markup = Union[InlineKeyboardMarkup, ReplyKeyboardMarkup, ReplyKeyboardRemove]
+
+
+def _encode_message(message: Message) -> Dict[str, Any]:
+    user = message.from_user
+    return {
+        "id": message.id,
+        "chat_id": message.chat.id,
+        "chat_type": message.chat.type.value,
+        "user": {"id": user.id, "first_name": user.first_name, "username": user.username} if user else None,
+        "text": message.text,
+        "date": message.date.timestamp() if message.date else None,
+    }
+
+
+def _decode_message(data: Dict[str, Any], client: Any) -> Message:
+    # Pyrogram annotates these as required, but updates can come without them.
+    optional: Dict[str, Any] = {
+        "from_user": User(client=client, **data["user"]) if data["user"] else None,
+        "date": datetime.fromtimestamp(data["date"]) if data["date"] else None,
+    }
+    return Message(
+        client=client,
+        id=data["id"],
+        chat=Chat(client=client, id=data["chat_id"], type=enums.ChatType(data["chat_type"])),
+        text=data["text"],
+        **optional,
+    )
+
+
+def dedup_key(update: Update) -> str:
+    """Returns an ID that is the same for every delivery of an update: Telegram sends no update ID to handlers."""
+    if isinstance(update, CallbackQuery):
+        return f"callback:{update.id}"
+    return f"message:{update.chat.id}:{update.id}"
+
+
+def encode_update(update: Update) -> Dict[str, str]:
+    """
+    Flattens the fields of a message or callback query that the handlers read into stream entry fields.
+
+    :return: `kind`, `key` (dedup key), `chat` (dispatch key) and the JSON `payload`.
+    """
+    if isinstance(update, CallbackQuery):
+        kind = "callback"
+        payload = {
+            "id": update.id,
+            "user": {"id": update.from_user.id, "first_name": update.from_user.first_name},
+            "chat_instance": update.chat_instance,
+            "data": update.data,
+            "message": _encode_message(update.message) if update.message else None,
+        }
+    else:
+        kind, payload = "message", _encode_message(update)
+    return {"kind": kind, "key": dedup_key(update), "chat": str(update_key(update)), "payload": json.dumps(payload)}
+
+
+def decode_update(fields: Dict[str, str], client: Any) -> Update:
+    """Rebuilds the update from `encode_update` fields, bound to `client` so that replies go through it."""
+    data = json.loads(fields["payload"])
+    if fields["kind"] != "callback":
+        return _decode_message(data, client)
+    optional: Dict[str, Any] = {"message": _decode_message(data["message"], client) if data["message"] else None}
+    return CallbackQuery(
+        client=client,
+        id=data["id"],
+        from_user=User(client=client, **data["user"]),
+        chat_instance=data["chat_instance"],
+        data=data["data"],
+        **optional,
+    )
+
+
+def encode_markup(markup: Optional[Markup]) -> Optional[Dict[str, Any]]:
+    """Converts a reply or inline keyboard into JSON-compatible data."""
+    if markup is None:
+        return None
+    if isinstance(markup, InlineKeyboardMarkup):
+        rows = [[[button.text, button.callback_data] for button in row] for row in markup.inline_keyboard]
+        return {"inline": rows}
+    if isinstance(markup, ReplyKeyboardMarkup):
+        labels = [
+            [button.text if isinstance(button, KeyboardButton) else button for button in row] for row in markup.keyboard
+        ]
+        return {"keyboard": labels, "resize": markup.resize_keyboard}
+    return {"remove": True}
+
+
+def decode_markup(data: Optional[Dict[str, Any]]) -> Optional[Markup]:
+    """Rebuilds a keyboard produced by `encode_markup`."""
+    if data is None:
+        return None
+    if "inline" in data:
+        rows: List[List[Any]] = data["inline"]
+        return InlineKeyboardMarkup(
+            [[InlineKeyboardButton(text, callback_data=cb) for text, cb in row] for row in rows]
+        )
+    if "keyboard" in data:
+        return ReplyKeyboardMarkup(
+            [[KeyboardButton(text) for text in row] for row in data["keyboard"]], resize_keyboard=data["resize"]
+        )
+    return ReplyKeyboardRemove()
@@ -1,6 +1,194 @@
+import csv
+import io
+from datetime import datetime, timedelta, timezone
+from typing import IO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pyrogram.types import InlineKeyboardMarkup
+
+from bot.keyboards import InlineKeyboards
 from bot.messages import Messages
 
+EPOCH = datetime(1970, 1, 1)
+MAX_SELECTION_RANGES = 50
+# Task numbers are sent to PostgreSQL as int4.
+MAX_TASK_NUMBER = 2**31 - 1
+DUE_DATE_FORMAT = "%Y-%m-%d %H:%M"
+DUE_TIME_FORMAT = "%H:%M"
+DIGEST_TITLE_LENGTH = 200
+CSV_TRUE = frozenset({"t", "true", "1", "yes"})
+CSV_FALSE = frozenset({"", "f", "false", "0", "no"})
+
+# An imported task: (title, description, is_completed, due_at, remind_at).
+TaskRecord = Tuple[str, Optional[str], bool, Optional[datetime], Optional[datetime]]
+
 
 def get_task_status_icon(is_completed: bool) -> str:
     """Return a string emoji icon based on the task completion status."""
     return Messages.ICON_DONE if is_completed else Messages.ICON_TODO
+
+
+def set_task_status_icon(text: str, is_completed: bool) -> Optional[str]:
+    """Return `text` with its leading status icon set to match `is_completed`, or None if it starts with no icon."""
+    for icon in (Messages.ICON_DONE, Messages.ICON_TODO):
+        if text.startswith(icon):
+            return get_task_status_icon(is_completed) + text[len(icon) :]
+    return None
+
+
+def parse_task_lines(text: str) -> List[Tuple[str, Optional[str]]]:
+    """Split a multi-line message into `(title, description)` pairs, one task per non-empty line."""
+    tasks = []
+    for line in text.splitlines():
+        title, _, description = line.partition("|")
+        if title.strip():
+            tasks.append((title.strip(), description.strip() or None))
+    return tasks
+
+
+def parse_task_ranges(text: str) -> List[Tuple[int, int]]:
+    """Parse a selection like `1-5,8` into inclusive `(low, high)` ranges; raises ValueError on invalid input."""
+    ranges = []
+    for part in text.replace(" ", "").split(","):
+        low, _, high = part.partition("-")
+        bounds = (int(low), int(high or low))
+        if not 1 <= bounds[0] <= bounds[1] <= MAX_TASK_NUMBER:
+            raise ValueError(f"Invalid range: {part}")
+        ranges.append(bounds)
+    if len(ranges) > MAX_SELECTION_RANGES:
+        raise ValueError("Too many ranges")
+    return ranges
+
+
+def parse_due_date(text: str, now: datetime) -> Optional[datetime]:
+    """
+    Parse `YYYY-MM-DD HH:MM`, or `HH:MM` for its next occurrence after `now`; `-` removes the due date and gives None.
+    Raises ValueError on invalid input or a time that is not after `now`.
+    """
+    text = " ".join(text.split())
+    if text == "-":
+        return None
+    try:
+        due_at = datetime.strptime(text, DUE_DATE_FORMAT)
+    except ValueError:
+        due_at = next_time_of_day(text, now)
+    if due_at <= now:
+        raise ValueError("Due date is in the past")
+    return due_at
+
+
+def next_time_of_day(text: str, now: datetime) -> datetime:
+    """Return the next occurrence of the `HH:MM` in `text` after `now`; raises ValueError if it is not a time."""
+    due_at = datetime.combine(now.date(), datetime.strptime(text, DUE_TIME_FORMAT).time())
+    if due_at <= now:
+        due_at += timedelta(days=1)
+    return due_at
+
+
+def read_task_csv(file: IO[bytes], now: datetime, max_tasks: int) -> Iterator[TaskRecord]:
+    """
+    Parse an exported task CSV one row at a time into `(title, description, is_completed, due_at, remind_at)`.
+    A reminder is kept for open tasks due after `now`. Rows without a title are skipped; raises ValueError on a
+    malformed file or more than `max_tasks` tasks.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if "title" not in (reader.fieldnames or []):
+            raise ValueError("The file has no title column")
+        yield from _read_task_rows(reader, now, max_tasks)
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Unreadable file: {e}")
+    finally:
+        # The caller owns the file; detaching keeps the wrapper from closing it.
+        text.detach()
+
+
+def _read_task_rows(reader: csv.DictReader, now: datetime, max_tasks: int) -> Iterator[TaskRecord]:
+    rows = (row for row in reader if (row.get("title") or "").strip())
+    for count, row in enumerate(rows, 1):
+        if count > max_tasks:
+            raise ValueError(f"More than {max_tasks} tasks")
+        yield _read_task_row(row, reader.line_num, now)
+
+
+def _read_task_row(row: Dict[str, Optional[str]], line: int, now: datetime) -> TaskRecord:
+    status = (row.get("is_completed") or "").strip().lower()
+    if status not in CSV_TRUE and status not in CSV_FALSE:
+        raise ValueError(f"Invalid status on line {line}")
+    is_completed = status in CSV_TRUE
+    due_at = _read_csv_datetime(row.get("due_at"), line)
+    remind_at = due_at if due_at and not is_completed and due_at > now else None
+    return (row.get("title") or "").strip(), row.get("description") or None, is_completed, due_at, remind_at
+
+
+def _read_csv_datetime(value: Optional[str], line: int) -> Optional[datetime]:
+    # Exported dates are naive UTC; dates with an offset are converted to it.
+    if not value:
+        return None
+    try:
+        due_at = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Invalid due date on line {line}")
+    if due_at.tzinfo:
+        due_at = due_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return due_at
+
+
+def format_task_ranges(ranges: Sequence[Tuple[int, int]]) -> str:
+    """Format inclusive ranges back into the `1-5,8` selection syntax."""
+    return ",".join(str(low) if low == high else f"{low}-{high}" for low, high in ranges)
+
+
+def encode_page_cursor(task: Sequence, task_number: int) -> Tuple[int, int, int]:
+    """Encode the keyset position `(created_at, id)` of a listed task and its number as callback arguments."""
+    created_at = (task[3] - EPOCH) // timedelta(microseconds=1)
+    return created_at, task[0], task_number
+
+
+def decode_page_cursor(args: Sequence[int]) -> Tuple[Tuple[datetime, int], int]:
+    """Decode callback arguments produced by `encode_page_cursor` into a keyset cursor and a task number."""
+    if len(args) != 3:
+        raise ValueError("Invalid page cursor")
+    created_at, task_id, task_number = args
+    return (EPOCH + timedelta(microseconds=created_at), task_id), task_number
+
+
+def render_search_page(
+    tasks: Sequence[Sequence], offset: int, page_size: int, has_next: bool, owner: int
+) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Render one page of `(id, title, is_completed, position)` search results and its navigation keyboard."""
+    task_list = "\n".join(f"{get_task_status_icon(bool(task[2]))} {task[3]}. {task[1]}" for task in tasks)
+    if not (offset or has_next):
+        return Messages.search_results(task_list), None
+
+    prev_offset = max(offset - page_size, 0) if offset else None
+    next_offset = offset + page_size if has_next else None
+    return Messages.search_results(task_list), InlineKeyboards.SearchPage(owner, prev_offset, next_offset)
+
+
+def render_digest(open_tasks: int, titles: Sequence[str], due_dates: Sequence[Optional[datetime]]) -> str:
+    """Render a daily digest: the first open tasks, with their local due dates, and how many more there are."""
+    lines = []
+    for number, (title, due_at) in enumerate(zip(titles, due_dates), 1):
+        if len(title) > DIGEST_TITLE_LENGTH:
+            title = title[: DIGEST_TITLE_LENGTH - 1] + "…"
+        due = f" ⏰ {due_at.strftime(DUE_DATE_FORMAT)}" if due_at else ""
+        lines.append(f"{get_task_status_icon(False)} {number}. {title}{due}")
+    if open_tasks > len(lines):
+        lines.append(Messages.digest_more(open_tasks - len(lines)))
+    return Messages.digest(open_tasks, "\n".join(lines))
+
+
+def render_tasks_page(
+    tasks: Sequence[Sequence], first_number: int, has_prev: bool, has_next: bool, owner: int
+) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Render one page of the task list and its navigation keyboard (None when everything fits one page)."""
+    task_list = "\n".join(
+        f"{get_task_status_icon(bool(task[2]))} {first_number + i}. {task[1]}" for i, task in enumerate(tasks)
+    )
+    if not (has_prev or has_next):
+        return Messages.task_list(task_list), None
+
+    prev_cursor = encode_page_cursor(tasks[0], first_number) if has_prev else None
+    next_cursor = encode_page_cursor(tasks[-1], first_number + len(tasks) - 1) if has_next else None
+    return Messages.task_list(task_list), InlineKeyboards.TasksPage(owner, prev_cursor, next_cursor)
@@ -0,0 +1,185 @@
+"""
+Worker process of the scaled-out bot: handles the update partitions assigned to it and replies through the outbox.
+
+    python -m bot.worker --index 0 --count 4
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Set, Union
+
+from bot.bot import create_backends
+from bot.callbacks import check_callback_secret
+from bot.digest import DIGEST_ENABLED, DigestJob, RedisDigestCheckpoint
+from bot.dispatcher import DISPATCH_WORKERS, Dispatcher, Handler
+from bot.handler import CallbackHandler, TaskHandler
+from bot.reminders import ReminderScheduler
+from bot.sender import Priority
+from bot.transport import (
+    OUTBOX_STREAM,
+    STREAM_READ_COUNT,
+    UPDATE_PARTITIONS,
+    RedisStreamTransport,
+    update_stream,
+)
+from bot.updates import decode_update, encode_markup
+from config.config import load_config
+from metrics.metrics import start_metrics_server
+
+load_config()
+
+WORKER_MAX_IN_FLIGHT = int(os.getenv("WORKER_MAX_IN_FLIGHT", 200))
+
+
+class OutboxClient:
+    """
+    Client stand-in for workers: outgoing calls are published to the outbox stream and sent by the ingress process,
+    which owns the Telegram connection and the send scheduler. Calls return None, as results stay in the ingress.
+    """
+
+    def __init__(self, transport: Any) -> None:
+        self.transport = transport
+
+    async def send_message(
+        self,
+        chat_id: Union[int, str],
+        text: str,
+        priority: Priority = Priority.NORMAL,
+        coalesce: bool = True,
+        **kwargs: Any,
+    ) -> None:
+        await self._publish("send_message", chat_id=chat_id, text=text, priority=priority, coalesce=coalesce, **kwargs)
+
+    async def edit_message_text(self, chat_id: int, message_id: int, text: str, **kwargs: Any) -> None:
+        await self._publish("edit_message_text", chat_id=chat_id, message_id=message_id, text=text, **kwargs)
+
+    async def edit_message_reply_markup(self, chat_id: int, message_id: int, **kwargs: Any) -> None:
+        await self._publish("edit_message_reply_markup", chat_id=chat_id, message_id=message_id, **kwargs)
+
+    async def answer_callback_query(self, callback_query_id: str, **kwargs: Any) -> None:
+        await self._publish("answer_callback_query", callback_query_id=callback_query_id, **kwargs)
+
+    async def _publish(self, method: str, reply_markup: Any = None, **kwargs: Any) -> None:
+        # Pyrogram passes every optional argument; only the ones that are set and JSON-compatible are sent on.
+        kwargs = {key: value for key, value in kwargs.items() if isinstance(value, (str, int, float, bool))}
+        call = {"method": method, "kwargs": kwargs, "reply_markup": encode_markup(reply_markup)}
+        await self.transport.publish(OUTBOX_STREAM, {"call": json.dumps(call)})
+
+
+class Worker:
+    """Consumes update partitions and runs every update once through the existing handlers, in per-chat order."""
+
+    def __init__(
+        self,
+        transport: Any,
+        partitions: List[int],
+        consumer: str,
+        client: Any,
+        db: Any,
+        cache: Any,
+        workers: int = DISPATCH_WORKERS,
+        max_in_flight: int = WORKER_MAX_IN_FLIGHT,
+        read_count: int = STREAM_READ_COUNT,
+    ) -> None:
+        self.transport = transport
+        self.streams = [update_stream(partition) for partition in partitions]
+        self.consumer = consumer
+        self.read_count = read_count
+        self.client = client
+        self.task_handler = TaskHandler(client, db, cache)
+        self.callback_handler = CallbackHandler(client, db, cache)
+        # Nothing may be dropped: stream entries are only read while fewer than `max_in_flight` are unfinished.
+        self.dispatcher = Dispatcher(workers, max_pending=max_in_flight)
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self._acks: Set["asyncio.Task[None]"] = set()
+
+    async def run(self) -> None:
+        """Reads and dispatches entries until cancelled."""
+        while True:
+            for stream, entry_id, fields in await self.transport.read(self.streams, self.consumer, self.read_count):
+                await self.in_flight.acquire()
+                self.submit(stream, entry_id, fields)
+
+    def submit(self, stream: str, entry_id: str, fields: Dict[str, str]) -> "asyncio.Future[None]":
+        """Queues one stream entry; it is acknowledged once handled, or skipped if an earlier delivery was."""
+        update = decode_update(fields, self.client)
+        if fields["kind"] == "callback":
+            handler: Handler = self.callback_handler.handle_callback
+        else:
+            handler = self.task_handler.handle_updates
+
+        async def handle_once(client: Any, update: Any) -> None:
+            if await self.transport.is_done(fields["key"]):
+                return
+            await handler(client, update)
+            await self.transport.mark_done(fields["key"])
+
+        future = self.dispatcher.submit(int(fields["chat"]), handle_once, self.client, update)
+        future.add_done_callback(lambda _: self._schedule_ack(stream, entry_id))
+        return future
+
+    async def stop(self) -> None:
+        """Finishes the dispatched updates; entries read but not dispatched stay pending for the next run."""
+        await self.dispatcher.stop()
+        await asyncio.gather(*self._acks)
+
+    def _schedule_ack(self, stream: str, entry_id: str) -> None:
+        task = asyncio.create_task(self._ack(stream, entry_id))
+        self._acks.add(task)
+        task.add_done_callback(self._acks.discard)
+
+    async def _ack(self, stream: str, entry_id: str) -> None:
+        try:
+            await self.transport.ack(stream, entry_id)
+        except Exception as e:
+            logging.error(f"[worker] Failed to acknowledge {stream} {entry_id}: {e}", exc_info=True)
+        finally:
+            self.in_flight.release()
+
+
+def assigned_partitions(index: int, count: int, partitions: int = UPDATE_PARTITIONS) -> List[int]:
+    """Returns the partitions handled by worker `index` of `count`."""
+    return [partition for partition in range(partitions) if partition % count == index]
+
+
+async def main(args: argparse.Namespace) -> None:
+    check_callback_secret()
+    start_metrics_server(args.metrics_port)
+    transport = RedisStreamTransport()
+    db, cache = create_backends(f"worker-{args.index}")
+    partitions = assigned_partitions(args.index, args.count)
+    client = OutboxClient(transport)
+    worker = Worker(transport, partitions, f"worker-{args.index}", client, db, cache)
+    # Every worker sends reminders; claims skip rows another worker holds, so each reminder goes out once.
+    reminders = ReminderScheduler(db, client)
+    # The digest covers all users, so only the first worker sends it; the outbox keeps the sent ones until delivered.
+    digest = DigestJob(db, client, RedisDigestCheckpoint(cache.db)) if DIGEST_ENABLED and args.index == 0 else None
+    await db.connect()
+    reminders.start()
+    if digest:
+        digest.start()
+    try:
+        await worker.run()
+    finally:
+        if digest:
+            await digest.stop()
+        await reminders.stop()
+        await worker.stop()
+        await db.close()
+        await cache.close()
+        await transport.close()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", type=int, required=True, help="index of this worker, from 0")
+    parser.add_argument("--count", type=int, required=True, help="number of worker processes")
+    parser.add_argument("--metrics-port", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
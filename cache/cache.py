@@ -1,34 +1,88 @@
 import os
-import json
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
 
-import redis
-from dotenv import load_dotenv
+from config.config import load_config
+from metrics.metrics import timed_cache
 
-load_dotenv()
+if TYPE_CHECKING:
+    import redis.asyncio as redis
 
-REDIS_HOST = os.getenv("REDIS_HOST")
-REDIS_PORT = os.getenv("REDIS_PORT")
+load_config()
+
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+SESSION_TTL = int(os.getenv("SESSION_TTL", 3600))
+
+Uid = Union[str, int]
 
 
 class Cache:
+    """Stores per-user FSM sessions as Redis hashes that expire after `SESSION_TTL` seconds."""
+
     def __init__(self):
-        self.db = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
-
-    def update_user_cache(self, uid, key, value):
-        session = self.db.get(uid)
-        if session:
-            session = json.loads(session)
-        else:
-            session = {}
-        session[key] = value
-        self.db.set(uid, json.dumps(session))
-
-    def get_user_cache(self, uid, key):
-        session = self.db.get(uid)
-        if session:
-            session = json.loads(session)
-            return session.get(key)
-        return None
-
-    def delete_user_cache(self, uid):
-        self.db.delete(uid)
+        self._db: Optional["redis.Redis"] = None
+
+    @property
+    def db(self) -> "redis.Redis":
+        """Returns the Redis client, creating it on first use; it connects lazily on its first command."""
+        if self._db is None:
+            import redis.asyncio as redis
+
+            self._db = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+        return self._db
+
+    @staticmethod
+    def session_key(uid: Uid) -> str:
+        """Returns the Redis key of a user's session hash."""
+        return f"session:{uid}"
+
+    @timed_cache
+    async def update_user_cache(self, uid: Uid, values: Dict[str, Any]) -> None:
+        """Sets one or more session fields and refreshes the TTL in a single round trip."""
+        key = self.session_key(uid)
+        async with self.db.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=values)
+            pipe.expire(key, SESSION_TTL)
+            await pipe.execute()
+
+    @timed_cache
+    async def get_user_cache(self, uid: Uid, key: str) -> Optional[str]:
+        """Returns a single session field or None."""
+        return await self.db.hget(self.session_key(uid), key)
+
+    @timed_cache
+    async def pop_user_cache(self, uid: Uid, key: str) -> Optional[str]:
+        """Returns a single session field and removes it atomically, so it can be consumed only once."""
+        async with self.db.pipeline(transaction=True) as pipe:
+            pipe.hget(self.session_key(uid), key)
+            pipe.hdel(self.session_key(uid), key)
+            value, _ = await pipe.execute()
+        return value
+
+    @timed_cache
+    async def get_user_session(self, uid: Uid) -> Dict[str, str]:
+        """Returns every field of the user's session."""
+        return await self.db.hgetall(self.session_key(uid))
+
+    @timed_cache
+    async def save_user_session(self, uid: Uid, values: Dict[str, Any], reset: bool = False) -> None:
+        """Writes session changes in one round trip, optionally dropping the previous session first."""
+        key = self.session_key(uid)
+        async with self.db.pipeline(transaction=True) as pipe:
+            if reset:
+                pipe.delete(key)
+            if values:
+                pipe.hset(key, mapping=values)
+                pipe.expire(key, SESSION_TTL)
+            await pipe.execute()
+
+    @timed_cache
+    async def delete_user_cache(self, uid: Uid) -> None:
+        """Drops the whole session of the user."""
+        await self.db.delete(self.session_key(uid))
+
+    async def close(self) -> None:
+        """Closes the connection pool of the Redis client, if one was created."""
+        if self._db is not None:
+            await self._db.aclose()
+            self._db = None
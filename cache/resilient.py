@@ -0,0 +1,249 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from cache.cache import SESSION_TTL, Uid
+from cache.lru import MISSING, LRUCache
+from config.config import load_config
+from metrics.metrics import (
+    CACHE_BREAKER_STATE,
+    CACHE_BREAKER_TRANSITIONS,
+    CACHE_FALLBACK_CALLS,
+    CACHE_UNRECONCILED,
+)
+
+load_config()
+
+CACHE_TIMEOUT_MS = int(os.getenv("CACHE_TIMEOUT_MS", 100))
+CACHE_BREAKER_FAILURES = int(os.getenv("CACHE_BREAKER_FAILURES", 5))
+CACHE_BREAKER_RESET = float(os.getenv("CACHE_BREAKER_RESET", 5))
+CACHE_FALLBACK_SIZE = int(os.getenv("CACHE_FALLBACK_SIZE", 10000))
+
+Session = Dict[str, str]
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of a dependency from the outcome of calls to it.
+
+    After `failures` consecutive failures the breaker opens and calls skip the dependency. Once `reset_timeout`
+    seconds have passed, a single trial call is let through: its success closes the breaker, its failure opens it
+    again.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failures: int, reset_timeout: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failed = 0
+        self.opened_at = 0.0
+        self._trial = False
+        CACHE_BREAKER_STATE.set(0)
+
+    def allow(self) -> bool:
+        """Returns whether a call may go to the dependency now."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            self._set(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Records a successful call; the trial call closes the breaker."""
+        self.failed = 0
+        # Calls started before the breaker opened may still succeed; only the trial call closes it.
+        if self.state == self.HALF_OPEN:
+            self._trial = False
+            self._set(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Records a failed or timed out call, opening the breaker when the limit is reached or the trial failed."""
+        self.failed += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failed >= self.failures):
+            self._trial = False
+            self.opened_at = self.clock()
+            self._set(self.OPEN)
+
+    def _set(self, state: str) -> None:
+        logging.warning(f"[cache] Redis circuit breaker {self.state} -> {state}")
+        self.state = state
+        CACHE_BREAKER_STATE.set(self.GAUGE[state])
+        CACHE_BREAKER_TRANSITIONS.labels(state).inc()
+
+
+class ResilientCache:
+    """
+    Wraps `Cache` so that a slow or failing Redis cannot stall the handlers.
+
+    Every call waits at most `timeout` seconds. Failures and timeouts feed a circuit breaker; while it is open,
+    sessions are read and written in a bounded in-process LRU store instead, without waiting for Redis. While Redis
+    is healthy the store mirrors the sessions that pass through, so recently active users keep their FSM state during
+    an outage. Sessions changed in the store are served from it until a background task has written them back to
+    Redis, which it retries whenever the breaker allows a call. Everything else, such as `db`, goes to the wrapped
+    cache as is.
+    """
+
+    def __init__(
+        self,
+        cache: Any,
+        timeout: float = CACHE_TIMEOUT_MS / 1000,
+        failures: int = CACHE_BREAKER_FAILURES,
+        reset_timeout: float = CACHE_BREAKER_RESET,
+        fallback_size: int = CACHE_FALLBACK_SIZE,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.cache = cache
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failures, reset_timeout, clock)
+        self.sessions = LRUCache(fallback_size, SESSION_TTL, clock)
+        # Sessions changed in the store and not yet written back, with a version bumped on every change.
+        self.unreconciled: Dict[str, int] = {}
+        self.fallback_calls = 0
+        self.reconciled = 0
+        self._reconciler: Optional["asyncio.Task[None]"] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.cache, name)
+
+    async def update_user_cache(self, uid: Uid, values: Dict[str, Any]) -> None:
+        values = {key: str(value) for key, value in values.items()}
+        await self._call(
+            "update_user_cache", uid, lambda: self.cache.update_user_cache(uid, values), lambda s: s.update(values)
+        )
+
+    async def get_user_cache(self, uid: Uid, key: str) -> Optional[str]:
+        return await self._call(
+            "get_user_cache", uid, lambda: self.cache.get_user_cache(uid, key), lambda s: s.get(key), write=False
+        )
+
+    async def pop_user_cache(self, uid: Uid, key: str) -> Optional[str]:
+        return await self._call(
+            "pop_user_cache", uid, lambda: self.cache.pop_user_cache(uid, key), lambda s: s.pop(key, None)
+        )
+
+    async def get_user_session(self, uid: Uid) -> Session:
+        async def read() -> Session:
+            session = await self.cache.get_user_session(uid)
+            self.sessions.set(str(uid), dict(session))
+            return session
+
+        return await self._call("get_user_session", uid, read, dict, write=False)
+
+    async def save_user_session(self, uid: Uid, values: Dict[str, Any], reset: bool = False) -> None:
+        values = {key: str(value) for key, value in values.items()}
+
+        def save(session: Session) -> None:
+            if reset:
+                session.clear()
+            session.update(values)
+
+        await self._call(
+            "save_user_session", uid, lambda: self.cache.save_user_session(uid, values, reset), save, complete=reset
+        )
+
+    async def delete_user_cache(self, uid: Uid) -> None:
+        await self._call("delete_user_cache", uid, lambda: self.cache.delete_user_cache(uid), dict.clear, complete=True)
+
+    async def reconcile(self) -> None:
+        """
+        Writes the sessions changed in the store back to Redis, one at a time, until none are left.
+
+        This is the only writer of those sessions, as calls for them are served from the store until they are written
+        back. While the breaker is open it waits, and its writes serve as trial calls, so Redis is retried even if
+        every active user has a session to write back.
+        """
+        while self.unreconciled:
+            if not self.breaker.allow():
+                await asyncio.sleep(self.breaker.reset_timeout)
+                continue
+            await self._write_back(*next(iter(self.unreconciled.items())))
+
+    async def close(self) -> None:
+        """Stops reconciling and closes the wrapped cache; sessions not written back by then are lost."""
+        if self._reconciler:
+            self._reconciler.cancel()
+            self._reconciler = None
+        await self.cache.close()
+
+    async def _call(
+        self,
+        call: str,
+        uid: Uid,
+        remote: Callable[[], Awaitable[Any]],
+        local: Callable[[Session], Any],
+        write: bool = True,
+        complete: bool = False,
+    ) -> Any:
+        """
+        Runs `remote` against Redis, or `local` on the user's session in the store when Redis is unavailable.
+
+        :param write: Whether `local` changes the session; writes through Redis are mirrored on a stored session.
+        :param complete: Whether `local` determines the whole session, so that it is stored even if it was not.
+        """
+        key = str(uid)
+        if key not in self.unreconciled and self.breaker.allow():
+            try:
+                result = await asyncio.wait_for(remote(), self.timeout)
+            except Exception as e:
+                logging.warning(f"[cache] {call} failed, using the in-process store: {e!r}")
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+                if write:
+                    self._mirror(key, local, complete)
+                return result
+
+        return self._fallback(call, key, local, write)
+
+    def _fallback(self, call: str, key: str, local: Callable[[Session], Any], write: bool) -> Any:
+        self.fallback_calls += 1
+        CACHE_FALLBACK_CALLS.labels(call).inc()
+        # A session missing from the store starts out empty; once changed, it replaces the one in Redis.
+        session = self.sessions.get(key)
+        session = {} if session is MISSING else session
+        result = local(session)
+        if write:
+            self.sessions.set(key, session)
+            self.unreconciled[key] = self.unreconciled.get(key, 0) + 1
+            CACHE_UNRECONCILED.set(len(self.unreconciled))
+            if self._reconciler is None or self._reconciler.done():
+                self._reconciler = asyncio.create_task(self.reconcile())
+        return result
+
+    async def _write_back(self, key: str, version: int) -> None:
+        session = self.sessions.get(key)
+        values = {} if session is MISSING else dict(session)
+        try:
+            await asyncio.wait_for(self.cache.save_user_session(key, values, reset=True), self.timeout)
+        except Exception as e:
+            logging.warning(f"[cache] Writing a session back to Redis failed: {e!r}")
+            self.breaker.record_failure()
+            return
+        self.breaker.record_success()
+        if self.unreconciled[key] == version:
+            del self.unreconciled[key]
+            self.reconciled += 1
+        else:
+            # Changed during the write: written again after the others.
+            self.unreconciled[key] = self.unreconciled.pop(key)
+        CACHE_UNRECONCILED.set(len(self.unreconciled))
+
+    def _mirror(self, key: str, local: Callable[[Session], Any], complete: bool) -> None:
+        session = self.sessions.get(key)
+        if session is MISSING:
+            if not complete:
+                return
+            session = {}
+        local(session)
+        self.sessions.set(key, session)
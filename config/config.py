@@ -0,0 +1,9 @@
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+
+@lru_cache(maxsize=None)
+def load_config() -> None:
+    """Loads `.env` into the environment once per process; every module calls this before reading its settings."""
+    load_dotenv()
@@ -1,94 +1,590 @@
+import itertools
 import os
-import psycopg2
-from dotenv import load_dotenv
-from contextlib import contextmanager
-from typing import Optional, List, Tuple
+import re
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
-load_dotenv()
+from cache.lru import MISSING, LRUCache
+from config.config import load_config
+from metrics.metrics import timed_query, track_pool
+
+if TYPE_CHECKING:
+    import asyncpg
+
+load_config()
 
 DB_HOST = os.getenv("POSTGRES_HOST")
+DB_PORT = int(os.getenv("POSTGRES_PORT", 5432))
 DB_NAME = os.getenv("POSTGRES_NAME")
 DB_USER = os.getenv("POSTGRES_USER")
 DB_PASS = os.getenv("POSTGRES_PASSWORD")
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", 5))
+DB_STATEMENT_TIMEOUT = int(os.getenv("DB_STATEMENT_TIMEOUT", 5000))
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 600))
+USER_CACHE_NEGATIVE_TTL = float(os.getenv("USER_CACHE_NEGATIVE_TTL", 30))
+
+TASK_PAGE_CACHE_SIZE = int(os.getenv("TASK_PAGE_CACHE_SIZE", 10000))
+TASK_PAGE_CACHE_TTL = float(os.getenv("TASK_PAGE_CACHE_TTL", 600))
+
+SEARCH_MAX_TERMS = 8
+
+EXPORT_QUERY = (
+    "SELECT title, description, is_completed, created_at, due_at FROM tasks "
+    "WHERE telegram_id = $1 ORDER BY created_at, id"
+)
+IMPORT_COLUMNS = ("telegram_id", "title", "description", "is_completed", "due_at", "remind_at", "created_at")
+
+# Numbers the user's tasks in list order and matches them against `unnest($2, $3)` inclusive ranges.
+NUMBERED_TASKS = (
+    "numbered AS (SELECT id, row_number() OVER (ORDER BY created_at, id) AS position FROM tasks WHERE telegram_id = $1)"
+)
+IN_RANGES = (
+    "EXISTS (SELECT 1 FROM unnest($2::int[], $3::int[]) AS r(low, high) "
+    "WHERE numbered.position BETWEEN r.low AND r.high)"
+)
+
+
+def search_terms(text: str) -> List[str]:
+    """Splits a search query into lowercase words, keeping at most `SEARCH_MAX_TERMS`."""
+    return re.findall(r"\w+", text.lower())[:SEARCH_MAX_TERMS]
+
+
+def prefix_tsquery(text: str) -> Optional[str]:
+    """Builds a `to_tsquery` expression matching every word of the query as a prefix, e.g. `'buy':* & 'mil':*`."""
+    return " & ".join(f"'{term}':*" for term in search_terms(text)) or None
+
 
 class Database:
-    """Handles all database operations using raw SQL queries."""
+    """Handles all database operations using raw SQL queries over an asyncpg connection pool."""
 
     def __init__(self):
-        """Initializes a connection to the PostgreSQL database."""
-        self.connection = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
-        self.connection.autocommit = True
-
-    @contextmanager
-    def get_cursor(self):
-        """Provides a database cursor for executing queries."""
-        cursor = self.connection.cursor()
-        try:
-            yield cursor
-        finally:
-            cursor.close()
-
-    def create_user(self, name: str, username: str, telegram_id: str) -> None:
-        """Registers a new user in the database."""
-        with self.get_cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO users (name, username, telegram_id) VALUES (%s, %s, %s)", (name, username, telegram_id)
-            )
-
-    def get_user(self, telegram_id: str) -> Optional[Tuple[int, str, str]]:
-        """Retrieves user information by Telegram ID."""
-        with self.get_cursor() as cursor:
-            cursor.execute("SELECT id, name, username FROM users WHERE telegram_id = %s", (telegram_id,))
-            return cursor.fetchone()
-
-    def get_user_by_username(self, username: str) -> Optional[int]:
-        """Checks if a username already exists in the database."""
-        with self.get_cursor() as cursor:
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            result = cursor.fetchone()
-            return result[0] if result else None
-
-    def create_task(self, telegram_id: str, title: str, description: str) -> None:
+        """Prepares the database; the connection pool is opened by `connect`."""
+        self.pool: Optional["asyncpg.Pool"] = None
+        self.users = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        self.usernames = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        self.task_pages = LRUCache(TASK_PAGE_CACHE_SIZE, TASK_PAGE_CACHE_TTL)
+        self.task_versions = LRUCache(TASK_PAGE_CACHE_SIZE, float("inf"))
+        self._versions = itertools.count(1)
+
+    async def connect(self) -> None:
+        """Opens a bounded connection pool to the PostgreSQL database."""
+        # Imported here so that processes and benchmarks running without PostgreSQL never load the driver.
+        import asyncpg
+
+        self.pool = await asyncpg.create_pool(
+            host=DB_HOST,
+            port=DB_PORT,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASS,
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=DB_POOL_MAX_SIZE,
+            server_settings={"statement_timeout": str(DB_STATEMENT_TIMEOUT)},
+        )
+        track_pool(self.pool)
+
+    async def close(self) -> None:
+        """Closes all pooled connections."""
+        if self.pool:
+            await self.pool.close()
+            self.pool = None
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator["asyncpg.Connection"]:
+        """Provides a pooled connection for executing queries."""
+        if self.pool is None:
+            raise RuntimeError("Database pool is not initialized, call connect() first")
+        async with self.pool.acquire(timeout=DB_ACQUIRE_TIMEOUT) as connection:
+            yield connection
+
+    @timed_query
+    async def create_user(self, name: str, username: str, telegram_id: str) -> bool:
+        """Registers a new user in the database; returns False if the username was taken in the meantime."""
+        async with self.get_connection() as connection:
+            # The cached "free" answer may be stale if another process has just registered the name.
+            status = await connection.execute(
+                "INSERT INTO users (name, username, telegram_id) VALUES ($1, $2, $3) ON CONFLICT (username) DO NOTHING",
+                name,
+                username,
+                telegram_id,
+            )
+        self.users.invalidate(telegram_id)
+        self.usernames.invalidate(username)
+        return status == "INSERT 0 1"
+
+    @timed_query
+    async def get_user(self, telegram_id: str) -> Optional[Tuple[int, str, str]]:
+        """Retrieves user information by Telegram ID, served from the user cache when possible."""
+        user = self.users.get(telegram_id)
+        if user is MISSING:
+            async with self.get_connection() as connection:
+                user = await connection.fetchrow(
+                    "SELECT id, name, username FROM users WHERE telegram_id = $1", telegram_id
+                )
+            self.users.set(telegram_id, user, ttl=None if user else USER_CACHE_NEGATIVE_TTL)
+        return user
+
+    @timed_query
+    async def get_user_by_username(self, username: str) -> Optional[int]:
+        """Checks if a username already exists in the database, served from the user cache when possible."""
+        user_id = self.usernames.get(username)
+        if user_id is MISSING:
+            async with self.get_connection() as connection:
+                user_id = await connection.fetchval("SELECT id FROM users WHERE username = $1", username)
+            self.usernames.set(username, user_id, ttl=None if user_id else USER_CACHE_NEGATIVE_TTL)
+        return user_id
+
+    def user_cache_stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and sizes of the in-process user and task page caches."""
+        return {
+            "user_hits": self.users.hits,
+            "user_misses": self.users.misses,
+            "user_size": len(self.users),
+            "username_hits": self.usernames.hits,
+            "username_misses": self.usernames.misses,
+            "username_size": len(self.usernames),
+            "task_page_hits": self.task_pages.hits,
+            "task_page_misses": self.task_pages.misses,
+            "task_page_size": len(self.task_pages),
+        }
+
+    def task_version(self, telegram_id: str) -> int:
+        """Returns the version of the user's task list, part of the key of its cached pages."""
+        version = self.task_versions.get(telegram_id)
+        if version is MISSING:
+            # A forgotten version is replaced by a fresh one, so pages cached under the old one can never match.
+            version = next(self._versions)
+            self.task_versions.set(telegram_id, version)
+        return version
+
+    def invalidate_tasks(self, telegram_id: str) -> None:
+        """Bumps the version of the user's task list after a write, dropping every cached page of it."""
+        self.task_versions.set(telegram_id, next(self._versions))
+
+    @timed_query
+    async def create_task(self, telegram_id: str, title: str, description: str) -> None:
         """Adds a new task to the database."""
-        with self.get_cursor() as cursor:
-            cursor.execute(
+        async with self.get_connection() as connection:
+            await connection.execute(
+                "INSERT INTO tasks (telegram_id, title, description, created_at, is_completed) "
+                "VALUES ($1, $2, $3, NOW(), FALSE)",
+                telegram_id,
+                title,
+                description,
+            )
+        self.invalidate_tasks(telegram_id)
+
+    @timed_query
+    async def create_tasks(self, telegram_id: str, tasks: List[Tuple[str, Optional[str]]]) -> int:
+        """Adds many tasks with one multi-row INSERT, keeping their order, and returns how many were created."""
+        async with self.get_connection() as connection:
+            status = await connection.execute(
                 "INSERT INTO tasks (telegram_id, title, description, created_at, is_completed) "
-                "VALUES (%s, %s, %s, NOW(), FALSE)",
-                (telegram_id, title, description),
+                "SELECT $1, t.title, t.description, NOW(), FALSE "
+                "FROM unnest($2::text[], $3::text[]) WITH ORDINALITY AS t(title, description, position) "
+                "ORDER BY t.position",
+                telegram_id,
+                [title for title, _ in tasks],
+                [description for _, description in tasks],
+            )
+        self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def export_tasks(self, telegram_id: str, output: Callable[[bytes], Awaitable[None]]) -> int:
+        """
+        Streams the user's tasks in list order as CSV with a header row, using `COPY ... TO STDOUT`.
+
+        :param output: Coroutine function receiving the CSV chunk by chunk as the server sends it.
+        :return: Number of exported tasks.
+        """
+        async with self.get_connection() as connection:
+            status = await connection.copy_from_query(
+                EXPORT_QUERY, telegram_id, output=output, format="csv", header=True
             )
+        return int(status.split()[-1])
 
-    def get_tasks(self, telegram_id: str) -> List[Tuple[int, str, str, bool]]:
+    @timed_query
+    async def import_tasks(
+        self,
+        telegram_id: str,
+        tasks: Iterable[Tuple[str, Optional[str], bool, Optional[datetime], Optional[datetime]]],
+    ) -> int:
+        """
+        Appends tasks to the user's list with one `COPY ... FROM STDIN`, keeping their order.
+
+        :param tasks: `(title, description, is_completed, due_at, remind_at)` rows, consumed one by one while they
+            are sent; an exception raised by the iterable aborts the whole import.
+        :return: Number of imported tasks.
+        """
+        async with self.get_connection() as connection:
+            async with connection.transaction():
+                created_at = await connection.fetchval("SELECT LOCALTIMESTAMP")
+                status = await connection.copy_records_to_table(
+                    "tasks",
+                    records=((telegram_id, *task, created_at) for task in tasks),
+                    columns=IMPORT_COLUMNS,
+                )
+        self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def get_tasks(self, telegram_id: str) -> List[Tuple[int, str, str, bool]]:
         """Fetches all tasks for a specific user and ensures description is never None."""
-        with self.get_cursor() as cursor:
-            cursor.execute(
+        async with self.get_connection() as connection:
+            return await connection.fetch(
+                "SELECT id, title, COALESCE(description, ''), is_completed FROM tasks "
+                "WHERE telegram_id = $1 ORDER BY created_at, id",
+                telegram_id,
+            )
+
+    @timed_query
+    async def get_tasks_page(
+        self, telegram_id: str, limit: int, cursor: Optional[Tuple[datetime, int]] = None, backward: bool = False
+    ) -> List[Tuple[int, str, bool, datetime]]:
+        """
+        Fetches up to `limit` tasks next to a keyset cursor, returned in list order.
+
+        Pages are cached in-process until the next write to the user's tasks bumps its version.
+
+        :param telegram_id: Owner of the tasks.
+        :param limit: Maximum number of rows to return.
+        :param cursor: `(created_at, id)` of the row to start from, exclusive; None starts at the beginning.
+        :param backward: Fetch the rows preceding the cursor instead of the following ones.
+        :return: Rows of `(id, title, is_completed, created_at)`, all served from the covering list index.
+        """
+        # Pages of an older version are never looked up again and age out of the LRU.
+        key = (telegram_id, self.task_version(telegram_id), limit, cursor, backward)
+        rows = self.task_pages.get(key)
+        if rows is MISSING:
+            rows = await self._fetch_tasks_page(telegram_id, limit, cursor, backward)
+            self.task_pages.set(key, rows)
+        return rows
+
+    async def _fetch_tasks_page(
+        self, telegram_id: str, limit: int, cursor: Optional[Tuple[datetime, int]], backward: bool
+    ) -> List[Tuple[int, str, bool, datetime]]:
+        columns = "SELECT id, title, is_completed, created_at FROM tasks "
+        async with self.get_connection() as connection:
+            if cursor is None:
+                return await connection.fetch(
+                    columns + "WHERE telegram_id = $1 ORDER BY created_at, id LIMIT $2", telegram_id, limit
+                )
+            if not backward:
+                return await connection.fetch(
+                    columns + "WHERE telegram_id = $1 AND (created_at, id) > ($2, $3) ORDER BY created_at, id LIMIT $4",
+                    telegram_id,
+                    *cursor,
+                    limit,
+                )
+            rows = await connection.fetch(
+                columns + "WHERE telegram_id = $1 AND (created_at, id) < ($2, $3) "
+                "ORDER BY created_at DESC, id DESC LIMIT $4",
+                telegram_id,
+                *cursor,
+                limit,
+            )
+            return rows[::-1]
+
+    @timed_query
+    async def get_user_task(self, task_id: int, telegram_id: str) -> Optional[Tuple[int, str, str, bool]]:
+        """Retrieves a task by ID only if it belongs to the user."""
+        async with self.get_connection() as connection:
+            return await connection.fetchrow(
+                "SELECT id, title, description, is_completed FROM tasks WHERE id = $1 AND telegram_id = $2",
+                task_id,
+                telegram_id,
+            )
+
+    @timed_query
+    async def apply_task_changes(self, changes: List[Tuple[int, str, str, Optional[str], bool]]) -> int:
+        """
+        Writes the final state of many tasks with one UPDATE over `unnest` arrays.
+
+        :param changes: `(id, telegram_id, title, description, is_completed)` of every changed task.
+        :return: Number of rows that differed from the stored ones and were written.
+        """
+        if not changes:
+            return 0
+        async with self.get_connection() as connection:
+            status = await connection.execute(
+                "UPDATE tasks SET title = c.title, description = c.description, is_completed = c.is_completed "
+                "FROM unnest($1::int[], $2::text[], $3::text[], $4::text[], $5::bool[]) "
+                "AS c(id, telegram_id, title, description, is_completed) "
+                "WHERE tasks.id = c.id AND tasks.telegram_id = c.telegram_id "
+                "AND (tasks.title, tasks.description, tasks.is_completed) "
+                "IS DISTINCT FROM (c.title, c.description, c.is_completed)",
+                *(list(column) for column in zip(*changes)),
+            )
+        for telegram_id in {change[1] for change in changes}:
+            self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def update_task(
+        self, task_id: int, telegram_id: str, field: str, value: Union[str, bool]
+    ) -> Optional[Tuple[int, str, str, bool]]:
+        """Updates the title, description or completion status of a task; returns the row only if it changed."""
+        async with self.get_connection() as connection:
+            task = await connection.fetchrow(
+                f"UPDATE tasks SET {field} = $1 WHERE id = $2 AND telegram_id = $3 AND {field} IS DISTINCT FROM $1 "
+                "RETURNING id, title, description, is_completed",
+                value,
+                task_id,
+                telegram_id,
+            )
+        if task:
+            self.invalidate_tasks(telegram_id)
+        return task
+
+    @timed_query
+    async def toggle_task(self, task_id: int, telegram_id: str) -> Optional[Tuple[int, str, str, bool]]:
+        """Flips the completion status in a single statement and returns the updated row."""
+        async with self.get_connection() as connection:
+            task = await connection.fetchrow(
+                "UPDATE tasks SET is_completed = NOT COALESCE(is_completed, FALSE) WHERE id = $1 AND telegram_id = $2 "
+                "RETURNING id, title, description, is_completed",
+                task_id,
+                telegram_id,
+            )
+        if task:
+            self.invalidate_tasks(telegram_id)
+        return task
+
+    @timed_query
+    async def delete_task(self, task_id: int, telegram_id: str) -> bool:
+        """Deletes a task of the user by ID and reports whether it existed."""
+        async with self.get_connection() as connection:
+            deleted = await connection.fetchval(
+                "DELETE FROM tasks WHERE id = $1 AND telegram_id = $2 RETURNING TRUE", task_id, telegram_id
+            )
+        if deleted:
+            self.invalidate_tasks(telegram_id)
+        return bool(deleted)
+
+    @timed_query
+    async def complete_all_tasks(self, telegram_id: str) -> int:
+        """Marks every open task of the user as completed and returns how many changed."""
+        async with self.get_connection() as connection:
+            status = await connection.execute(
+                "UPDATE tasks SET is_completed = TRUE WHERE telegram_id = $1 AND NOT is_completed", telegram_id
+            )
+        self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def delete_completed_tasks(self, telegram_id: str) -> int:
+        """Deletes every completed task of the user and returns how many were removed."""
+        async with self.get_connection() as connection:
+            status = await connection.execute("DELETE FROM tasks WHERE telegram_id = $1 AND is_completed", telegram_id)
+        self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def set_tasks_completed_by_numbers(
+        self, telegram_id: str, ranges: List[Tuple[int, int]], is_completed: bool
+    ) -> int:
+        """Sets the status of the tasks whose list numbers fall into the inclusive ranges; returns rows changed."""
+        async with self.get_connection() as connection:
+            status = await connection.execute(
+                f"WITH {NUMBERED_TASKS} UPDATE tasks SET is_completed = $4 FROM numbered "
+                f"WHERE tasks.id = numbered.id AND tasks.is_completed IS DISTINCT FROM $4 AND {IN_RANGES}",
+                telegram_id,
+                [low for low, _ in ranges],
+                [high for _, high in ranges],
+                is_completed,
+            )
+        self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def delete_tasks_by_numbers(self, telegram_id: str, ranges: List[Tuple[int, int]]) -> int:
+        """Deletes the tasks whose list numbers fall into the inclusive ranges; returns rows removed."""
+        async with self.get_connection() as connection:
+            status = await connection.execute(
+                f"WITH {NUMBERED_TASKS} DELETE FROM tasks USING numbered WHERE tasks.id = numbered.id AND {IN_RANGES}",
+                telegram_id,
+                [low for low, _ in ranges],
+                [high for _, high in ranges],
+            )
+        self.invalidate_tasks(telegram_id)
+        return int(status.split()[-1])
+
+    @timed_query
+    async def get_task_order(self, task_id: int, telegram_id: str) -> Optional[int]:
+        """Returns the task order (1-based position) of a task in the user's task list."""
+        async with self.get_connection() as connection:
+            return await connection.fetchval(
+                "SELECT (SELECT COUNT(*) FROM tasks t WHERE t.telegram_id = x.telegram_id "
+                "AND (t.created_at, t.id) <= (x.created_at, x.id)) "
+                "FROM tasks x WHERE x.id = $1 AND x.telegram_id = $2",
+                task_id,
+                telegram_id,
+            )
+
+    @timed_query
+    async def search_tasks(
+        self, telegram_id: str, text: str, limit: int, offset: int = 0
+    ) -> List[Tuple[int, str, bool, int]]:
+        """
+        Finds the user's tasks whose title or description contains every word of `text` as a word prefix.
+
+        Matches come from the GIN index on the generated `search_vector` column, ranked with title matches first.
+
+        :param telegram_id: Owner of the tasks.
+        :param text: Free-text query; punctuation is ignored.
+        :param limit: Maximum number of rows to return.
+        :param offset: Number of ranked matches to skip.
+        :return: Rows of `(id, title, is_completed, position)`, where `position` is the task's number in the list.
+        """
+        query = prefix_tsquery(text)
+        if query is None:
+            return []
+        async with self.get_connection() as connection:
+            return await connection.fetch(
+                "SELECT m.id, m.title, m.is_completed, "
+                "(SELECT COUNT(*) FROM tasks t WHERE t.telegram_id = $1 "
+                "AND (t.created_at, t.id) <= (m.created_at, m.id)) AS position "
+                "FROM (SELECT id, title, is_completed, created_at, ts_rank(search_vector, query) AS rank "
+                "FROM tasks, to_tsquery('simple', $2) AS query "
+                "WHERE telegram_id = $1 AND search_vector @@ query "
+                "ORDER BY rank DESC, id LIMIT $3 OFFSET $4) AS m "
+                "ORDER BY m.rank DESC, m.id",
+                telegram_id,
+                query,
+                limit,
+                offset,
+            )
+
+    @timed_query
+    async def set_task_due(
+        self, task_id: int, telegram_id: str, due_at: Optional[datetime]
+    ) -> Optional[Tuple[int, str, Optional[datetime]]]:
+        """Sets or clears the due date of a task, scheduling its reminder; returns `(id, title, due_at)`."""
+        async with self.get_connection() as connection:
+            return await connection.fetchrow(
+                "UPDATE tasks SET due_at = $3, remind_at = $3, reminder_lease = NULL "
+                "WHERE id = $1 AND telegram_id = $2 RETURNING id, title, due_at",
+                task_id,
+                telegram_id,
+                due_at,
+            )
+
+    @timed_query
+    async def claim_reminders(
+        self, horizon: datetime, now: datetime, lease_until: datetime, limit: int
+    ) -> List[Tuple[int, str, str, datetime]]:
+        """
+        Claims up to `limit` reminders due before `horizon`, earliest first.
+
+        Rows locked by a concurrent claim are skipped, and claimed rows are leased until `lease_until`, so other bot
+        instances leave them alone until the lease runs out.
+
+        :return: Rows of `(id, telegram_id, title, remind_at)`.
+        """
+        async with self.get_connection() as connection:
+            return await connection.fetch(
+                "WITH due AS (SELECT id FROM tasks WHERE remind_at <= $1 "
+                "AND (reminder_lease IS NULL OR reminder_lease < $2) "
+                "ORDER BY remind_at LIMIT $4 FOR UPDATE SKIP LOCKED) "
+                "UPDATE tasks SET reminder_lease = $3 FROM due WHERE tasks.id = due.id "
+                "RETURNING tasks.id, tasks.telegram_id, tasks.title, tasks.remind_at",
+                horizon,
+                now,
+                lease_until,
+                limit,
+            )
+
+    @timed_query
+    async def finish_reminders(self, reminders: List[Tuple[int, datetime]]) -> List[Tuple[int, bool]]:
+        """
+        Marks claimed reminders as sent, skipping those whose due date changed since they were claimed.
+
+        :param reminders: `(id, remind_at)` pairs as returned by `claim_reminders`.
+        :return: `(id, is_completed)` of the reminders that are still current and may be sent.
+        """
+        if not reminders:
+            return []
+        async with self.get_connection() as connection:
+            return await connection.fetch(
+                "UPDATE tasks SET remind_at = NULL, reminder_lease = NULL "
+                "FROM unnest($1::int[], $2::timestamp[]) AS r(id, remind_at) "
+                "WHERE tasks.id = r.id AND tasks.remind_at = r.remind_at "
+                "RETURNING tasks.id, tasks.is_completed",
+                [task_id for task_id, _ in reminders],
+                [remind_at for _, remind_at in reminders],
+            )
+
+    @timed_query
+    async def release_reminders(self, task_ids: List[int]) -> None:
+        """Drops the leases of claimed reminders that were not sent, making them claimable again."""
+        async with self.get_connection() as connection:
+            await connection.execute("UPDATE tasks SET reminder_lease = NULL WHERE id = ANY($1::int[])", task_ids)
+
+    @timed_query
+    async def get_digests(
+        self, after: str, limit: int, max_tasks: int
+    ) -> List[Tuple[str, int, List[str], List[Optional[datetime]]]]:
+        """
+        Aggregates the open tasks of the next `limit` users who have any, in `telegram_id` order.
+
+        Each call is a short keyset query starting after the previous chunk, so a digest run can resume from the last
+        `telegram_id` it handled and holds no transaction open while its messages are sent.
+
+        :param after: `telegram_id` of the last user already handled; an empty string starts from the beginning.
+        :param limit: Maximum number of users to return.
+        :param max_tasks: Maximum number of open tasks listed per user, in list order.
+        :return: Rows of `(telegram_id, open_tasks, titles, due_dates)`; `open_tasks` counts all of the open tasks.
+        """
+        async with self.get_connection() as connection:
+            return await connection.fetch(
+                "SELECT u.telegram_id, o.open_tasks, f.titles, f.due_dates FROM users u "
+                "CROSS JOIN LATERAL (SELECT COUNT(*) AS open_tasks FROM tasks "
+                "WHERE telegram_id = u.telegram_id AND NOT is_completed) AS o "
+                "CROSS JOIN LATERAL (SELECT array_agg(t.title ORDER BY t.created_at, t.id) AS titles, "
+                "array_agg(t.due_at ORDER BY t.created_at, t.id) AS due_dates "
+                "FROM (SELECT title, due_at, created_at, id FROM tasks "
+                "WHERE telegram_id = u.telegram_id AND NOT is_completed "
+                "ORDER BY created_at, id LIMIT $3) AS t) AS f "
+                "WHERE u.telegram_id > $1 AND o.open_tasks > 0 "
+                "ORDER BY u.telegram_id LIMIT $2",
+                after,
+                limit,
+                max_tasks,
+            )
+
+    @timed_query
+    async def get_task_by_number(self, telegram_id: str, task_number: int) -> Optional[Tuple[int, str, str, bool]]:
+        """Retrieves the task at the given 1-based position of the user's task list."""
+        if task_number < 1:
+            return None
+        async with self.get_connection() as connection:
+            return await connection.fetchrow(
                 "SELECT id, title, COALESCE(description, ''), is_completed FROM tasks "
-                "WHERE telegram_id = %s ORDER BY created_at ASC",
-                (telegram_id,),
-            )
-            return cursor.fetchall()
-
-    def get_task(self, task_id: int) -> Optional[Tuple[int, str, str, bool]]:
-        """Retrieves a specific task by its ID."""
-        with self.get_cursor() as cursor:
-            cursor.execute("SELECT id, title, description, is_completed FROM tasks WHERE id = %s", (task_id,))
-            return cursor.fetchone()
-
-    def update_task(self, task_id: int, field: str, value: str) -> None:
-        """Updates the title or description of a task."""
-        with self.get_cursor() as cursor:
-            cursor.execute(f"UPDATE tasks SET {field} = %s WHERE id = %s", (value, task_id))
-
-    def delete_task(self, task_id: int) -> None:
-        """Deletes a task by ID."""
-        with self.get_cursor() as cursor:
-            cursor.execute("DELETE FROM tasks WHERE id = %s", (task_id,))
-
-    def get_task_order(self, task_id: int, telegram_id: str) -> Optional[int]:
-        """Returns the task order (index) for a given task in the user's task list."""
-        with self.get_cursor() as cursor:
-            cursor.execute("SELECT id FROM tasks WHERE telegram_id = %s ORDER BY created_at ASC", (telegram_id,))
-            tasks = cursor.fetchall()
-            task_ids = [task[0] for task in tasks]
-
-            return task_ids.index(task_id) + 1 if task_id in task_ids else None
+                "WHERE telegram_id = $1 ORDER BY created_at, id OFFSET $2 LIMIT 1",
+                telegram_id,
+                task_number - 1,
+            )
+
+    @timed_query
+    async def count_tasks(self, telegram_id: str) -> int:
+        """Returns the number of tasks the user has."""
+        async with self.get_connection() as connection:
+            return await connection.fetchval("SELECT COUNT(*) FROM tasks WHERE telegram_id = $1", telegram_id)
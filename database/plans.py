@@ -0,0 +1,122 @@
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+
+from database.database import Database
+
+SAMPLE_TELEGRAM_ID = "0"
+SAMPLE_TASK_ID = 1
+
+
+class ExplainConnection:
+    """Connection proxy that EXPLAINs every query instead of running it."""
+
+    def __init__(self, connection: Any, plans: List[Tuple[str, Dict[str, Any]]]) -> None:
+        self.connection = connection
+        self.plans = plans
+
+    async def explain(self, query: str, *args: Any) -> None:
+        plan = await self.connection.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args)
+        self.plans.append((query, json.loads(plan)[0]["Plan"]))
+
+    async def fetch(self, query: str, *args: Any) -> List[Any]:
+        await self.explain(query, *args)
+        return []
+
+    async def fetchrow(self, query: str, *args: Any) -> None:
+        await self.explain(query, *args)
+
+    async def fetchval(self, query: str, *args: Any) -> None:
+        await self.explain(query, *args)
+
+    async def execute(self, query: str, *args: Any) -> str:
+        await self.explain(query, *args)
+        return ""
+
+    async def copy_from_query(self, query: str, *args: Any, **kwargs: Any) -> str:
+        await self.explain(query, *args)
+        return "COPY 0"
+
+
+class ExplainDatabase(Database):
+    """Database whose methods record query plans; seq scans are disabled so that any usable index is chosen."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.plans: List[Tuple[str, Dict[str, Any]]] = []
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncIterator[Any]:
+        async with super().get_connection() as connection:
+            async with connection.transaction():
+                await connection.execute("SET LOCAL enable_seqscan = off")
+                yield ExplainConnection(connection, self.plans)
+
+
+def iter_nodes(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yields a plan node and all of its children."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from iter_nodes(child)
+
+
+def find_seq_scans(plans: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """Returns the queries whose plan still reads a table sequentially."""
+    return [query for query, plan in plans if any(node["Node Type"] == "Seq Scan" for node in iter_nodes(plan))]
+
+
+async def discard(chunk: bytes) -> None:
+    pass
+
+
+async def explain_task_queries(db: ExplainDatabase) -> None:
+    """Runs every per-user read and write path of `Database` once."""
+    cursor = (datetime.now(), SAMPLE_TASK_ID)
+    await db.get_user(SAMPLE_TELEGRAM_ID)
+    await db.get_user_by_username(SAMPLE_TELEGRAM_ID)
+    await db.get_tasks(SAMPLE_TELEGRAM_ID)
+    await db.get_tasks_page(SAMPLE_TELEGRAM_ID, 20)
+    await db.get_tasks_page(SAMPLE_TELEGRAM_ID, 20, cursor)
+    await db.get_tasks_page(SAMPLE_TELEGRAM_ID, 20, cursor, backward=True)
+    await db.get_user_task(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID)
+    await db.get_task_order(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID)
+    await db.get_task_by_number(SAMPLE_TELEGRAM_ID, 1)
+    await db.count_tasks(SAMPLE_TELEGRAM_ID)
+    await db.search_tasks(SAMPLE_TELEGRAM_ID, "sample task", 10)
+    await db.complete_all_tasks(SAMPLE_TELEGRAM_ID)
+    await db.delete_completed_tasks(SAMPLE_TELEGRAM_ID)
+    await db.set_tasks_completed_by_numbers(SAMPLE_TELEGRAM_ID, [(1, 5)], True)
+    await db.delete_tasks_by_numbers(SAMPLE_TELEGRAM_ID, [(1, 5)])
+    await db.update_task(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID, "title", "")
+    await db.toggle_task(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID)
+    await db.apply_task_changes([(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID, "", "", True)])
+    await db.set_task_due(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID, cursor[0])
+    await db.claim_reminders(cursor[0], cursor[0], cursor[0], 100)
+    await db.finish_reminders([(SAMPLE_TASK_ID, cursor[0])])
+    await db.release_reminders([SAMPLE_TASK_ID])
+    await db.export_tasks(SAMPLE_TELEGRAM_ID, discard)
+    await db.get_digests(SAMPLE_TELEGRAM_ID, 500, 10)
+    await db.delete_task(SAMPLE_TASK_ID, SAMPLE_TELEGRAM_ID)
+
+
+async def main() -> int:
+    """Checks the query plans against the migrated database and reports regressions to seq scans."""
+    db = ExplainDatabase()
+    await db.connect()
+    try:
+        await explain_task_queries(db)
+    finally:
+        await db.close()
+
+    regressions = find_seq_scans(db.plans)
+    for query in regressions:
+        print(f"Seq Scan: {query}")
+    print(f"{len(db.plans)} queries checked, {len(regressions)} seq scans")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
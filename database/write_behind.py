@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import suppress
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from config.config import load_config
+from metrics.metrics import (
+    WRITE_BEHIND_CHANGES,
+    WRITE_BEHIND_PENDING,
+    WRITE_BEHIND_ROWS,
+)
+
+load_config()
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_INTERVAL_MS = int(os.getenv("WRITE_BEHIND_INTERVAL_MS", 500))
+WRITE_BEHIND_MAX_OPS = int(os.getenv("WRITE_BEHIND_MAX_OPS", 500))
+
+Row = Tuple[int, str, Optional[str], bool]
+Change = Tuple[int, str, str, Optional[str], bool]
+
+COLUMNS = {"title": 1, "description": 2, "is_completed": 3}
+
+
+class RedisTaskJournal:
+    """
+    Keeps the buffered state of every changed task in a Redis hash until it is written to the database, so that
+    changes acknowledged to users survive a crash. Each process uses its own hash, named after it.
+    """
+
+    def __init__(self, db: Any, name: str = "bot") -> None:
+        self.db = db
+        self.key = f"write_behind:{name}"
+
+    async def save(self, task_id: int, telegram_id: str, row: Row) -> None:
+        await self.db.hset(self.key, str(task_id), json.dumps([telegram_id, *row[1:]]))
+
+    async def delete(self, task_ids: List[int]) -> None:
+        if task_ids:
+            await self.db.hdel(self.key, *map(str, task_ids))
+
+    async def load(self) -> List[Change]:
+        """Returns the journaled changes as `(id, telegram_id, title, description, is_completed)`."""
+        entries = await self.db.hgetall(self.key)
+        return [(int(task_id), *json.loads(entry)) for task_id, entry in entries.items()]  # type: ignore
+
+
+class BufferedTask:
+    """A task with buffered changes: the row as stored in the database and the row as users see it."""
+
+    def __init__(self, telegram_id: str, stored: Row) -> None:
+        self.telegram_id = telegram_id
+        self.stored = stored
+        self.row = stored
+
+
+class WriteBehindDatabase:
+    """
+    Wraps `Database` and buffers task toggles and edits instead of writing each one.
+
+    A change updates an in-process view of the task and is journaled before the call returns. A background flush
+    writes the views with one UPDATE every `interval` seconds, or as soon as `max_ops` changes are buffered. A toggle
+    flipped back, or an edit restoring the stored value, leaves nothing to write. Reads see the buffered changes, and
+    every other write to a user's tasks flushes first. Everything else goes straight to the wrapped database.
+    """
+
+    def __init__(
+        self,
+        db: Any,
+        journal: Any,
+        interval: float = WRITE_BEHIND_INTERVAL_MS / 1000,
+        max_ops: int = WRITE_BEHIND_MAX_OPS,
+    ) -> None:
+        self.db = db
+        self.journal = journal
+        self.interval = interval
+        self.max_ops = max_ops
+        self.pending: Dict[int, BufferedTask] = {}
+        self.flushing: Dict[int, BufferedTask] = {}
+        self.ops = 0
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+        self._flusher: Optional["asyncio.Task[None]"] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.db, name)
+
+    async def connect(self) -> None:
+        """Connects the database, writes the changes journaled before a crash and starts the periodic flush."""
+        await self.db.connect()
+        changes = await self.journal.load()
+        if changes:
+            written = await self.db.apply_task_changes(changes)
+            await self.journal.delete([change[0] for change in changes])
+            logging.info(f"[write_behind] Recovered {len(changes)} journaled tasks, {written} rows written")
+        self._flusher = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Writes everything still buffered before closing the database; on failure the journal keeps it."""
+        if self._flusher:
+            self._flusher.cancel()
+            # A flush cancelled midway puts its tasks back, so the final flush below writes them.
+            with suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+        try:
+            await self.flush()
+        finally:
+            await self.db.close()
+
+    async def flush(self) -> int:
+        """Writes the buffered tasks with one statement and returns how many rows changed."""
+        async with self._lock:
+            if not self.pending:
+                return 0
+            self.flushing, self.pending, self.ops = self.pending, {}, 0
+            try:
+                changes = [(task_id, task.telegram_id, *task.row[1:]) for task_id, task in self.flushing.items()]
+                try:
+                    written = await self.db.apply_task_changes(changes)
+                except BaseException:
+                    self._restore()
+                    raise
+                # Tasks changed again during the write have a newer journal entry, which must stay.
+                await self.journal.delete([task_id for task_id in self.flushing if task_id not in self.pending])
+            finally:
+                self.flushing = {}
+                WRITE_BEHIND_PENDING.set(len(self.pending))
+        WRITE_BEHIND_ROWS.inc(written)
+        return written
+
+    async def toggle_task(self, task_id: int, telegram_id: str) -> Optional[Row]:
+        task = await self._buffer(task_id, telegram_id)
+        if task is None:
+            return None
+        await self._change(task_id, task, (*task.row[:3], not task.row[3]))  # type: ignore
+        return task.row
+
+    async def update_task(self, task_id: int, telegram_id: str, field: str, value: Union[str, bool]) -> Optional[Row]:
+        task = await self._buffer(task_id, telegram_id)
+        if task is None or task.row[COLUMNS[field]] == value:
+            return None
+        row = list(task.row)
+        row[COLUMNS[field]] = value
+        await self._change(task_id, task, tuple(row))  # type: ignore
+        return task.row
+
+    async def get_user_task(self, task_id: int, telegram_id: str) -> Optional[Row]:
+        task = self._view(task_id)
+        if task is None:
+            return await self.db.get_user_task(task_id, telegram_id)
+        return task.row if task.telegram_id == telegram_id else None
+
+    async def get_tasks(self, telegram_id: str) -> List[Row]:
+        return [self._with_description(row) for row in await self.db.get_tasks(telegram_id)]
+
+    async def get_task_by_number(self, telegram_id: str, task_number: int) -> Optional[Row]:
+        row = await self.db.get_task_by_number(telegram_id, task_number)
+        return self._with_description(row) if row else None
+
+    async def get_tasks_page(
+        self, telegram_id: str, limit: int, cursor: Optional[Tuple[datetime, int]] = None, backward: bool = False
+    ) -> List[Tuple[int, str, bool, datetime]]:
+        rows = await self.db.get_tasks_page(telegram_id, limit, cursor, backward)
+        views = [self._view(row[0]) for row in rows]
+        return [
+            (row[0], view.row[1], view.row[3], row[3]) if view else row  # type: ignore
+            for row, view in zip(rows, views)
+        ]
+
+    async def search_tasks(
+        self, telegram_id: str, text: str, limit: int, offset: int = 0
+    ) -> List[Tuple[int, str, bool, int]]:
+        # Matching runs on the stored columns, so buffered edits must be written first.
+        await self._flush_user(telegram_id)
+        return await self.db.search_tasks(telegram_id, text, limit, offset)
+
+    async def claim_reminders(
+        self, horizon: datetime, now: datetime, lease_until: datetime, limit: int
+    ) -> List[Tuple[int, str, str, datetime]]:
+        rows = await self.db.claim_reminders(horizon, now, lease_until, limit)
+        views = [self._view(row[0]) for row in rows]
+        return [(*row[:2], view.row[1], row[3]) if view else row for row, view in zip(rows, views)]  # type: ignore
+
+    async def finish_reminders(self, reminders: List[Tuple[int, datetime]]) -> List[Tuple[int, bool]]:
+        rows = await self.db.finish_reminders(reminders)
+        views = [self._view(row[0]) for row in rows]
+        return [(row[0], view.row[3]) if view else row for row, view in zip(rows, views)]  # type: ignore
+
+    async def export_tasks(self, telegram_id: str, output: Callable[[bytes], Awaitable[None]]) -> int:
+        await self._flush_user(telegram_id)
+        return await self.db.export_tasks(telegram_id, output)
+
+    async def get_digests(
+        self, after: str, limit: int, max_tasks: int
+    ) -> List[Tuple[str, int, List[str], List[Optional[datetime]]]]:
+        # Open tasks are aggregated on the stored columns across many users, so everything buffered is written first.
+        await self.flush()
+        return await self.db.get_digests(after, limit, max_tasks)
+
+    async def delete_task(self, task_id: int, telegram_id: str) -> bool:
+        await self._flush_user(telegram_id)
+        return await self.db.delete_task(task_id, telegram_id)
+
+    async def complete_all_tasks(self, telegram_id: str) -> int:
+        await self._flush_user(telegram_id)
+        return await self.db.complete_all_tasks(telegram_id)
+
+    async def delete_completed_tasks(self, telegram_id: str) -> int:
+        await self._flush_user(telegram_id)
+        return await self.db.delete_completed_tasks(telegram_id)
+
+    async def set_tasks_completed_by_numbers(
+        self, telegram_id: str, ranges: List[Tuple[int, int]], is_completed: bool
+    ) -> int:
+        await self._flush_user(telegram_id)
+        return await self.db.set_tasks_completed_by_numbers(telegram_id, ranges, is_completed)
+
+    async def delete_tasks_by_numbers(self, telegram_id: str, ranges: List[Tuple[int, int]]) -> int:
+        await self._flush_user(telegram_id)
+        return await self.db.delete_tasks_by_numbers(telegram_id, ranges)
+
+    def _view(self, task_id: int) -> Optional[BufferedTask]:
+        return self.pending.get(task_id) or self.flushing.get(task_id)
+
+    def _with_description(self, row: Row) -> Row:
+        task = self._view(row[0])
+        if task is None:
+            return row
+        task_id, title, description, is_completed = task.row
+        return task_id, title, description or "", is_completed
+
+    async def _buffer(self, task_id: int, telegram_id: str) -> Optional[BufferedTask]:
+        """Returns the buffered task, starting from the row being flushed or the stored one; None if not owned."""
+        task = self._view(task_id)
+        if task is None:
+            row = await self.db.get_user_task(task_id, telegram_id)
+            if row is None:
+                return None
+            task = self.pending.setdefault(task_id, BufferedTask(telegram_id, tuple(row)))  # type: ignore
+        elif task.telegram_id != telegram_id:
+            return None
+        elif task_id not in self.pending:
+            # Being flushed: what the flush writes is the stored row of the next change.
+            task = self.pending[task_id] = BufferedTask(telegram_id, task.row)
+        return task
+
+    async def _change(self, task_id: int, task: BufferedTask, row: Row) -> None:
+        task.row = row
+        if row != task.stored:
+            await self.journal.save(task_id, task.telegram_id, row)
+            WRITE_BEHIND_CHANGES.labels("buffered").inc()
+        else:
+            self.pending.pop(task_id, None)
+            if task_id in self.flushing:
+                # The flush in progress writes this row; its journal entry must survive until then.
+                await self.journal.save(task_id, task.telegram_id, row)
+            else:
+                await self.journal.delete([task_id])
+            WRITE_BEHIND_CHANGES.labels("collapsed").inc()
+
+        WRITE_BEHIND_PENDING.set(len(self.pending))
+        self.ops += 1
+        if self.ops >= self.max_ops:
+            self._full.set()
+
+    def _restore(self) -> None:
+        """Puts the tasks of a failed or cancelled flush back, keeping changes made to them meanwhile."""
+        for task_id, task in self.flushing.items():
+            if task_id in self.pending:
+                self.pending[task_id].stored = task.stored
+            else:
+                self.pending[task_id] = task
+
+    async def _flush_user(self, telegram_id: str) -> None:
+        tasks = [*self.pending.values(), *self.flushing.values()]
+        if any(task.telegram_id == telegram_id for task in tasks):
+            await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"[write_behind] Flush failed, retrying on the next one: {e}", exc_info=True)
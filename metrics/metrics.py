@@ -0,0 +1,120 @@
+import functools
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+from config.config import load_config
+
+load_config()
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Handler latency", ["handler"], buckets=LATENCY_BUCKETS)
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Exceptions raised by handlers", ["handler"])
+QUERY_LATENCY = Histogram("bot_db_query_seconds", "Database method latency", ["query"], buckets=LATENCY_BUCKETS)
+QUERY_ERRORS = Counter("bot_db_query_errors_total", "Exceptions raised by database methods", ["query"])
+CACHE_LATENCY = Histogram("bot_cache_call_seconds", "Cache method latency", ["call"], buckets=LATENCY_BUCKETS)
+CACHE_ERRORS = Counter("bot_cache_call_errors_total", "Exceptions raised by cache methods", ["call"])
+
+UPDATES_IN_FLIGHT = Gauge("bot_updates_in_flight", "Updates currently being handled")
+UPDATES_QUEUED = Gauge("bot_updates_queued", "Updates waiting in or handled by the per-chat dispatcher")
+UPDATES_DROPPED = Counter(
+    "bot_updates_dropped_total", "Updates dropped because their chat had too many pending", ["kind"]
+)
+DB_POOL_CONNECTIONS = Gauge("bot_db_pool_connections", "Database pool connections", ["state"])
+
+SEND_QUEUE = Gauge("bot_send_queue", "Outgoing calls waiting in the send scheduler")
+SEND_LATENCY = Histogram(
+    "bot_send_seconds", "Time from queueing an outgoing call to its delivery", ["method"], buckets=LATENCY_BUCKETS
+)
+FLOOD_WAITS = Counter("bot_flood_waits_total", "FloodWait errors returned by Telegram")
+
+WRITE_BEHIND_PENDING = Gauge("bot_write_behind_pending", "Tasks with buffered changes not yet written to the database")
+WRITE_BEHIND_CHANGES = Counter(
+    "bot_write_behind_changes_total", "Buffered task changes; collapsed ones restored the stored value", ["result"]
+)
+WRITE_BEHIND_ROWS = Counter("bot_write_behind_rows_written_total", "Task rows written by write-behind flushes")
+
+REMINDERS = Counter(
+    "bot_reminders_total", "Due reminders; skipped ones belonged to completed or rescheduled tasks", ["result"]
+)
+REMINDERS_HELD = Gauge("bot_reminders_held", "Claimed reminders waiting in the scheduler heap")
+
+DIGESTS = Counter("bot_digests_total", "Daily digests; failed ones were not delivered", ["result"])
+DIGEST_PROGRESS = Gauge("bot_digest_users_done", "Users handled by the current daily digest run")
+
+CACHE_BREAKER_STATE = Gauge("bot_cache_breaker_state", "Redis circuit breaker: 0 closed, 1 half-open, 2 open")
+CACHE_BREAKER_TRANSITIONS = Counter(
+    "bot_cache_breaker_transitions_total", "Redis circuit breaker state changes, by new state", ["state"]
+)
+CACHE_FALLBACK_CALLS = Counter(
+    "bot_cache_fallback_calls_total", "Session calls served by the in-process store instead of Redis", ["call"]
+)
+CACHE_UNRECONCILED = Gauge(
+    "bot_cache_unreconciled_sessions", "Sessions changed in the in-process store and not yet written back to Redis"
+)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+@contextmanager
+def track(histogram: Histogram, errors: Counter, label: str) -> Iterator[None]:
+    """Observes the duration of the block and counts exceptions under the given label."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.labels(label).inc()
+        raise
+    finally:
+        histogram.labels(label).observe(time.perf_counter() - started)
+
+
+def timed(histogram: Histogram, errors: Counter) -> Callable[[F], F]:
+    """Decorates a coroutine function to be tracked under its own name."""
+
+    def decorator(func: F) -> F:
+        latency = histogram.labels(func.__name__)
+        failures = errors.labels(func.__name__)
+
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                failures.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - started)
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+timed_query = timed(QUERY_LATENCY, QUERY_ERRORS)
+timed_cache = timed(CACHE_LATENCY, CACHE_ERRORS)
+
+
+def track_handler(handler: str) -> Any:
+    """Tracks a dispatched handler by name."""
+    return track(HANDLER_LATENCY, HANDLER_ERRORS, handler)
+
+
+def track_pool(pool: Any) -> None:
+    """Exposes the size of an asyncpg pool as gauges that are read on scrape."""
+    DB_POOL_CONNECTIONS.labels("open").set_function(pool.get_size)
+    DB_POOL_CONNECTIONS.labels("idle").set_function(pool.get_idle_size)
+    DB_POOL_CONNECTIONS.labels("max").set_function(pool.get_max_size)
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> None:
+    """Serves metrics on http://0.0.0.0:<port>/metrics; a port of 0 leaves the endpoint disabled."""
+    if port:
+        start_http_server(port)
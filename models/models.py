@@ -1,10 +1,17 @@
 from datetime import datetime
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+
+from sqlalchemy import Boolean, Column, Computed, DateTime, ForeignKey, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')"
+)
+
 
 class User(Base):  # type: ignore
     __tablename__ = "users"
@@ -17,10 +24,32 @@ class User(Base):  # type: ignore
 
 class Task(Base):  # type: ignore
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index(
+            "ix_tasks_telegram_id_created_at_id",
+            "telegram_id",
+            "created_at",
+            "id",
+            postgresql_include=["title", "is_completed"],
+        ),
+        Index(
+            "ix_tasks_open_telegram_id_created_at_id",
+            "telegram_id",
+            "created_at",
+            "id",
+            postgresql_where=text("NOT is_completed"),
+        ),
+        Index("ix_tasks_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_tasks_remind_at", "remind_at", postgresql_where=text("remind_at IS NOT NULL")),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
     title = Column(String, nullable=False)
     description = Column(String, nullable=True)
     is_completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.now)
     telegram_id = Column(String, ForeignKey("users.telegram_id"))
+    search_vector = Column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True))
+    due_at = Column(DateTime, nullable=True)
+    remind_at = Column(DateTime, nullable=True)
+    reminder_lease = Column(DateTime, nullable=True)
     user = relationship("User", back_populates="tasks")
@@ -0,0 +1,16 @@
+import pytest
+
+from bot.callbacks import InvalidCallback, decode_callback, encode_callback
+
+
+@pytest.mark.parametrize("owner", [1, 123456789, -1001234567890, -(2**63), 2**63 - 1])
+def test_owner_round_trip(owner: int) -> None:
+    data = encode_callback(3, owner, 42, 2**64 - 1)
+    assert len(data) <= 64
+    assert decode_callback(data) == (3, owner, (42, 2**64 - 1))
+
+
+def test_tampered_data_is_rejected() -> None:
+    data = encode_callback(3, -1001234567890, 42)
+    with pytest.raises(InvalidCallback):
+        decode_callback(data[:-2] + ("A" if data[-2] != "A" else "B") + data[-1])